@@ -0,0 +1,149 @@
+"""Store chat rosters once per member list instead of on every message
+
+Revision ID: 660ed97d670e
+Revises: 1155164bcf40
+Create Date: 2026-10-16 10:12:41.503218
+
+"""
+import hashlib
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '660ed97d670e'
+down_revision: Union[str, Sequence[str], None] = '1155164bcf40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows per backfill transaction; each batch commits on its own so the
+# migration never holds row locks on the whole messages table
+BATCH_SIZE = 5000
+
+
+def roster_hash(members: list) -> str:
+    """Same canonical hash as app.services.roster_cache.roster_hash"""
+    canonical = json.dumps(members, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def backfill_roster_hashes(bind) -> None:
+    last_id = ""
+    while True:
+        rows = bind.execute(
+            sa.text(
+                "SELECT message_id, chat_members_struct::text AS members "
+                "FROM messages "
+                "WHERE message_id > :last_id AND chat_members_struct IS NOT NULL "
+                "ORDER BY message_id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+
+        rosters = {}
+        message_ids = []
+        hashes = []
+        for row in rows:
+            members = json.loads(row.members)
+            key = roster_hash(members)
+            rosters[key] = members
+            message_ids.append(row.message_id)
+            hashes.append(key)
+
+        bind.execute(
+            sa.text(
+                "INSERT INTO chat_rosters (roster_hash, members) "
+                "VALUES (:roster_hash, CAST(:members AS json)) "
+                "ON CONFLICT (roster_hash) DO NOTHING"
+            ),
+            [
+                {"roster_hash": key, "members": json.dumps(rosters[key])}
+                for key in sorted(rosters)
+            ],
+        )
+        bind.execute(
+            sa.text(
+                "UPDATE messages AS m SET roster_hash = v.roster_hash "
+                "FROM unnest(CAST(:message_ids AS text[]), CAST(:hashes AS text[])) "
+                "AS v(message_id, roster_hash) "
+                "WHERE m.message_id = v.message_id"
+            ),
+            {"message_ids": message_ids, "hashes": hashes},
+        )
+        last_id = rows[-1].message_id
+
+
+def backfill_chat_members_struct(bind) -> None:
+    last_id = ""
+    while True:
+        message_ids = bind.execute(
+            sa.text(
+                "SELECT message_id FROM messages "
+                "WHERE message_id > :last_id AND roster_hash IS NOT NULL "
+                "ORDER BY message_id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).scalars().all()
+        if not message_ids:
+            break
+
+        bind.execute(
+            sa.text(
+                "UPDATE messages AS m SET chat_members_struct = r.members "
+                "FROM chat_rosters AS r "
+                "WHERE m.roster_hash = r.roster_hash "
+                "AND m.message_id = ANY(CAST(:message_ids AS text[]))"
+            ),
+            {"message_ids": message_ids},
+        )
+        last_id = message_ids[-1]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_rosters',
+    sa.Column('roster_hash', sa.String(), nullable=False),
+    sa.Column('members', sa.JSON(), nullable=False),
+    sa.Column(
+        'created_at',
+        sa.DateTime(timezone=True),
+        server_default=sa.text('now()'),
+        nullable=True,
+    ),
+    sa.PrimaryKeyConstraint('roster_hash')
+    )
+    op.add_column('messages', sa.Column('roster_hash', sa.String(), nullable=True))
+    op.create_foreign_key(
+        'messages_roster_hash_fkey',
+        'messages',
+        'chat_rosters',
+        ['roster_hash'],
+        ['roster_hash'],
+    )
+
+    with op.get_context().autocommit_block():
+        backfill_roster_hashes(op.get_bind())
+
+    op.drop_column('messages', 'chat_members_struct')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column(
+        'messages',
+        sa.Column(
+            'chat_members_struct', sa.JSON(), autoincrement=False, nullable=True
+        ),
+    )
+
+    with op.get_context().autocommit_block():
+        backfill_chat_members_struct(op.get_bind())
+
+    op.drop_constraint('messages_roster_hash_fkey', 'messages', type_='foreignkey')
+    op.drop_column('messages', 'roster_hash')
+    op.drop_table('chat_rosters')
@@ -0,0 +1,36 @@
+"""Lease AGENT_PROCESSING claims to a worker
+
+Revision ID: 8c2e5a1f9d47
+Revises: f47b6175910d
+Create Date: 2026-10-16 14:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e5a1f9d47'
+down_revision: Union[str, Sequence[str], None] = 'f47b6175910d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable without defaults, so adding them does not rewrite the table.
+    # Rows already stuck in AGENT_PROCESSING have no lease and are reclaimed
+    # by the first sweep.
+    op.add_column('messages', sa.Column('lease_owner', sa.String(), nullable=True))
+    op.add_column(
+        'messages',
+        sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'lease_expires_at')
+    op.drop_column('messages', 'lease_owner')
@@ -0,0 +1,47 @@
+"""Persistent tier of the agent result cache
+
+Revision ID: b4e1d7c3a925
+Revises: 8c2e5a1f9d47
+Create Date: 2026-10-16 15:21:08.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e1d7c3a925'
+down_revision: Union[str, Sequence[str], None] = '8c2e5a1f9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'agent_results',
+        sa.Column('cache_key', sa.String(), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=False),
+        sa.Column('compute_seconds', sa.Float(), nullable=False),
+        sa.Column(
+            'created_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint('cache_key'),
+    )
+    op.create_index(
+        op.f('ix_agent_results_created_at'),
+        'agent_results',
+        ['created_at'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_agent_results_created_at'), table_name='agent_results')
+    op.drop_table('agent_results')
@@ -0,0 +1,126 @@
+"""Range-partition agent_logs on created_at
+
+Revision ID: c71f0a9e4d28
+Revises: b4e1d7c3a925
+Create Date: 2026-10-16 17:48:12.906331
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71f0a9e4d28'
+down_revision: Union[str, Sequence[str], None] = 'b4e1d7c3a925'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'id, session_id, log_type, level, message, extra_data, source_message_id'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A table cannot be partitioned in place: the existing rows are copied
+    # into a new partitioned table that keeps the name and id sequence. The
+    # partition key has to be part of the primary key, and so NOT NULL.
+    op.execute('ALTER TABLE agent_logs RENAME TO agent_logs_unpartitioned')
+    op.execute(
+        'ALTER TABLE agent_logs_unpartitioned '
+        'RENAME CONSTRAINT agent_logs_pkey TO agent_logs_unpartitioned_pkey'
+    )
+    op.execute('DROP INDEX ix_agent_logs_session_id')
+    op.execute(
+        """
+        CREATE TABLE agent_logs (
+            id INTEGER NOT NULL DEFAULT nextval('agent_logs_id_seq'),
+            session_id VARCHAR NOT NULL,
+            log_type agentlogtype NOT NULL,
+            level agentloglevel,
+            message TEXT NOT NULL,
+            extra_data JSON,
+            source_message_id VARCHAR REFERENCES messages (message_id),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute('ALTER SEQUENCE agent_logs_id_seq OWNED BY agent_logs.id')
+    # Created on every partition, present and future
+    op.execute(
+        'CREATE INDEX ix_agent_logs_session_id_created_at '
+        'ON agent_logs (session_id, created_at)'
+    )
+    # Catches rows outside every partition if maintenance falls behind
+    op.execute('CREATE TABLE agent_logs_default PARTITION OF agent_logs DEFAULT')
+    # Daily UTC partitions for days that have rows and for the next week,
+    # named the way app/services/agent_log_partitions.py expects; maintenance
+    # creates later ones and drops those past retention
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            partition_day date;
+        BEGIN
+            FOR partition_day IN
+                SELECT DISTINCT (created_at AT TIME ZONE 'UTC')::date
+                FROM agent_logs_unpartitioned
+                WHERE created_at IS NOT NULL
+                UNION
+                SELECT (now() AT TIME ZONE 'UTC')::date + offset_days
+                FROM generate_series(0, 7) AS offset_days
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF agent_logs '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'agent_logs_' || to_char(partition_day, 'YYYYMMDD')
+                        || '_' || to_char(partition_day + 1, 'YYYYMMDD'),
+                    to_char(partition_day, 'YYYY-MM-DD') || ' 00:00:00+00',
+                    to_char(partition_day + 1, 'YYYY-MM-DD') || ' 00:00:00+00'
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO agent_logs ({COLUMNS}, created_at)
+        SELECT {COLUMNS}, COALESCE(created_at, now())
+        FROM agent_logs_unpartitioned
+        """
+    )
+    op.execute('DROP TABLE agent_logs_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE agent_logs RENAME TO agent_logs_partitioned')
+    op.execute(
+        'ALTER TABLE agent_logs_partitioned '
+        'RENAME CONSTRAINT agent_logs_pkey TO agent_logs_partitioned_pkey'
+    )
+    op.execute(
+        """
+        CREATE TABLE agent_logs (
+            id INTEGER NOT NULL DEFAULT nextval('agent_logs_id_seq'),
+            session_id VARCHAR NOT NULL,
+            log_type agentlogtype NOT NULL,
+            level agentloglevel,
+            message TEXT NOT NULL,
+            extra_data JSON,
+            source_message_id VARCHAR REFERENCES messages (message_id),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute('ALTER SEQUENCE agent_logs_id_seq OWNED BY agent_logs.id')
+    op.execute(
+        f"""
+        INSERT INTO agent_logs ({COLUMNS}, created_at)
+        SELECT {COLUMNS}, created_at FROM agent_logs_partitioned
+        """
+    )
+    op.execute('DROP TABLE agent_logs_partitioned')
+    op.execute('CREATE INDEX ix_agent_logs_session_id ON agent_logs (session_id)')
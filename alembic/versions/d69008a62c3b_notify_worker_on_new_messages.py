@@ -0,0 +1,50 @@
+"""Notify the worker when new messages are committed
+
+Revision ID: d69008a62c3b
+Revises: 660ed97d670e
+Create Date: 2026-10-16 11:04:09.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd69008a62c3b'
+down_revision: Union[str, Sequence[str], None] = '660ed97d670e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Statement-level, so a batch or COPY merge sends one notification; Postgres
+    # also folds identical notifications within a transaction and only
+    # delivers them on commit
+    op.execute(
+        """
+        CREATE FUNCTION notify_new_messages() RETURNS trigger AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM inserted_messages) THEN
+                PERFORM pg_notify('new_messages', '');
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_notify_insert
+        AFTER INSERT ON messages
+        REFERENCING NEW TABLE AS inserted_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_new_messages()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER messages_notify_insert ON messages")
+    op.execute("DROP FUNCTION notify_new_messages()")
@@ -0,0 +1,39 @@
+"""Count failed processing passes and dead-letter poison messages
+
+Revision ID: e5b19a7c3d60
+Revises: d69008a62c3b
+Create Date: 2026-10-16 19:31:05.224718
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b19a7c3d60'
+down_revision: Union[str, Sequence[str], None] = 'd69008a62c3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TYPE messagestatus ADD VALUE IF NOT EXISTS 'FAILED'")
+    # A constant default is stored in the catalog, so this does not rewrite
+    # the table
+    op.add_column(
+        'messages',
+        sa.Column(
+            'processing_attempts', sa.Integer(), server_default='0', nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres cannot drop an enum value; FAILED is left unused and its rows
+    # go back to UNPROCESSED for another attempt
+    op.execute("UPDATE messages SET status = 'UNPROCESSED' WHERE status = 'FAILED'")
+    op.drop_column('messages', 'processing_attempts')
@@ -0,0 +1,87 @@
+"""Hot-path indexes for the worker and read queries
+
+Revision ID: f47b6175910d
+Revises: e5b19a7c3d60
+Create Date: 2026-10-16 12:31:55.740112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f47b6175910d'
+down_revision: Union[str, Sequence[str], None] = 'e5b19a7c3d60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING_STATUSES = "status IN ('UNPROCESSED', 'READY_FOR_AGENT', 'AGENT_PROCESSING')"
+
+# Plain indexes on primary key columns, duplicating the primary key index
+REDUNDANT_PK_INDEXES = [
+    ('ix_chats_chat_id', 'chats', 'chat_id'),
+    ('ix_users_user_id', 'users', 'user_id'),
+    ('ix_messages_message_id', 'messages', 'message_id'),
+    ('ix_agent_logs_id', 'agent_logs', 'id'),
+    ('ix_tasks_task_id', 'tasks', 'task_id'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction. If a build fails it leaves
+    # an INVALID index behind; drop it before re-running the migration.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_pending_status_time_received',
+            'messages',
+            ['status', 'time_received'],
+            postgresql_where=sa.text(PENDING_STATUSES),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_messages_chat_id_time_received',
+            'messages',
+            ['chat_id', 'time_received'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_tasks_status_created_at',
+            'tasks',
+            ['status', 'created_at'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_task_message_association_message_id',
+            'task_message_association',
+            ['message_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        for name, table, _ in REDUNDANT_PK_INDEXES:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, column in REDUNDANT_PK_INDEXES:
+            op.create_index(
+                name, table, [column], postgresql_concurrently=True, if_not_exists=True
+            )
+        for name, table in [
+            ('ix_task_message_association_message_id', 'task_message_association'),
+            ('ix_tasks_status_created_at', 'tasks'),
+            ('ix_messages_chat_id_time_received', 'messages'),
+            ('ix_messages_pending_status_time_received', 'messages'),
+        ]:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -1,83 +1,94 @@
+from collections import Counter
+from typing import List
+
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from app.api_schemas.message import MessageCreate, MessageResponse
+from app.api_schemas.message import (
+    MessageBatchItemResult,
+    MessageBatchItemStatus,
+    MessageBatchResponse,
+    MessageCreate,
+    MessageResponse,
+)
+from app.core.config import settings
 from app.core.database import get_db
-from app.models import Chat, Message, User
-from app.models.chat import ChatType
-from app.models.message import MessageStatus
+from app.services.admission import Rejection, admission
+from app.services.debounce_service import debounce_service
+from app.services.group_commit import WriteBufferFullError, write_buffer
+from app.services.message_ingestion import (
+    find_redelivery,
+    get_stored_messages,
+    ingest_message,
+    ingest_message_batch,
+)
 
 logger = structlog.get_logger()
-router = APIRouter(prefix="/messages", tags=["messages"])
+
+
+def admission_error(rejection: Rejection) -> HTTPException:
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=f"Admission refused: {rejection.reason}",
+        headers={"Retry-After": str(rejection.retry_after)},
+    )
+
+
+async def check_pipeline_admission():
+    """Refuse new messages while the agent pipeline or database is saturated"""
+    rejection = admission.check_pipeline()
+    if rejection is not None:
+        raise admission_error(rejection)
+
+
+router = APIRouter(
+    prefix="/messages",
+    tags=["messages"],
+    dependencies=[Depends(check_pipeline_admission)],
+)
 
 
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def create_message(
-    message_data: MessageCreate, db: AsyncSession = Depends(get_db)
+    message_data: MessageCreate,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Receive a text message, store it in database, and trigger debounced agent processing
+    (a redelivered message_id returns the stored message with 200)
     """
     try:
-        # Calculate character count
-        text_character_count = len(message_data.text_content)
-
-        # Extract sender_name and user_id from chat_members_struct
-        sender_name = None
-        user_id = None
-        for member in message_data.chat_members_struct:
-            if member.is_sender:
-                sender_name = member.name
-                user_id = member.user_id
-                break
-
-        # Ensure users exist or create them, and update name if changed
-        users = await get_or_create_users(db, message_data.chat_members_struct)
-        chat_type = ChatType.GROUP if len(users) > 2 else ChatType.PRIVATE
-        await get_or_create_chat(
-            db,
-            message_data.chat_id,
-            message_data.chat_display_name,
-            chat_type,
-            users,
-        )
+        stored = await find_redelivery(db, message_data.message_id)
+        if stored is not None:
+            return redelivered(response, stored)
 
-        # Convert ChatMember models to dicts for JSON storage
-        chat_members_struct = [
-            member.model_dump() for member in message_data.chat_members_struct
-        ]
+        rejection = admission.admit_chat(message_data.chat_id)
+        if rejection is not None:
+            raise admission_error(rejection)
 
-        # Create message in database
-        message = Message(
-            message_id=message_data.message_id,
-            text_content=message_data.text_content,
-            text_character_count=text_character_count,
-            status=MessageStatus.UNPROCESSED,
-            user_id=user_id,
-            chat_id=message_data.chat_id,
-            chat_members_struct=chat_members_struct,
-            sender_name=sender_name,
-            is_spam=message_data.is_spam or False,
-            replied_to_fk=message_data.replied_to_fk,
-        )
-        db.add(message)
-        await db.commit()
-        await db.refresh(message)
+        if write_buffer.running:
+            return await create_message_buffered(message_data, response, db)
+
+        message, created = await ingest_message(db, message_data)
+        if not created:
+            return redelivered(response, message)
+        debounce_service.notify(message.chat_id)
 
         logger.info(
             "Message created successfully",
             message_id=message.message_id,
-            text_length=text_character_count,
+            text_length=message.text_character_count,
         )
 
         print("message created successfully", message.message_id)
 
-        return message
+        return MessageResponse.model_validate(message)
 
+    except HTTPException:
+        raise
     except IntegrityError as e:
         db_error = str(e.orig)  # Get the original database error
         logger.error(
@@ -101,52 +112,103 @@ async def create_message(
         )
 
 
-async def get_or_create_users(db: AsyncSession, chat_members_struct):
-    user_ids = {member.user_id for member in chat_members_struct}
-    existing_users = await db.execute(select(User).where(User.user_id.in_(user_ids)))
-    existing_user_dict = {user.user_id: user for user in existing_users.scalars()}
+def redelivered(response: Response, stored) -> MessageResponse:
+    """Idempotent reply for a message_id that is already stored"""
+    logger.info("Message redelivered", message_id=stored.message_id)
+    response.status_code = status.HTTP_200_OK
+    return MessageResponse.model_validate(stored)
+
 
-    users = {}
-    for member in chat_members_struct:
-        user = existing_user_dict.get(
-            member.user_id, User(user_id=member.user_id, name=member.name)
+async def create_message_buffered(
+    message_data: MessageCreate, response: Response, db: AsyncSession
+):
+    """Create a message through the group-commit buffer"""
+    try:
+        result = await write_buffer.submit(message_data)
+    except WriteBufferFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Write buffer full: {e}",
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        error_msg = str(e)
+        logger.error("Failed to create message", error=error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create message: {error_msg}",
         )
-        # Update name if it changed
-        if user.user_id in existing_user_dict and user.name != member.name:
-            user.name = member.name
-        db.add(user)
-        users[member.user_id] = user
 
-    return users
+    if result.status == MessageBatchItemStatus.DUPLICATE:
+        stored = result.message
+        if stored is None:
+            # Stored concurrently by a request outside this flush
+            stored = (await get_stored_messages(db, [result.message_id]))[
+                result.message_id
+            ]
+        return redelivered(response, stored)
+    if result.status == MessageBatchItemStatus.ERROR:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Database error: {result.detail}",
+        )
+    debounce_service.notify(message_data.chat_id)
+    return result.message
 
 
-async def get_or_create_chat(
-    db: AsyncSession, chat_id, chat_display_name, chat_type, users
+@router.post("/batch", response_model=MessageBatchResponse)
+async def create_message_batch(
+    messages: List[MessageCreate], db: AsyncSession = Depends(get_db)
 ):
-    # Fetch chat with users relationship loaded
-    result = await db.execute(
-        select(Chat).options(selectinload(Chat.users)).where(Chat.chat_id == chat_id)
-    )
-    chat = result.scalars().first()
-    # If chat does not exist, create a new one
-    if not chat:
-        chat = Chat(
-            chat_id=chat_id,
-            chat_display_name=chat_display_name,
-            chat_type=chat_type,
-            users=list(users.values()),
+    """
+    Receive a burst of messages and store them in a single transaction.
+    Each item gets its own created / duplicate / error result.
+    """
+    if not messages:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Batch must contain at least one message",
         )
-    else:
-        # Update chat name if it has changed
-        if (
-            chat_display_name is not None
-            and chat.chat_display_name != chat_display_name
-        ):
-            chat.chat_display_name = chat_display_name
-        # Add new users to the chat if they are not already present
-        existing_user_ids = {user.user_id for user in chat.users}
-        for user in users.values():
-            if user.user_id not in existing_user_ids:
-                chat.users.append(user)
-    db.add(chat)
-    return chat
+    if len(messages) > settings.MESSAGE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {settings.MESSAGE_BATCH_MAX_SIZE} messages",
+        )
+
+    # Items over their chat's rate limit fail individually
+    results = {}
+    admitted = []
+    for index, item in enumerate(messages):
+        rejection = admission.admit_chat(item.chat_id)
+        if rejection is None:
+            admitted.append(index)
+        else:
+            results[index] = MessageBatchItemResult(
+                message_id=item.message_id,
+                status=MessageBatchItemStatus.ERROR,
+                detail=f"Chat rate limited, retry after {rejection.retry_after}s",
+            )
+
+    try:
+        if admitted:
+            stored = await ingest_message_batch(db, [messages[i] for i in admitted])
+            results.update(zip(admitted, stored))
+            for index in admitted:
+                if results[index].status == MessageBatchItemStatus.CREATED:
+                    debounce_service.notify(messages[index].chat_id)
+    except Exception as e:
+        error_msg = str(e)
+        logger.error("Failed to create message batch", error=error_msg)
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create message batch: {error_msg}",
+        )
+
+    counts = Counter(result.status for result in results.values())
+    return MessageBatchResponse(
+        created=counts[MessageBatchItemStatus.CREATED],
+        duplicates=counts[MessageBatchItemStatus.DUPLICATE],
+        errors=counts[MessageBatchItemStatus.ERROR],
+        results=[results[index] for index in range(len(messages))],
+    )
@@ -1,11 +1,20 @@
 from .chat import ChatCreate, ChatResponse
-from .message import MessageCreate, MessageResponse
+from .message import (
+    MessageBatchItemResult,
+    MessageBatchItemStatus,
+    MessageBatchResponse,
+    MessageCreate,
+    MessageResponse,
+)
 from .todo import TaskCreate, TaskResponse, TaskUpdate
 from .user import UserCreate, UserResponse
 
 __all__ = [
     "MessageCreate",
     "MessageResponse",
+    "MessageBatchItemResult",
+    "MessageBatchItemStatus",
+    "MessageBatchResponse",
     "TaskCreate",
     "TaskResponse",
     "TaskUpdate",
@@ -1,3 +1,4 @@
+import enum
 from datetime import datetime
 from typing import List, Optional
 
@@ -39,3 +40,23 @@ class MessageResponse(MessageBase):
     replied_to_fk: Optional[str] = None
     text_character_count: int
     time_received: datetime
+
+
+class MessageBatchItemStatus(enum.Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    ERROR = "error"
+
+
+class MessageBatchItemResult(BaseModel):
+    message_id: str
+    status: MessageBatchItemStatus
+    message: Optional[MessageResponse] = None  # Set when status is created
+    detail: Optional[str] = None  # Set when status is error
+
+
+class MessageBatchResponse(BaseModel):
+    created: int
+    duplicates: int
+    errors: int
+    results: List[MessageBatchItemResult]  # Same order as the request items
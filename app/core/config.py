@@ -3,12 +3,17 @@ from typing import Optional
 from urllib.parse import urlparse
 
 from dotenv import dotenv_values, load_dotenv
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 config = dotenv_values(".env")  # returns dict of key-value pairs
 # Load environment variables from .env file
 load_dotenv()
 
+# Connections a chat in the agent stage may hold at once: its lock connection,
+# which it drains on, and a brief one for lease renewal
+AGENT_CONNECTIONS_PER_CHAT = 2
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
@@ -24,20 +29,150 @@ class Settings(BaseSettings):
     if temp_db_url is None:
         raise ValueError("DATABASE_URL environment variable is not defined")
     DATABASE_URL: str = temp_db_url
+    # Connections each process's engine keeps open; unset, it is sized from
+    # MAX_CONCURRENT_AGENTS (see app/core/database.py). When set, it must leave
+    # AGENT_CONNECTIONS_PER_CHAT per agent chat plus one for the stage itself
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: int = 10
+
+    # Ingestion settings
+    MESSAGE_BATCH_MAX_SIZE: int = 500
+    ROSTER_CACHE_MAX_CHATS: int = 10000
+    ROSTER_CACHE_TTL_SECONDS: int = 300
+    RECENT_MESSAGE_IDS_MAX: int = 100000
+
+    # Group commit: coalesce concurrent message inserts into shared transactions
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_MAX_BATCH: int = 100
+    GROUP_COMMIT_MAX_DELAY_MS: int = 5
+    GROUP_COMMIT_MAX_QUEUE: int = 1000
+
+    # Admission control: shed ingestion load when the agent pipeline falls behind
+    ADMISSION_ENABLED: bool = False
+    CHAT_RATE_LIMIT_PER_SECOND: float = 5.0
+    CHAT_RATE_LIMIT_BURST: int = 20
+    ADMISSION_MAX_CHATS: int = 10000
+    ADMISSION_MAX_LAG_SECONDS: float = 600.0
+    ADMISSION_MAX_POOL_WAIT_MS: float = 500.0
+    ADMISSION_SAMPLE_INTERVAL_SECONDS: float = 2.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
 
     # Agent settings
     DEBOUNCE_SECONDS: int = 60
+    # Chats the worker runs the agent on at once, each on its own connection;
+    # run_agent_stage also caps it at what the engine's pool can serve
     MAX_CONCURRENT_AGENTS: int = 1
+    # Messages one agent pass claims for a chat; larger backlogs take more passes
+    AGENT_CLAIM_BATCH_SIZE: int = 200
+    # Estimated prompt tokens (characters / 4) per agent batch
+    AGENT_BATCH_TOKEN_BUDGET: int = 8000
+    # Agent batches slower than this shrink the message cap; faster ones grow it
+    AGENT_BATCH_TARGET_SECONDS: float = 30.0
+    # Agent batches still running after this are cancelled and released
+    AGENT_BATCH_TIMEOUT_SECONDS: float = 600.0
+    # Agent claims return to READY_FOR_AGENT unless renewed within this time
+    AGENT_LEASE_SECONDS: int = 300
+    # How often a worker returns expired agent claims
+    AGENT_LEASE_SWEEP_SECONDS: int = 60
+
+    # Agent result cache: batches with the same normalized senders and text,
+    # prompt version and model reuse the stored result instead of running the
+    # agent again
+    AGENT_PROMPT_VERSION: str = "v2"
+    AGENT_MODEL: str = "placeholder"
+    AGENT_RESULT_CACHE_MAX_ENTRIES: int = 1000
+    AGENT_RESULT_CACHE_MAX_ROWS: int = 100000
+    AGENT_RESULT_CACHE_MAX_AGE_SECONDS: int = 7 * 24 * 3600
+    # How often a worker deletes expired and overflow agent_results rows
+    AGENT_RESULT_CACHE_PRUNE_SECONDS: int = 3600
+
+    # Chat context: earlier messages of a chat shown to the agent with each
+    # batch, served from per-chat windows of the newest messages in memory
+    AGENT_CONTEXT_MESSAGES: int = 20
+    CHAT_CONTEXT_CACHE_MESSAGES_PER_CHAT: int = 100
+    # Estimated bytes across all chats; least recently used chats go first
+    CHAT_CONTEXT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CHAT_CONTEXT_CACHE_TTL_SECONDS: int = 300
+
+    # Model client: OpenAI-compatible chat completions endpoint the agent calls;
+    # unset keeps the placeholder agent
+    MODEL_BASE_URL: Optional[str] = None
+    MODEL_API_KEY: Optional[str] = None
+    # Multiplex calls over HTTP/2 when h2 is installed
+    MODEL_HTTP2: bool = True
+    MODEL_MAX_CONCURRENCY: int = 16
+    MODEL_MAX_CONCURRENCY_PER_CHAT: int = 2
+    MODEL_TIMEOUT_SECONDS: float = 120.0
+    MODEL_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    # Retries after a transport error, 408, 429 or 5xx, with jittered backoff
+    MODEL_MAX_RETRIES: int = 3
+    MODEL_RETRY_BASE_SECONDS: float = 0.5
+    MODEL_RETRY_MAX_SECONDS: float = 20.0
+
+    # Agent log writer: agent_logs entries are queued and written in bulk
+    AGENT_LOG_MAX_BATCH: int = 500
+    AGENT_LOG_MAX_DELAY_MS: int = 1000
+    AGENT_LOG_MAX_QUEUE: int = 10000
+    # When the queue is full: block, drop_debug or sample
+    AGENT_LOG_FULL_POLICY: str = "drop_debug"
+    # Flushes of at least this many rows use COPY instead of a multi-row INSERT
+    AGENT_LOG_COPY_MIN_ROWS: int = 200
+
+    # Agent log partitions: agent_logs is range-partitioned on created_at (UTC)
+    # into "day" or "week" partitions, created ahead and dropped after retention
+    AGENT_LOG_PARTITION_INTERVAL: str = "day"
+    AGENT_LOG_PARTITIONS_AHEAD_DAYS: int = 7
+    AGENT_LOG_RETENTION_DAYS: int = 30
+    AGENT_LOG_PARTITION_CHECK_SECONDS: int = 3600
+
+    # Embedded worker: run the processor and agent stages in the API process,
+    # woken by the messages router instead of a separate worker container
+    EMBEDDED_WORKER_ENABLED: bool = False
+    EMBEDDED_WORKER_MAX_QUEUE: int = 10000
+
+    # Worker settings
+    # Upper bound on sleep between passes when no NOTIFY arrives
+    WORKER_FALLBACK_POLL_SECONDS: int = 300
+    # Messages claimed per transaction; workers skip rows claimed by others
+    WORKER_CLAIM_BATCH_SIZE: int = 100
+    # Messages processed concurrently within one claimed batch
+    PROCESSOR_CONCURRENCY: int = 8
+    # Rows fetched per round trip when the worker scans the pending backlog
+    WORKER_SCAN_PAGE_SIZE: int = 1000
+    # Child processes for CPU-bound transforms; 0 runs them on the event loop
+    PROCESSOR_POOL_WORKERS: int = 0
+    # Messages sent to a pool child per task
+    PROCESSOR_POOL_CHUNKSIZE: int = 16
+    # Failed processing passes before a message is marked FAILED, so a few
+    # messages that always raise cannot hold up the oldest-first claims
+    PROCESSOR_MAX_ATTEMPTS: int = 3
 
     # APM settings
     ENABLE_APM: bool = True
     APM_SERVICE_NAME: str = "ai-assistant-server"
 
+    @model_validator(mode="after")
+    def check_pool_serves_agents(self):
+        if self.DB_POOL_SIZE is None:
+            return self
+        needed = AGENT_CONNECTIONS_PER_CHAT * self.MAX_CONCURRENT_AGENTS + 1
+        if self.DB_POOL_SIZE + self.DB_MAX_OVERFLOW < needed:
+            raise ValueError(
+                f"DB_POOL_SIZE + DB_MAX_OVERFLOW must be at least {needed} to run "
+                f"{self.MAX_CONCURRENT_AGENTS} agent chats at once"
+            )
+        return self
+
     @property
     def ASYNC_DATABASE_URL(self) -> str:
         parsed = urlparse(self.DATABASE_URL)
         return f"postgresql+asyncpg://{parsed.username}:{parsed.password}@{parsed.hostname}{parsed.path}?ssl=require"
 
+    @property
+    def ASYNCPG_DSN(self) -> str:
+        parsed = urlparse(self.DATABASE_URL)
+        return f"postgresql://{parsed.username}:{parsed.password}@{parsed.hostname}{parsed.path}?sslmode=require"
+
     @property
     def SYNC_DATABASE_URL(self) -> str:
         parsed = urlparse(self.DATABASE_URL)
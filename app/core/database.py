@@ -2,17 +2,25 @@ import structlog
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
-from app.core.config import settings
+from app.core.config import AGENT_CONNECTIONS_PER_CHAT, settings
 
 logger = structlog.get_logger()
 
 
+# Room for MAX_CONCURRENT_AGENTS agent chats; SQLAlchemy's default 5 stay for
+# requests and the worker's own sessions
+pool_size = settings.DB_POOL_SIZE or (
+    5 + AGENT_CONNECTIONS_PER_CHAT * settings.MAX_CONCURRENT_AGENTS
+)
+
 # Database engine - use the recommended format for Neon DB with asyncpg
 engine = create_async_engine(
     settings.ASYNC_DATABASE_URL,
     echo=settings.DEBUG,
     pool_pre_ping=True,
     pool_recycle=300,
+    pool_size=pool_size,
+    max_overflow=settings.DB_MAX_OVERFLOW,
 )
 
 # Async session factory
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Stand-in for an OpenAI-compatible model server, for offline load tests
+
+Answers POST /v1/chat/completions, streamed or not, with an agent reply that
+has no tasks, after a configurable latency with an exponential tail. A
+configurable fraction of requests fails with a retryable status. Tracks how
+many requests are in flight so tests can check client-side limits.
+
+    python -m app.fake_model_server --latency-ms 200 --tail-ms 300 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 16
+
+
+def create_app(
+    latency_ms: float = 200,
+    tail_ms: float = 0,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    completion_tokens: int = 50,
+    token_delay_ms: float = 0,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    """Fake model app; each reply waits `latency_ms` plus a tail of mean `tail_ms`"""
+    app = FastAPI(title="Fake model server")
+    rng = random.Random(seed)
+    state = app.state
+    state.requests = 0
+    state.errors = 0
+    state.in_flight = 0
+    state.max_in_flight = 0
+    reply = json.dumps(
+        {
+            "tasks": [],
+            "reasoning": "x" * max(0, completion_tokens * CHARS_PER_TOKEN - 30),
+        }
+    )
+
+    def usage(messages: List[dict]) -> dict:
+        prompt_chars = sum(len(message.get("content", "")) for message in messages)
+        return {
+            "prompt_tokens": -(-prompt_chars // CHARS_PER_TOKEN),
+            "completion_tokens": -(-len(reply) // CHARS_PER_TOKEN),
+        }
+
+    async def delay():
+        seconds = latency_ms / 1000
+        if tail_ms:
+            seconds += rng.expovariate(1000 / tail_ms)
+        await asyncio.sleep(seconds)
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        state.requests += 1
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            await delay()
+            if rng.random() < error_rate:
+                state.errors += 1
+                return JSONResponse(
+                    {"error": {"message": "Simulated overload"}},
+                    status_code=error_status,
+                )
+            if body.get("stream"):
+                return StreamingResponse(
+                    stream_reply(body), media_type="text/event-stream"
+                )
+            return {
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": reply}}
+                ],
+                "usage": usage(body.get("messages", [])),
+            }
+        finally:
+            state.in_flight -= 1
+
+    async def stream_reply(body: dict):
+        for start in range(0, len(reply), STREAM_CHUNK_CHARS):
+            if start and token_delay_ms:
+                await asyncio.sleep(token_delay_ms / 1000)
+            chunk = {
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": reply[start : start + STREAM_CHUNK_CHARS]},
+                    }
+                ]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        if body.get("stream_options", {}).get("include_usage"):
+            chunk = {"choices": [], "usage": usage(body.get("messages", []))}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument(
+        "--tail-ms", type=float, default=0, help="Mean of the exponential latency tail"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument(
+        "--token-delay-ms", type=float, default=0, help="Delay between streamed chunks"
+    )
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        tail_ms=args.tail_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        completion_tokens=args.completion_tokens,
+        token_delay_ms=args.token_delay_ms,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
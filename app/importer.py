@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Bulk import of chat history from NDJSON
+
+Each line is a MessageCreate JSON object, optionally with a `time_received`
+ISO-8601 timestamp. Lines are read incrementally and imported in chunks: each
+chunk is COPYed into temp staging tables and merged into users, chats,
+chat_users, chat_rosters and messages in one transaction, so memory stays bounded by the
+chunk size rather than the file size. Replies to messages in a later chunk
+are linked once every chunk is in.
+
+    python -m app.importer history.ndjson --status processed
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import IO, Iterator, List, Optional, Tuple
+
+import asyncpg
+import structlog
+from pydantic import ValidationError
+
+from app.api_schemas.message import MessageCreate
+from app.core.config import settings
+from app.models.message import MessageStatus
+from app.services.message_ingestion import (
+    build_message_values,
+    chat_type_for,
+    roster_members,
+    validate_message,
+)
+
+logger = structlog.get_logger()
+
+# ON COMMIT DELETE ROWS empties the staging tables after every chunk
+CREATE_STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS import_users (
+    user_id text, name text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_chats (
+    chat_id text, chat_display_name text, chat_type text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_chat_users (
+    chat_id text, user_id text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_rosters (
+    roster_hash text, members text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_messages (
+    message_id text,
+    text_content text,
+    text_character_count integer,
+    user_id text,
+    sender_name text,
+    roster_hash text,
+    chat_id text,
+    is_spam boolean,
+    replied_to_fk text,
+    time_received timestamptz
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_pending_replies (
+    message_id text, replied_to_fk text
+);
+TRUNCATE import_pending_replies;
+"""
+
+MESSAGE_COLUMNS = [
+    "message_id",
+    "text_content",
+    "text_character_count",
+    "user_id",
+    "sender_name",
+    "roster_hash",
+    "chat_id",
+    "is_spam",
+    "replied_to_fk",
+    "time_received",
+]
+
+MERGE_USERS = """
+INSERT INTO users (user_id, name)
+SELECT user_id, name FROM import_users ORDER BY user_id
+ON CONFLICT (user_id) DO UPDATE
+SET name = EXCLUDED.name, updated_at = now()
+WHERE users.name IS DISTINCT FROM EXCLUDED.name
+"""
+
+MERGE_CHATS = """
+INSERT INTO chats (chat_id, chat_display_name, chat_type)
+SELECT chat_id, chat_display_name, chat_type::chattype FROM import_chats
+ORDER BY chat_id
+ON CONFLICT (chat_id) DO UPDATE
+SET chat_display_name = EXCLUDED.chat_display_name, updated_at = now()
+WHERE EXCLUDED.chat_display_name IS NOT NULL
+  AND chats.chat_display_name IS DISTINCT FROM EXCLUDED.chat_display_name
+"""
+
+MERGE_CHAT_USERS = """
+INSERT INTO chat_users (chat_id, user_id)
+SELECT chat_id, user_id FROM import_chat_users ORDER BY chat_id, user_id
+ON CONFLICT DO NOTHING
+"""
+
+MERGE_ROSTERS = """
+INSERT INTO chat_rosters (roster_hash, members)
+SELECT roster_hash, members::json FROM import_rosters ORDER BY roster_hash
+ON CONFLICT (roster_hash) DO NOTHING
+"""
+
+# Replies to messages that are neither stored nor in this chunk are cleared
+# rather than failing the chunk on the foreign key; STAGE_PENDING_REPLIES
+# keeps those links, of messages this chunk inserts, for RESOLVE_PENDING_REPLIES
+STAGE_PENDING_REPLIES = """
+INSERT INTO import_pending_replies (message_id, replied_to_fk)
+SELECT s.message_id, s.replied_to_fk
+FROM import_messages s
+WHERE s.replied_to_fk IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.message_id = s.message_id)
+  AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.message_id = s.replied_to_fk)
+  AND NOT EXISTS (
+      SELECT 1 FROM import_messages r WHERE r.message_id = s.replied_to_fk
+  )
+"""
+
+# Run after the last chunk, when every imported reply target is stored
+RESOLVE_PENDING_REPLIES = """
+UPDATE messages m
+SET replied_to_fk = p.replied_to_fk
+FROM import_pending_replies p
+WHERE m.message_id = p.message_id
+  AND m.replied_to_fk IS NULL
+  AND EXISTS (SELECT 1 FROM messages t WHERE t.message_id = p.replied_to_fk)
+"""
+
+MERGE_MESSAGES = """
+INSERT INTO messages (
+    message_id, text_content, text_character_count, user_id, sender_name,
+    roster_hash, chat_id, is_spam, replied_to_fk, time_received, status
+)
+SELECT
+    s.message_id, s.text_content, s.text_character_count, s.user_id,
+    s.sender_name, s.roster_hash, s.chat_id, s.is_spam,
+    CASE
+        WHEN EXISTS (SELECT 1 FROM messages m WHERE m.message_id = s.replied_to_fk)
+          OR EXISTS (
+              SELECT 1 FROM import_messages r WHERE r.message_id = s.replied_to_fk
+          )
+        THEN s.replied_to_fk
+    END,
+    COALESCE(s.time_received, now()),
+    $1::messagestatus
+FROM import_messages s
+ON CONFLICT (message_id) DO NOTHING
+"""
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    invalid: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    # Replies whose target came in a later chunk, linked after the last one
+    replies_linked_late: int = 0
+    # Replies whose target is in neither the import nor the database
+    replies_dropped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def parse_line(line: str) -> Tuple[MessageCreate, Optional[datetime]]:
+    """Parse one NDJSON record into a message and its optional receive time"""
+    record = json.loads(line)
+    time_received = record.pop("time_received", None)
+    if time_received is not None:
+        time_received = datetime.fromisoformat(time_received)
+        if time_received.tzinfo is None:
+            time_received = time_received.replace(tzinfo=timezone.utc)
+    return MessageCreate.model_validate(record), time_received
+
+
+def iter_chunks(stream: IO[str], chunk_size: int, stats: ImportStats) -> Iterator:
+    """Yield lists of at most `chunk_size` valid records, counting bad lines"""
+    chunk = []
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        stats.read += 1
+        try:
+            item, time_received = parse_line(line)
+        except (ValueError, ValidationError) as e:
+            stats.invalid += 1
+            logger.warning("Skipping invalid line", line=line_number, error=str(e))
+            continue
+
+        values = build_message_values(item)
+        invalid_reason = validate_message(values, item)
+        if invalid_reason is not None:
+            stats.invalid += 1
+            logger.warning(
+                "Skipping invalid line", line=line_number, error=invalid_reason
+            )
+            continue
+
+        values["time_received"] = time_received
+        chunk.append((item, values))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_chunk(
+    conn: asyncpg.Connection, chunk: List[tuple], status: MessageStatus
+) -> int:
+    """COPY one chunk into staging and merge it; returns messages inserted"""
+    users = {}
+    chats = {}
+    chat_members = set()
+    rosters = {}
+    messages = {}
+    for item, values in chunk:
+        for member in item.chat_members_struct:
+            users[member.user_id] = member.name
+            chat_members.add((item.chat_id, member.user_id))
+        display_name, chat_type = chats.get(
+            item.chat_id, (None, chat_type_for(item.chat_members_struct).name)
+        )
+        if item.chat_display_name is not None:
+            display_name = item.chat_display_name
+        chats[item.chat_id] = (display_name, chat_type)
+        rosters.setdefault(values["roster_hash"], item)
+        # The first occurrence of an id wins, as it would across chunks
+        messages.setdefault(item.message_id, values)
+
+    async with conn.transaction():
+        await conn.copy_records_to_table(
+            "import_users", records=list(users.items()), columns=["user_id", "name"]
+        )
+        await conn.copy_records_to_table(
+            "import_chats",
+            records=[(chat_id, *chat) for chat_id, chat in chats.items()],
+            columns=["chat_id", "chat_display_name", "chat_type"],
+        )
+        await conn.copy_records_to_table(
+            "import_chat_users",
+            records=list(chat_members),
+            columns=["chat_id", "user_id"],
+        )
+        await conn.copy_records_to_table(
+            "import_rosters",
+            records=[
+                (key, json.dumps(roster_members(item))) for key, item in rosters.items()
+            ],
+            columns=["roster_hash", "members"],
+        )
+        await conn.copy_records_to_table(
+            "import_messages",
+            records=[
+                tuple(values[column] for column in MESSAGE_COLUMNS)
+                for values in messages.values()
+            ],
+            columns=MESSAGE_COLUMNS,
+        )
+
+        await conn.execute(MERGE_USERS)
+        await conn.execute(MERGE_CHATS)
+        await conn.execute(MERGE_CHAT_USERS)
+        await conn.execute(MERGE_ROSTERS)
+        await conn.execute(STAGE_PENDING_REPLIES)
+        result = await conn.execute(MERGE_MESSAGES, status.name)
+
+    # Status string looks like "INSERT 0 <rows>"
+    return int(result.split()[-1])
+
+
+async def resolve_pending_replies(conn: asyncpg.Connection, stats: ImportStats):
+    """Link replies whose target was imported in a later chunk, counting the
+    ones whose target never arrived
+    """
+    async with conn.transaction():
+        pending = await conn.fetchval("SELECT count(*) FROM import_pending_replies")
+        if not pending:
+            return
+        # Status string looks like "UPDATE <rows>"
+        result = await conn.execute(RESOLVE_PENDING_REPLIES)
+        await conn.execute("TRUNCATE import_pending_replies")
+    stats.replies_linked_late = int(result.split()[-1])
+    stats.replies_dropped = pending - stats.replies_linked_late
+    if stats.replies_dropped:
+        logger.warning(
+            "Dropped reply links to messages missing from the import",
+            count=stats.replies_dropped,
+        )
+
+
+async def import_ndjson(
+    stream: IO[str],
+    status: MessageStatus = MessageStatus.UNPROCESSED,
+    chunk_size: int = 5000,
+    conn: Optional[asyncpg.Connection] = None,
+) -> ImportStats:
+    """Import every record in `stream` and return throughput statistics"""
+    if conn is None:
+        own_connection = await asyncpg.connect(settings.ASYNCPG_DSN)
+        try:
+            return await import_ndjson(stream, status, chunk_size, own_connection)
+        finally:
+            await own_connection.close()
+
+    stats = ImportStats()
+    started = time.perf_counter()
+    await conn.execute(CREATE_STAGING_TABLES)
+    for chunk in iter_chunks(stream, chunk_size, stats):
+        inserted = await import_chunk(conn, chunk, status)
+        stats.inserted += inserted
+        stats.duplicates += len(chunk) - inserted
+        stats.elapsed = time.perf_counter() - started
+        logger.info(
+            "Imported chunk",
+            rows=len(chunk),
+            inserted=inserted,
+            total_read=stats.read,
+            rows_per_second=round(stats.rows_per_second),
+        )
+    await resolve_pending_replies(conn, stats)
+
+    stats.elapsed = time.perf_counter() - started
+    logger.info(
+        "Import finished",
+        read=stats.read,
+        inserted=stats.inserted,
+        duplicates=stats.duplicates,
+        invalid=stats.invalid,
+        replies_linked_late=stats.replies_linked_late,
+        replies_dropped=stats.replies_dropped,
+        elapsed=round(stats.elapsed, 2),
+        rows_per_second=round(stats.rows_per_second),
+    )
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=(__doc__ or "").partition("\n")[0])
+    parser.add_argument("path", help="NDJSON file to import, or - for stdin")
+    parser.add_argument(
+        "--status",
+        choices=["unprocessed", "processed"],
+        default="unprocessed",
+        help="Status for imported messages; processed skips the agent pipeline",
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    status = MessageStatus(args.status)
+    if args.path == "-":
+        stats = asyncio.run(import_ndjson(sys.stdin, status, args.chunk_size))
+    else:
+        with open(args.path, encoding="utf-8") as stream:
+            stats = asyncio.run(import_ndjson(stream, status, args.chunk_size))
+
+    print(
+        f"Imported {stats.inserted} of {stats.read} rows "
+        f"({stats.duplicates} duplicates, {stats.invalid} invalid, "
+        f"{stats.replies_dropped} reply links dropped) "
+        f"in {stats.elapsed:.1f}s, {stats.rows_per_second:.0f} rows/sec"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,17 @@ import time
 from contextlib import asynccontextmanager
 
 import structlog
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.api.routes import messages, todos
 from app.core.config import settings
 from app.core.middleware import APMMiddleware, LoggingMiddleware
-from app.services.agent_service import AgentService
-from app.services.debounce_service import DebounceService
+from app.services.admission import admission
+from app.services.agent_log_writer import agent_log_writer
+from app.services.debounce_service import debounce_service
+from app.services.group_commit import write_buffer
 
 # Configure structured logging
 structlog.configure(
@@ -32,19 +35,26 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
-# Global services
-debounce_service = DebounceService()
-agent_service = AgentService()
-
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting FastAPI application")
+    await agent_log_writer.start()
+    if settings.GROUP_COMMIT_ENABLED:
+        await write_buffer.start()
+    if settings.ADMISSION_ENABLED:
+        await admission.start()
+    if settings.EMBEDDED_WORKER_ENABLED:
+        await debounce_service.start()
     yield
     # Shutdown
     logger.info("Shutting down FastAPI application")
-    debounce_service.shutdown()
+    await admission.shutdown()
+    await write_buffer.shutdown()
+    await debounce_service.shutdown()
+    # Last, so logs written while the embedded worker stops are flushed
+    await agent_log_writer.shutdown()
 
 
 app = FastAPI(
@@ -80,6 +90,11 @@ async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 if __name__ == "__main__":
     import uvicorn
 
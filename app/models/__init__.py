@@ -1,7 +1,9 @@
 from .agent_log import AgentLog
+from .agent_result import AgentResult
 from .chat import Chat
+from .chat_roster import ChatRoster
 from .message import Message
 from .todo import Task
 from .user import User
 
-__all__ = ["Message", "Task", "User", "Chat", "AgentLog"]
+__all__ = ["Message", "Task", "User", "Chat", "ChatRoster", "AgentLog", "AgentResult"]
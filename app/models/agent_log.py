@@ -1,15 +1,28 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Enum, ForeignKey
-from sqlalchemy.sql import func
 import enum
 
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
+from sqlalchemy.sql import func
+
 from app.core.database import Base
 
+
 class AgentLogLevel(enum.Enum):
     DEBUG = "debug"
     INFO = "info"
     WARNING = "warning"
     ERROR = "error"
 
+
 class AgentLogType(enum.Enum):
     THOUGHT = "thought"
     ACTION = "action"
@@ -17,22 +30,35 @@ class AgentLogType(enum.Enum):
     DECISION = "decision"
     ERROR = "error"
 
+
 class AgentLog(Base):
     __tablename__ = "agent_logs"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, nullable=False, index=True)  # Groups related agent actions
+    __table_args__ = (
+        Index("ix_agent_logs_session_id_created_at", "session_id", "created_at"),
+        # Range partitions on created_at are created and dropped by
+        # app/services/agent_log_partitions.py
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)  # Groups related agent actions
     log_type = Column(Enum(AgentLogType), nullable=False)
     level = Column(Enum(AgentLogLevel), default=AgentLogLevel.INFO)
     message = Column(Text, nullable=False)
-    
+
     # Optional structured data
     extra_data = Column(JSON, nullable=True)
-    
+
     # Source tracking
     source_message_id = Column(String, ForeignKey("messages.message_id"), nullable=True)
-    
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
+
+    created_at = Column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
+
     def __repr__(self):
-        return f"<AgentLog(session_id={self.session_id}, type={self.log_type}, level={self.level})>"
+        return (
+            f"<AgentLog(session_id={self.session_id}, type={self.log_type}, "
+            f"level={self.level})>"
+        )
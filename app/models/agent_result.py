@@ -0,0 +1,15 @@
+from sqlalchemy import JSON, Column, DateTime, Float, String
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class AgentResult(Base):
+    __tablename__ = "agent_results"
+
+    cache_key = Column(String, primary_key=True)  # sha256 of batch content + prompt
+    result = Column(JSON, nullable=False)  # {"tasks": [...]} extracted by the agent
+    compute_seconds = Column(Float, nullable=False)  # Agent time the result cost
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
@@ -24,9 +24,7 @@ class ChatType(enum.Enum):
 class Chat(Base):
     __tablename__ = "chats"
 
-    chat_id = Column(
-        String, primary_key=True, index=True
-    )  # Chat ID passed in API calls
+    chat_id = Column(String, primary_key=True)  # Chat ID passed in API calls
     chat_display_name = Column(String, nullable=True)  # Display name for the chat
     chat_type = Column(SqlEnum(ChatType), nullable=False, default=ChatType.PRIVATE)
 
@@ -0,0 +1,16 @@
+from sqlalchemy import JSON, Column, DateTime, String
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class ChatRoster(Base):
+    __tablename__ = "chat_rosters"
+
+    roster_hash = Column(String, primary_key=True)  # sha256 of the member list
+    members = Column(JSON, nullable=False)  # [{user_id, name, is_sender}, ...]
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    messages = relationship("Message", back_populates="roster")
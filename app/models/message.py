@@ -1,15 +1,16 @@
 import enum
 
 from sqlalchemy import (
-    JSON,
     Boolean,
     Column,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -22,14 +23,25 @@ class MessageStatus(enum.Enum):
     READY_FOR_AGENT = "ready_for_agent"
     AGENT_PROCESSING = "agent_processing"
     PROCESSED = "processed"
+    FAILED = "failed"  # Processing kept raising; left for an operator
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Worker backlog scans only ever look at non-terminal statuses
+        Index(
+            "ix_messages_pending_status_time_received",
+            "status",
+            "time_received",
+            postgresql_where=text(
+                "status IN ('UNPROCESSED', 'READY_FOR_AGENT', 'AGENT_PROCESSING')"
+            ),
+        ),
+        Index("ix_messages_chat_id_time_received", "chat_id", "time_received"),
+    )
 
-    message_id = Column(
-        String, primary_key=True, index=True
-    )  # Primary key, must be unique
+    message_id = Column(String, primary_key=True)  # Primary key, must be unique
     text_content = Column(Text, nullable=False)  # Actual text body
     time_received = Column(
         DateTime(timezone=True), server_default=func.now()
@@ -38,7 +50,9 @@ class Message(Base):
         String, ForeignKey("users.user_id"), nullable=False
     )  # Sender ID (phone/email)
     sender_name = Column(String, nullable=True)  # Sender name
-    chat_members_struct = Column(JSON, nullable=True)  # Denormalized sender info
+    roster_hash = Column(
+        String, ForeignKey("chat_rosters.roster_hash"), nullable=True
+    )  # Chat members at the time the message was sent
     chat_id = Column(String, ForeignKey("chats.chat_id"), nullable=False)  # Chat ID
     is_spam = Column(Boolean, default=False, nullable=False)  # Spam flag
     replied_to_fk = Column(
@@ -48,10 +62,18 @@ class Message(Base):
         Enum(MessageStatus), default=MessageStatus.UNPROCESSED, nullable=False
     )
     text_character_count = Column(Integer, nullable=False)  # Character count
+    processing_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )  # Failed processing passes; FAILED once PROCESSOR_MAX_ATTEMPTS is reached
+    lease_owner = Column(String, nullable=True)  # Worker holding an agent claim
+    lease_expires_at = Column(
+        DateTime(timezone=True), nullable=True
+    )  # Claim returns to READY_FOR_AGENT after this unless renewed
 
     # Relationships
     user = relationship("User", back_populates="messages")
     chat = relationship("Chat", back_populates="messages")
+    roster = relationship("ChatRoster", back_populates="messages")
     replied_to = relationship("Message", remote_side=[message_id], backref="replies")
     tasks = relationship(
         "Task",
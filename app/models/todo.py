@@ -1,7 +1,7 @@
 import enum
 import uuid
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, String, Table, Text
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, String, Table, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -35,15 +35,16 @@ task_message_association = Table(
         "task_id", UUID(as_uuid=True), ForeignKey("tasks.task_id"), primary_key=True
     ),
     Column("message_id", String, ForeignKey("messages.message_id"), primary_key=True),
+    # The primary key leads with task_id, so lookups by message need their own
+    Index("ix_task_message_association_message_id", "message_id"),
 )
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_status_created_at", "status", "created_at"),)
 
-    task_id = Column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True
-    )
+    task_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     task_name = Column(String, nullable=False)  # Short name for task
     task_context = Column(Text, nullable=True)  # Longer version of task
     status = Column(Enum(TaskStatus), default=TaskStatus.OPEN)
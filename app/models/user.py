@@ -8,7 +8,7 @@ from app.core.database import Base
 class User(Base):
     __tablename__ = "users"
 
-    user_id = Column(String, primary_key=True, index=True)  # Phone number or email
+    user_id = Column(String, primary_key=True)  # Phone number or email
     name = Column(String, nullable=False)  # Name from contact book
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
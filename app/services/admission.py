@@ -0,0 +1,249 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Callable, NamedTuple, Optional
+
+import structlog
+from prometheus_client import Counter, Gauge
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.message import Message, MessageStatus
+
+logger = structlog.get_logger()
+
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Ingestion requests and batch items refused by admission control",
+    ["reason"],
+)
+
+PIPELINE_LAG = Gauge(
+    "pipeline_lag_seconds",
+    "How long the oldest waiting message has been due for processing",
+)
+
+DB_POOL_WAIT = Gauge(
+    "db_pool_wait_seconds",
+    "Time the admission sampler waited to acquire a pooled connection",
+)
+
+
+class Rejection(NamedTuple):
+    status_code: int
+    retry_after: int  # Whole seconds, for the Retry-After header
+    reason: str
+
+
+class TokenBucket:
+    """Allows bursts of `capacity` and a sustained `rate` per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """Spend `cost` tokens, or return the seconds until they are available"""
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Decides whether ingestion may accept more messages
+
+    Each chat gets its own token bucket (429 when empty). Globally, requests
+    are refused with 503 while the pipeline lag is over `max_lag_seconds` or
+    acquiring a pooled connection takes longer than `max_pool_wait_ms`. Both
+    signals come from a background sampler, so admission decisions never
+    touch the database.
+
+    The lag only counts messages that are actually waiting: UNPROCESSED
+    messages from when they arrived, and READY_FOR_AGENT messages from when
+    their chat's debounce window (`debounce_seconds`) closed. A chat that
+    never goes quiet is held by the debounce, not behind, and does not shed
+    other chats' writes.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        chat_rate: float,
+        chat_burst: int,
+        max_chats: int,
+        max_lag_seconds: float,
+        max_pool_wait_ms: float,
+        sample_interval_seconds: float,
+        retry_after_seconds: int,
+        debounce_seconds: float = settings.DEBOUNCE_SECONDS,
+        db_engine: AsyncEngine = engine,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.enabled = enabled
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self.max_lag_seconds = max_lag_seconds
+        self.max_pool_wait = max_pool_wait_ms / 1000
+        self.sample_interval = sample_interval_seconds
+        self.retry_after = retry_after_seconds
+        self.debounce_seconds = debounce_seconds
+        self.engine = db_engine
+        self.clock = clock
+        self.lag_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.sampled_at: Optional[float] = None
+        self._acquire_started: Optional[float] = None
+        self._buckets: OrderedDict = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    def check_pipeline(self) -> Optional[Rejection]:
+        """Global overload check based on the latest sampled signals"""
+        if not self.enabled:
+            return None
+
+        now = self.clock()
+        pool_wait = self.pool_wait_seconds
+        if self._acquire_started is not None:
+            # A sample stuck waiting for the pool is itself the signal
+            pool_wait = max(pool_wait, now - self._acquire_started)
+        if pool_wait > self.max_pool_wait:
+            return self._reject(503, self.retry_after, "pool_wait")
+
+        if self.sampled_at is None or now - self.sampled_at > 3 * self.sample_interval:
+            # No recent lag sample; fail open rather than refuse on stale data
+            return None
+        if self.lag_seconds > self.max_lag_seconds:
+            return self._reject(503, self.retry_after, "pipeline_lag")
+        return None
+
+    def admit_chat(self, chat_id: str) -> Optional[Rejection]:
+        """Spend one token from the chat's bucket"""
+        if not self.enabled:
+            return None
+
+        now = self.clock()
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            self._buckets[chat_id] = bucket
+            while len(self._buckets) > self.max_chats:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+
+        wait = bucket.take(now)
+        if wait:
+            return self._reject(429, wait, "chat_rate")
+        return None
+
+    def reset(self):
+        """Forget per-chat buckets and sampled signals"""
+        self._buckets.clear()
+        self.lag_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.sampled_at = None
+
+    async def sample(self):
+        """Measure connection acquire time and pipeline lag once"""
+        self._acquire_started = self.clock()
+        try:
+            async with self.engine.connect() as conn:
+                self.pool_wait_seconds = self.clock() - self._acquire_started
+                self._acquire_started = None
+                # Computed by the database so client clock skew does not matter
+                lag = await conn.scalar(self._lag_query())
+        finally:
+            self._acquire_started = None
+
+        self.lag_seconds = max(0.0, float(lag or 0))
+        self.sampled_at = self.clock()
+        PIPELINE_LAG.set(self.lag_seconds)
+        DB_POOL_WAIT.set(self.pool_wait_seconds)
+
+    def _lag_query(self):
+        """Seconds since the earliest moment a waiting message became due"""
+        oldest_unprocessed = (
+            select(func.min(Message.time_received))
+            .where(Message.status == MessageStatus.UNPROCESSED)
+            .scalar_subquery()
+        )
+        ready_chats = (
+            select(Message.chat_id)
+            .where(Message.status == MessageStatus.READY_FOR_AGENT)
+            .distinct()
+            .subquery()
+        )
+        newer = aliased(Message)
+        chat_latest = (
+            select(func.max(newer.time_received))
+            .where(newer.chat_id == ready_chats.c.chat_id)
+            .scalar_subquery()
+        )
+        # The chat whose debounce window closed first; a window still open
+        # lies in the future and adds no lag
+        quietest_ready_chat = (
+            select(func.min(chat_latest)).select_from(ready_chats).scalar_subquery()
+        )
+        due_since = func.least(
+            oldest_unprocessed,
+            quietest_ready_chat + timedelta(seconds=self.debounce_seconds),
+        )
+        return select(func.extract("epoch", func.now() - due_since))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Admission control enabled",
+            chat_rate=self.chat_rate,
+            max_lag_seconds=self.max_lag_seconds,
+        )
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logger.warning("Admission sample failed", error=str(e))
+            await asyncio.sleep(self.sample_interval)
+
+    def _reject(self, status_code: int, wait: float, reason: str) -> Rejection:
+        ADMISSION_REJECTIONS.labels(reason=reason).inc()
+        return Rejection(status_code, max(1, math.ceil(wait)), reason)
+
+
+admission = AdmissionController(
+    enabled=settings.ADMISSION_ENABLED,
+    chat_rate=settings.CHAT_RATE_LIMIT_PER_SECOND,
+    chat_burst=settings.CHAT_RATE_LIMIT_BURST,
+    max_chats=settings.ADMISSION_MAX_CHATS,
+    max_lag_seconds=settings.ADMISSION_MAX_LAG_SECONDS,
+    max_pool_wait_ms=settings.ADMISSION_MAX_POOL_WAIT_MS,
+    sample_interval_seconds=settings.ADMISSION_SAMPLE_INTERVAL_SECONDS,
+    retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    debounce_seconds=settings.DEBOUNCE_SECONDS,
+)
@@ -0,0 +1,229 @@
+import hashlib
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, NamedTuple, Optional
+
+import structlog
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.models.agent_log import AgentLog
+
+logger = structlog.get_logger()
+
+AGENT_LOG_PARTITIONS = Gauge(
+    "agent_log_partitions",
+    "Range partitions of agent_logs after the last maintenance pass",
+)
+AGENT_LOG_PARTITION_CHANGES = Counter(
+    "agent_log_partition_changes_total",
+    "Agent log partitions created or dropped",
+    ["action"],
+)
+
+INTERVALS = ("day", "week")
+PARENT = AgentLog.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+PARTITION_NAME = re.compile(rf"^{PARENT}_(\d{{8}})_(\d{{8}})$")
+# Keeps concurrent workers from creating the same partition twice
+MAINTENANCE_LOCK_KEY = int.from_bytes(
+    hashlib.blake2b(b"agent_log_partitions", digest_size=8).digest(),
+    "big",
+    signed=True,
+)
+
+
+class Partition(NamedTuple):
+    name: str
+    start: date
+    end: date
+
+
+def period_end(day: date, interval: str) -> date:
+    """First day of the period after the one containing `day`; weeks start
+    on Monday
+    """
+    if interval == "week":
+        return day + timedelta(days=7 - day.weekday())
+    return day + timedelta(days=1)
+
+
+def partition_name(start: date, end: date) -> str:
+    return f"{PARENT}_{start:%Y%m%d}_{end:%Y%m%d}"
+
+
+def parse_partition(name: str) -> Optional[Partition]:
+    """Bounds of a partition from its name; None for the default partition
+    and anything else not named by `partition_name`
+    """
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    start, end = (datetime.strptime(day, "%Y%m%d").date() for day in match.groups())
+    return Partition(name, start, end)
+
+
+def bound(day: date) -> str:
+    """Partition bound literal for midnight UTC on `day`"""
+    return f"{day:%Y-%m-%d} 00:00:00+00"
+
+
+def plan_partitions(
+    existing: list, today: date, ahead_days: int, interval: str
+) -> list:
+    """Partitions to create so that every day from `today` through
+    `today + ahead_days` is covered
+
+    New partitions end on `interval` boundaries but are clipped to start
+    after and end before existing ones, so changing the interval never
+    produces overlapping ranges.
+    """
+    existing = sorted(existing, key=lambda partition: partition.start)
+    planned = []
+    day = today
+    last = today + timedelta(days=ahead_days)
+    while day <= last:
+        covering = next((p for p in existing if p.start <= day < p.end), None)
+        if covering is not None:
+            day = covering.end
+            continue
+        end = period_end(day, interval)
+        following = next((p.start for p in existing if p.start > day), None)
+        if following is not None:
+            end = min(end, following)
+        planned.append(Partition(partition_name(day, end), day, end))
+        day = end
+    return planned
+
+
+class AgentLogPartitions:
+    """Creates agent_logs partitions ahead of time and drops expired ones
+
+    agent_logs is range-partitioned on created_at into UTC `interval`
+    partitions named after their bounds. Each maintenance pass makes sure
+    partitions exist through `ahead_days` from today and drops every
+    partition that ended `retention_days` or more ago, which removes its
+    rows without a DELETE. Rows that fall outside every partition land in
+    agent_logs_default; they are moved into new partitions as those are
+    created and deleted there once past retention.
+    """
+
+    def __init__(
+        self,
+        interval: str,
+        ahead_days: int,
+        retention_days: int,
+        check_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if interval not in INTERVALS:
+            raise ValueError(
+                f"Unknown agent log partition interval {interval!r}; "
+                f"expected one of {', '.join(INTERVALS)}"
+            )
+        self.interval = interval
+        self.ahead_days = ahead_days
+        self.retention_days = retention_days
+        self.check_seconds = check_seconds
+        self.clock = clock
+        self._next_check = 0.0
+
+    async def existing(self, db) -> list:
+        result = await db.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :parent"
+            ),
+            {"parent": PARENT},
+        )
+        partitions = (parse_partition(name) for name in result.scalars())
+        return sorted((p for p in partitions if p is not None), key=lambda p: p.start)
+
+    async def maybe_maintain(self, db) -> bool:
+        """Run `maintain` at most once every `check_seconds`"""
+        if self.clock() < self._next_check:
+            return False
+        self._next_check = self.clock() + self.check_seconds
+        try:
+            return await self.maintain(db)
+        except Exception as e:
+            # The default partition keeps logging working until the next pass
+            await db.rollback()
+            logger.error("Agent log partition maintenance failed", error=str(e))
+            return False
+
+    async def maintain(self, db, today: Optional[date] = None) -> bool:
+        """Create upcoming partitions and drop expired ones; commits
+
+        Returns False without changes when another worker holds the
+        maintenance lock.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        locked = await db.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:key)"),
+            {"key": MAINTENANCE_LOCK_KEY},
+        )
+        if not locked:
+            await db.rollback()
+            return False
+
+        existing = await self.existing(db)
+        created = plan_partitions(existing, today, self.ahead_days, self.interval)
+        for partition in created:
+            await self._create(db, partition)
+
+        cutoff = today - timedelta(days=self.retention_days)
+        dropped = [p for p in existing if p.end <= cutoff]
+        for partition in dropped:
+            await db.execute(text(f'DROP TABLE "{partition.name}"'))
+        await db.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"),
+            {"cutoff": datetime.combine(cutoff, datetime.min.time(), timezone.utc)},
+        )
+        await db.commit()
+
+        AGENT_LOG_PARTITION_CHANGES.labels(action="created").inc(len(created))
+        AGENT_LOG_PARTITION_CHANGES.labels(action="dropped").inc(len(dropped))
+        AGENT_LOG_PARTITIONS.set(len(existing) + len(created) - len(dropped))
+        if created or dropped:
+            logger.info(
+                "Maintained agent log partitions",
+                created=[p.name for p in created],
+                dropped=[p.name for p in dropped],
+            )
+        return True
+
+    async def _create(self, db, partition: Partition):
+        # Built detached and then attached, so that rows already in the
+        # default partition for this range can be moved into it first, and
+        # attaching only takes a SHARE UPDATE EXCLUSIVE lock on agent_logs
+        name = partition.name
+        start, end = bound(partition.start), bound(partition.end)
+        await db.execute(
+            text(f'CREATE TABLE "{name}" (LIKE {PARENT} INCLUDING DEFAULTS)')
+        )
+        await db.execute(
+            text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= '{start}' AND created_at < '{end}' "
+                f'RETURNING *) INSERT INTO "{name}" SELECT * FROM moved'
+            )
+        )
+        await db.execute(
+            text(
+                f'ALTER TABLE {PARENT} ATTACH PARTITION "{name}" '
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+        )
+
+
+agent_log_partitions = AgentLogPartitions(
+    interval=settings.AGENT_LOG_PARTITION_INTERVAL,
+    ahead_days=settings.AGENT_LOG_PARTITIONS_AHEAD_DAYS,
+    retention_days=settings.AGENT_LOG_RETENTION_DAYS,
+    check_seconds=settings.AGENT_LOG_PARTITION_CHECK_SECONDS,
+)
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.agent_log import AgentLog, AgentLogLevel, AgentLogType
+
+logger = structlog.get_logger()
+
+AGENT_LOG_FLUSH_SIZE = Histogram(
+    "agent_log_flush_size",
+    "Agent log rows written per flush",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500),
+)
+AGENT_LOG_FLUSH_DURATION = Histogram(
+    "agent_log_flush_duration_seconds",
+    "Time to write and commit one agent log flush",
+)
+AGENT_LOG_QUEUE_DEPTH = Gauge(
+    "agent_log_queue_depth",
+    "Agent log entries waiting for the next flush",
+)
+AGENT_LOG_WRITTEN = Counter(
+    "agent_log_rows_written_total",
+    "Agent log rows committed",
+)
+AGENT_LOG_DROPPED = Counter(
+    "agent_log_entries_dropped_total",
+    "Agent log entries discarded, by reason",
+    ["reason"],
+)
+
+FULL_POLICIES = ("block", "drop_debug", "sample")
+COPY_COLUMNS = [
+    "session_id",
+    "log_type",
+    "level",
+    "message",
+    "extra_data",
+    "source_message_id",
+    "created_at",
+]
+
+
+class AgentLogWriter:
+    """Queues agent log entries and writes them to agent_logs in bulk
+
+    `log` only waits for room in the queue, never for the database. A single
+    flusher task writes up to `max_batch` entries per transaction, at most
+    `max_delay_ms` after it sees the first of them; flushes of at least
+    `copy_min_rows` rows use COPY, smaller ones a multi-row INSERT. When
+    `max_queue` entries are waiting, `full_policy` decides what happens:
+    "block" makes callers wait for the next flush, "drop_debug" discards
+    queued DEBUG entries (oldest first) to make room and otherwise the new
+    entry, and "sample" keeps a uniform random sample of everything logged
+    while the queue is full. Entries carry the time they were logged, not
+    the time they were written.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_delay_ms: float,
+        max_queue: int,
+        full_policy: str,
+        copy_min_rows: int,
+        session_factory=AsyncSessionLocal,
+        rng: Optional[random.Random] = None,
+    ):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(
+                f"Unknown agent log full policy {full_policy!r}; "
+                f"expected one of {', '.join(FULL_POLICIES)}"
+            )
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self.full_policy = full_policy
+        self.copy_min_rows = copy_min_rows
+        self.session_factory = session_factory
+        self.rng = rng or random.Random()
+        self.flushes = 0
+        self._entries: deque = deque()
+        self._debug_queued = 0
+        # Entries offered since the queue last filled, for reservoir sampling
+        self._offered_while_full = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Agent log writer started",
+            max_batch=self.max_batch,
+            full_policy=self.full_policy,
+        )
+
+    async def log(
+        self,
+        session_id: str,
+        log_type: AgentLogType,
+        message: str,
+        level: AgentLogLevel = AgentLogLevel.INFO,
+        extra_data: Optional[dict] = None,
+        source_message_id: Optional[str] = None,
+    ) -> bool:
+        """Queue one agent step; returns whether it was kept"""
+        entry = {
+            "session_id": session_id,
+            "log_type": log_type,
+            "level": level,
+            "message": message,
+            "extra_data": extra_data,
+            "source_message_id": source_message_id,
+            "created_at": datetime.now(timezone.utc),
+        }
+        if self.full_policy == "block":
+            while self.running and len(self._entries) >= self.max_queue:
+                self._space.clear()
+                await self._space.wait()
+        if not self.running:
+            AGENT_LOG_DROPPED.labels(reason="stopped").inc()
+            return False
+
+        if len(self._entries) < self.max_queue:
+            self._append(entry)
+            return True
+        if self.full_policy == "drop_debug":
+            return self._replace_debug(entry)
+        return self._sample(entry)
+
+    def _append(self, entry: dict):
+        self._entries.append(entry)
+        if entry["level"] is AgentLogLevel.DEBUG:
+            self._debug_queued += 1
+        # The flusher only needs waking for a new batch or a full one
+        if len(self._entries) == 1 or len(self._entries) >= self.max_batch:
+            self._wakeup.set()
+        AGENT_LOG_QUEUE_DEPTH.set(len(self._entries))
+
+    def _replace_debug(self, entry: dict) -> bool:
+        if entry["level"] is AgentLogLevel.DEBUG or not self._debug_queued:
+            AGENT_LOG_DROPPED.labels(
+                reason="debug" if entry["level"] is AgentLogLevel.DEBUG else "full"
+            ).inc()
+            return False
+        for i, queued in enumerate(self._entries):
+            if queued["level"] is AgentLogLevel.DEBUG:
+                del self._entries[i]
+                self._debug_queued -= 1
+                break
+        AGENT_LOG_DROPPED.labels(reason="debug").inc()
+        self._append(entry)
+        return True
+
+    def _sample(self, entry: dict) -> bool:
+        # Reservoir sampling: the n-th entry offered to a full queue of k
+        # replaces a random queued one with probability k / n
+        self._offered_while_full += 1
+        AGENT_LOG_DROPPED.labels(reason="sampled").inc()
+        slot = self.rng.randrange(self.max_queue + self._offered_while_full)
+        if slot >= len(self._entries):
+            return False
+        if self._entries[slot]["level"] is AgentLogLevel.DEBUG:
+            self._debug_queued -= 1
+        if entry["level"] is AgentLogLevel.DEBUG:
+            self._debug_queued += 1
+        self._entries[slot] = entry
+        return True
+
+    async def shutdown(self):
+        """Stop accepting entries and flush everything already queued"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        # Blocked callers give up rather than wait on a stopped writer
+        self._space.set()
+        await self._task
+        self._task = None
+        logger.info("Agent log writer drained", flushes=self.flushes)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._entries:
+                if self._closing:
+                    break
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            deadline = loop.time() + self.max_delay
+            while len(self._entries) < self.max_batch and not self._closing:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [
+                self._entries.popleft()
+                for _ in range(min(self.max_batch, len(self._entries)))
+            ]
+            self._debug_queued -= sum(
+                entry["level"] is AgentLogLevel.DEBUG for entry in batch
+            )
+            self._offered_while_full = 0
+            self._space.set()
+            AGENT_LOG_QUEUE_DEPTH.set(len(self._entries))
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                if len(batch) >= self.copy_min_rows:
+                    await self._copy(db, batch)
+                else:
+                    await db.execute(insert(AgentLog), batch)
+                await db.commit()
+        except Exception as e:
+            # Logs are best effort; losing a flush must not stop the agent
+            logger.error("Agent log flush failed", size=len(batch), error=str(e))
+            AGENT_LOG_DROPPED.labels(reason="flush_error").inc(len(batch))
+            return
+        finally:
+            self.flushes += 1
+            AGENT_LOG_FLUSH_SIZE.observe(len(batch))
+            AGENT_LOG_FLUSH_DURATION.observe(time.perf_counter() - started)
+        AGENT_LOG_WRITTEN.inc(len(batch))
+
+    async def _copy(self, db, batch: list):
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            AgentLog.__tablename__,
+            records=[
+                (
+                    entry["session_id"],
+                    entry["log_type"].name,
+                    entry["level"].name,
+                    entry["message"],
+                    None
+                    if entry["extra_data"] is None
+                    else json.dumps(entry["extra_data"]),
+                    entry["source_message_id"],
+                    entry["created_at"],
+                )
+                for entry in batch
+            ],
+            columns=COPY_COLUMNS,
+        )
+
+
+agent_log_writer = AgentLogWriter(
+    max_batch=settings.AGENT_LOG_MAX_BATCH,
+    max_delay_ms=settings.AGENT_LOG_MAX_DELAY_MS,
+    max_queue=settings.AGENT_LOG_MAX_QUEUE,
+    full_policy=settings.AGENT_LOG_FULL_POLICY,
+    copy_min_rows=settings.AGENT_LOG_COPY_MIN_ROWS,
+)
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import delete, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.agent_result import AgentResult
+
+logger = structlog.get_logger()
+
+AGENT_RESULT_CACHE_LOOKUPS = Counter(
+    "agent_result_cache_lookups_total",
+    "Agent result cache lookups by outcome (memory, database, coalesced or miss)",
+    ["result"],
+)
+AGENT_RESULT_CACHE_SECONDS_SAVED = Counter(
+    "agent_result_cache_seconds_saved_total",
+    "Agent compute time skipped by reusing a cached or in-flight result",
+)
+
+
+class CachedResult(NamedTuple):
+    result: dict
+    compute_seconds: float
+    stored_at: float
+
+
+def normalize_text(text: str) -> str:
+    """Fold the differences forwarding and re-posting introduce"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def batch_cache_key(
+    texts: Iterable[str],
+    prompt_version: str = settings.AGENT_PROMPT_VERSION,
+    model: str = settings.AGENT_MODEL,
+    context: Iterable[str] = (),
+) -> str:
+    """Content address of everything the agent is shown for a batch: its
+    message lines, a digest of the earlier context lines, the prompt version
+    and the model
+
+    A result is only reused for a batch shown the same context it was
+    computed with.
+    """
+    context_digest = hashlib.sha256(
+        json.dumps([normalize_text(text) for text in context]).encode()
+    ).hexdigest()
+    canonical = json.dumps(
+        [
+            prompt_version,
+            model,
+            context_digest,
+            [normalize_text(text) for text in texts],
+        ],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AgentResultCache:
+    """Two-tier cache of agent results by batch content
+
+    An in-process LRU of `max_entries` sits in front of the agent_results
+    table. Both tiers ignore entries older than `max_age_seconds`; `prune`
+    deletes expired rows and keeps the table near `max_rows`, and
+    `maybe_prune` runs it every `prune_seconds`. Concurrent
+    lookups of a key that is being computed wait for that computation
+    instead of starting their own.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.AGENT_RESULT_CACHE_MAX_ENTRIES,
+        max_rows: int = settings.AGENT_RESULT_CACHE_MAX_ROWS,
+        max_age_seconds: float = settings.AGENT_RESULT_CACHE_MAX_AGE_SECONDS,
+        prune_seconds: float = settings.AGENT_RESULT_CACHE_PRUNE_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.max_age = max_age_seconds
+        self.prune_seconds = prune_seconds
+        self.clock = clock
+        self._next_prune = 0.0
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.stored_at + self.max_age <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, result: dict, compute_seconds: float):
+        self._entries[key] = CachedResult(result, compute_seconds, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def evict(self, db, key: str):
+        """Forget a result that turned out to be unusable, in both tiers; commits"""
+        self._entries.pop(key, None)
+        await db.execute(delete(AgentResult).where(AgentResult.cache_key == key))
+        await db.commit()
+
+    async def get_or_compute(
+        self, db, key: str, compute: Callable[[], Awaitable[dict]]
+    ) -> dict:
+        """Return the cached result for `key`, computing and storing it on a miss
+
+        The database row is written on `db` but not committed; the caller
+        commits it with the rest of the batch.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return self._hit("memory", entry)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Shielded so a caller timing out does not cancel the shared work
+            result, compute_seconds = await asyncio.shield(inflight)
+            AGENT_RESULT_CACHE_LOOKUPS.labels(result="coalesced").inc()
+            AGENT_RESULT_CACHE_SECONDS_SAVED.inc(compute_seconds)
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._get_stored(db, key)
+            if entry is not None:
+                self.put(key, entry.result, entry.compute_seconds)
+                future.set_result((entry.result, entry.compute_seconds))
+                return self._hit("database", entry)
+
+            AGENT_RESULT_CACHE_LOOKUPS.labels(result="miss").inc()
+            started = time.monotonic()
+            result = await compute()
+            compute_seconds = time.monotonic() - started
+            await self._store(db, key, result, compute_seconds)
+            self.put(key, result, compute_seconds)
+            future.set_result((result, compute_seconds))
+            return result
+        except BaseException as e:
+            if not future.done():
+                # Waiters fail with a plain error even if this caller was
+                # cancelled, so the cancellation does not spread to them
+                future.set_exception(
+                    e
+                    if isinstance(e, Exception)
+                    else RuntimeError("Coalesced agent computation was cancelled")
+                )
+                # Retrieved here so an unawaited failure is not logged as lost
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _hit(self, tier: str, entry: CachedResult) -> dict:
+        AGENT_RESULT_CACHE_LOOKUPS.labels(result=tier).inc()
+        AGENT_RESULT_CACHE_SECONDS_SAVED.inc(entry.compute_seconds)
+        return entry.result
+
+    def _cutoff(self) -> datetime:
+        return datetime.fromtimestamp(self.clock(), tz=timezone.utc) - timedelta(
+            seconds=self.max_age
+        )
+
+    async def _get_stored(self, db, key: str) -> Optional[CachedResult]:
+        result = await db.execute(
+            select(AgentResult.result, AgentResult.compute_seconds).where(
+                AgentResult.cache_key == key, AgentResult.created_at > self._cutoff()
+            )
+        )
+        row = result.first()
+        if row is None:
+            return None
+        return CachedResult(row.result, row.compute_seconds, self.clock())
+
+    async def _store(self, db, key: str, result: dict, compute_seconds: float):
+        statement = insert(AgentResult).values(
+            cache_key=key, result=result, compute_seconds=compute_seconds
+        )
+        # An expired row for the same key is refreshed in place
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[AgentResult.cache_key],
+                set_={
+                    "result": statement.excluded.result,
+                    "compute_seconds": statement.excluded.compute_seconds,
+                    "created_at": statement.excluded.created_at,
+                },
+            )
+        )
+
+    async def maybe_prune(self, db) -> int:
+        """Run `prune` at most once every `prune_seconds`"""
+        if self.clock() < self._next_prune:
+            return 0
+        self._next_prune = self.clock() + self.prune_seconds
+        return await self.prune(db)
+
+    async def prune(self, db) -> int:
+        """Delete expired rows and all but the newest `max_rows`; commits"""
+        expired = await db.execute(
+            delete(AgentResult).where(AgentResult.created_at <= self._cutoff())
+        )
+        pruned = expired.rowcount
+        if await self._may_overflow(db):
+            # created_at of the first row past the newest `max_rows`; NULL,
+            # and so no deletes, while the table is smaller than that
+            boundary = (
+                select(AgentResult.created_at)
+                .order_by(AgentResult.created_at.desc())
+                .offset(self.max_rows)
+                .limit(1)
+                .scalar_subquery()
+            )
+            overflow = await db.execute(
+                delete(AgentResult).where(AgentResult.created_at <= boundary)
+            )
+            pruned += overflow.rowcount
+        await db.commit()
+        if pruned:
+            logger.info("Pruned agent result cache", rows=pruned)
+        return pruned
+
+    async def _may_overflow(self, db) -> bool:
+        # The planner's row estimate is free, unlike walking `max_rows` index
+        # entries to find the boundary; it is negative before the first
+        # ANALYZE, when only the exact check will do
+        estimate = await db.scalar(
+            text("SELECT reltuples FROM pg_class WHERE relname = :table"),
+            {"table": AgentResult.__tablename__},
+        )
+        return estimate is None or estimate < 0 or estimate >= self.max_rows
@@ -1,58 +1,627 @@
 import asyncio
-from typing import Optional
+import hashlib
+import json
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
+from datetime import timedelta
+from typing import AsyncIterator, List, Optional, Sequence
 
 import structlog
-from sqlalchemy import update
+from prometheus_client import Counter, Histogram
+from sqlalchemy import String, any_, bindparam, insert, or_, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.sql import func
 
+from app.core.config import settings
+from app.models.agent_log import AgentLogLevel, AgentLogType
 from app.models.message import Message, MessageStatus
+from app.models.todo import Task, TaskOrEvent, TaskType, task_message_association
+from app.services.agent_log_writer import AgentLogWriter, agent_log_writer
+from app.services.agent_result_cache import AgentResultCache, batch_cache_key
+from app.services.batch_sizer import AdaptiveBatchSizer
+from app.services.chat_context_cache import (
+    ChatContextCache,
+    ContextMessage,
+    chat_context,
+    chat_context_cache,
+    context_message,
+)
+from app.services.model_backend import ModelBackend, model_backend_from_settings
 
 logger = structlog.get_logger()
 
+AGENT_CHAT_LOCKS = Counter(
+    "agent_chat_lock_attempts_total",
+    "Per-chat advisory lock attempts; contended means another worker owns the chat",
+    ["result"],
+)
+AGENT_BATCH_MESSAGES = Histogram(
+    "agent_batch_messages",
+    "Messages per agent batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+AGENT_BATCH_TOKENS = Histogram(
+    "agent_batch_estimated_tokens",
+    "Estimated prompt tokens per agent batch",
+    buckets=(100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000),
+)
+AGENT_BATCH_TIMEOUTS = Counter(
+    "agent_batch_timeouts_total",
+    "Agent batches abandoned after AGENT_BATCH_TIMEOUT_SECONDS",
+)
+AGENT_LEASES_RECLAIMED = Counter(
+    "agent_leases_reclaimed_total",
+    "Messages returned to READY_FOR_AGENT after their agent lease expired",
+)
+
+
+# Rough English average, good enough to keep batches inside a context window
+CHARS_PER_TOKEN = 4
+
+
+def estimated_tokens(characters: int) -> int:
+    return -(-characters // CHARS_PER_TOKEN)
+
+
+def chat_lock_key(chat_id: str) -> int:
+    """Stable signed 64-bit advisory lock key for a chat"""
+    digest = hashlib.blake2b(chat_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+AGENT_INSTRUCTIONS = (
+    "You turn chat messages into to-do items. Reply with only a JSON object "
+    '{"tasks": [...]}, where each task has task_name, task_or_event (TASK or '
+    "EVENT), optionally task_context and task_type (FUN, TEXT_RESPONSE, CHORE "
+    "or ERRAND), and message_indexes, the [n] numbers of the messages it came "
+    "from. Messages under Earlier are context only; take tasks from the "
+    "numbered messages. Reply with an empty list if there is nothing to do."
+)
+
+
+def session_engine(db):
+    """The engine behind a session, whether it is bound to one or to a
+    connection checked out from one
+    """
+    bind = db.bind
+    return bind.engine if isinstance(bind, AsyncConnection) else bind
+
+
+def message_line(sender_name: Optional[str], text: str) -> str:
+    """One message as the agent sees it"""
+    return f"{sender_name or 'Unknown'}: {text}"
+
+
+def agent_messages(batch: list, context: Sequence[ContextMessage] = ()) -> List[dict]:
+    """Chat-style model input for a batch, numbering messages by position"""
+    lines = [
+        f"[{i}] {message_line(row.sender_name, row.text_content)}"
+        for i, row in enumerate(batch)
+    ]
+    if context:
+        earlier = [message_line(m.sender_name, m.text) for m in context]
+        lines = ["Earlier:", *earlier, "", "Messages:", *lines]
+    return [
+        {"role": "system", "content": AGENT_INSTRUCTIONS},
+        {"role": "user", "content": "\n".join(lines)},
+    ]
+
+
+def parse_agent_reply(text: str, batch_size: int) -> dict:
+    """Validate a model reply into the run_agent result shape
+
+    Raises ValueError on anything store_tasks could not insert, so the batch
+    is released and retried rather than cached. Optional fields of the wrong
+    type are dropped rather than failing the batch.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0:
+        raise ValueError("Agent reply has no JSON object")
+    reply = json.loads(text[start : end + 1])
+    tasks = reply.get("tasks") if isinstance(reply, dict) else None
+    if not isinstance(tasks, list):
+        raise ValueError("Agent reply has no task list")
+    parsed = []
+    for task in tasks:
+        if (
+            not isinstance(task, dict)
+            or not isinstance(task.get("task_name"), str)
+            or not task["task_name"].strip()
+            or not isinstance(task.get("task_or_event"), str)
+            or task["task_or_event"] not in TaskOrEvent.__members__
+        ):
+            raise ValueError(f"Invalid task in agent reply: {task!r}")
+        task_context = task.get("task_context")
+        task_type = task.get("task_type")
+        indexes = task.get("message_indexes")
+        parsed.append(
+            {
+                "task_name": task["task_name"],
+                "task_or_event": task["task_or_event"],
+                "task_context": task_context if isinstance(task_context, str) else None,
+                "task_type": task_type
+                if isinstance(task_type, str) and task_type in TaskType.__members__
+                else None,
+                "message_indexes": [
+                    i
+                    for i in (indexes if isinstance(indexes, list) else [])
+                    if isinstance(i, int)
+                    and not isinstance(i, bool)
+                    and 0 <= i < batch_size
+                ],
+            }
+        )
+    return {"tasks": parsed}
+
 
 class AgentService:
     """Service for batch processing of messages ready for agent"""
 
-    def __init__(self, test_processing_time: Optional[float] = None):
+    def __init__(
+        self,
+        test_processing_time: Optional[float] = None,
+        batch_size: int = settings.AGENT_CLAIM_BATCH_SIZE,
+        token_budget: int = settings.AGENT_BATCH_TOKEN_BUDGET,
+        lease_seconds: float = settings.AGENT_LEASE_SECONDS,
+        worker_id: Optional[str] = None,
+        sizer: Optional[AdaptiveBatchSizer] = None,
+        timeout_seconds: float = settings.AGENT_BATCH_TIMEOUT_SECONDS,
+        results: Optional[AgentResultCache] = None,
+        model: Optional[ModelBackend] = None,
+        contexts: ChatContextCache = chat_context_cache,
+        context_messages: int = settings.AGENT_CONTEXT_MESSAGES,
+        log_writer: AgentLogWriter = agent_log_writer,
+    ):
         self.test_processing_time = test_processing_time
+        self.log_writer = log_writer
+        self.contexts = contexts
+        self.context_messages = context_messages
+        self.model = model or model_backend_from_settings()
+        self.results = results or AgentResultCache()
+        self.timeout_seconds = timeout_seconds
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self.sizer = sizer or AdaptiveBatchSizer(
+            max_size=batch_size, target_seconds=settings.AGENT_BATCH_TARGET_SECONDS
+        )
+        self.lease_seconds = lease_seconds
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
 
-    async def process_batch(self, db):
-        """Process batch of ready messages"""
-        # Get ready messages
-        result = await db.execute(
-            select(Message).where(Message.status == MessageStatus.READY_FOR_AGENT)
+    async def aclose(self):
+        """Close the model backend's connections"""
+        if self.model is not None:
+            await self.model.aclose()
+
+    def _lease_expiry(self):
+        return func.now() + timedelta(seconds=self.lease_seconds)
+
+    def _owned(self, message_ids: List[str]):
+        """Filter for this worker's leased messages among `message_ids`"""
+        return (
+            Message.message_id
+            == any_(bindparam("message_ids", message_ids, type_=ARRAY(String))),
+            Message.status == MessageStatus.AGENT_PROCESSING,
+            Message.lease_owner == self.worker_id,
         )
-        ready_messages = result.scalars().all()
 
-        if not ready_messages:
-            logger.info("No messages ready for agent")
-            return
+    async def claim_batch(
+        self,
+        db,
+        limit: Optional[int] = None,
+        chat_id: Optional[str] = None,
+        token_budget: Optional[int] = None,
+    ) -> list:
+        """Lease ready messages, optionally of one chat, as AGENT_PROCESSING
 
-        message_ids = [msg.message_id for msg in ready_messages]
-        logger.info(f"Processing {len(ready_messages)} ready messages")
+        Takes the oldest messages first, stopping before the estimated tokens
+        would exceed `token_budget` (the first message is always taken);
+        the rest stay READY_FOR_AGENT for the next batch. Returns (message_id,
+        time_received, text_content, text_character_count, sender_name,
+        replied_to_fk) rows in time order.
+
+        The claim is committed. Rows locked by another worker's claim are
+        skipped rather than waited for, so every message is claimed by exactly
+        one worker. The lease expires after `lease_seconds` unless renewed.
+        """
+        ready = (
+            select(
+                Message.message_id,
+                Message.time_received,
+                Message.text_character_count,
+            )
+            .where(Message.status == MessageStatus.READY_FOR_AGENT)
+            .order_by(Message.time_received)
+            .with_for_update(skip_locked=True)
+        )
+        if chat_id is not None:
+            ready = ready.where(Message.chat_id == chat_id)
+        if limit is not None:
+            ready = ready.limit(limit)
 
-        # Mark as processing
-        await db.execute(
+        if token_budget is None:
+            chosen = select(ready.subquery().c.message_id)
+        else:
+            # Window functions cannot be combined with FOR UPDATE, so the
+            # running total is taken over the already-locked candidates
+            candidates = ready.cte("candidates")
+            order = (candidates.c.time_received, candidates.c.message_id)
+            running = select(
+                candidates.c.message_id,
+                func.sum(candidates.c.text_character_count)
+                .over(order_by=order)
+                .label("characters"),
+                func.row_number().over(order_by=order).label("position"),
+            ).subquery()
+            chosen = select(running.c.message_id).where(
+                or_(
+                    running.c.characters <= token_budget * CHARS_PER_TOKEN,
+                    running.c.position == 1,
+                )
+            )
+
+        result = await db.execute(
             update(Message)
-            .where(Message.message_id.in_(message_ids))
-            .values(status=MessageStatus.AGENT_PROCESSING)
+            .where(Message.message_id.in_(chosen.scalar_subquery()))
+            .values(
+                status=MessageStatus.AGENT_PROCESSING,
+                lease_owner=self.worker_id,
+                lease_expires_at=self._lease_expiry(),
+            )
+            .returning(
+                Message.message_id,
+                Message.time_received,
+                Message.text_content,
+                Message.text_character_count,
+                Message.sender_name,
+                Message.replied_to_fk,
+            )
+            .execution_options(synchronize_session=False)
         )
+        claimed = sorted(result.all(), key=lambda row: row.time_received)
         await db.commit()
+        return claimed
 
+    async def process_batch(
+        self, db, limit: Optional[int] = None, chat_id: Optional[str] = None
+    ) -> Optional[int]:
+        """Process batch of ready messages, optionally for a single chat
+
+        Claims at most `limit` messages (the adaptive cap by default) within
+        the token budget and returns how many were claimed; callers repeat
+        until nothing comes back. Returns None when the batch timed out and
+        was handed back, so the caller can schedule it again.
+        """
+        claimed = await self.claim_batch(
+            db, limit or self.sizer.size, chat_id, self.token_budget
+        )
+
+        if not claimed:
+            logger.info("No messages ready for agent", chat_id=chat_id)
+            return 0
+
+        message_ids = [row.message_id for row in claimed]
+        tokens = estimated_tokens(sum(row.text_character_count for row in claimed))
+        AGENT_BATCH_MESSAGES.observe(len(message_ids))
+        AGENT_BATCH_TOKENS.observe(tokens)
+        logger.info(
+            f"Processing {len(message_ids)} ready messages",
+            chat_id=chat_id,
+            estimated_tokens=tokens,
+        )
+
+        # Groups this batch's agent_logs entries
+        session_id = uuid.uuid4().hex
+        started = time.monotonic()
+        renewal = asyncio.create_task(self._keep_leases(db, message_ids))
+        try:
+            context = []
+            if chat_id is not None and self.context_messages:
+                context = await chat_context(
+                    db,
+                    chat_id,
+                    claimed[0].time_received,
+                    self.context_messages,
+                    self.contexts,
+                )
+            # Identical batches shown the same context (repeated
+            # announcements, resent messages) reuse the stored result instead
+            # of running the agent again; senders are part of the prompt and
+            # so of the key
+            key = batch_cache_key(
+                (message_line(row.sender_name, row.text_content) for row in claimed),
+                context=(message_line(m.sender_name, m.text) for m in context),
+            )
+            outcome = await asyncio.wait_for(
+                self.results.get_or_compute(
+                    db, key, lambda: self.run_agent(chat_id, claimed, context)
+                ),
+                self.timeout_seconds,
+            )
+        except BaseException as e:
+            # Hand the batch straight back instead of waiting out the lease
+            await asyncio.shield(self.release_leases(db, message_ids))
+            if not isinstance(e, asyncio.TimeoutError):
+                raise
+            await db.rollback()
+            AGENT_BATCH_TIMEOUTS.inc()
+            self.sizer.record(len(message_ids), time.monotonic() - started)
+            logger.error(
+                f"Agent batch timed out after {self.timeout_seconds}s",
+                chat_id=chat_id,
+                messages=len(message_ids),
+            )
+            await self.log_writer.log(
+                session_id,
+                AgentLogType.ERROR,
+                f"Timed out after {self.timeout_seconds}s",
+                level=AgentLogLevel.ERROR,
+                extra_data={"chat_id": chat_id, "messages": len(message_ids)},
+                source_message_id=message_ids[0],
+            )
+            # Stop draining the chat; the caller reschedules it, and the
+            # sizer has already shrunk the next batch
+            return None
+        finally:
+            renewal.cancel()
+            with suppress(asyncio.CancelledError):
+                await renewal
+        self.sizer.record(len(message_ids), time.monotonic() - started)
+
+        # Mark as processed and store the tasks in one transaction, unless a
+        # lease expired and was reclaimed; the batch is then run again whole
+        result = await db.execute(
+            update(Message)
+            .where(*self._owned(message_ids))
+            .values(
+                status=MessageStatus.PROCESSED, lease_owner=None, lease_expires_at=None
+            )
+            .execution_options(synchronize_session=False)
+        )
+        lost = len(message_ids) - result.rowcount
+        if lost:
+            await db.rollback()
+            await self.release_leases(db, message_ids)
+            logger.warning(f"Lost the agent lease on {lost} messages", chat_id=chat_id)
+            return len(message_ids)
+        try:
+            tasks = await self.store_tasks(db, claimed, outcome)
+            await db.commit()
+        except Exception:
+            # A result that cannot be stored would fail the same way on every
+            # retry; drop it from the cache and hand the batch back
+            await db.rollback()
+            await self.results.evict(db, key)
+            await self.release_leases(db, message_ids)
+            raise
+        if chat_id is not None:
+            # Keeps this worker's window current for the chat's next batch
+            self.contexts.append(chat_id, (context_message(row) for row in claimed))
+
+        logger.info(
+            f"Processed {len(message_ids)} messages", chat_id=chat_id, tasks=tasks
+        )
+        await self.log_writer.log(
+            session_id,
+            AgentLogType.DECISION,
+            f"Stored {tasks} tasks from {len(message_ids)} messages",
+            extra_data={
+                "chat_id": chat_id,
+                "messages": len(message_ids),
+                "context_messages": len(context),
+                "seconds": round(time.monotonic() - started, 3),
+            },
+            source_message_id=message_ids[0],
+        )
+        return len(message_ids)
+
+    async def run_agent(
+        self,
+        chat_id: Optional[str],
+        batch: list,
+        context: Sequence[ContextMessage] = (),
+    ) -> dict:
+        """Agent work for one batch, given the chat's earlier messages; must be
+        safe to cancel
+
+        Returns {"tasks": [...]}, each task with task_name, task_or_event and
+        optionally task_context, task_type and message_indexes (positions in
+        `batch` it came from). Positions rather than ids keep a cached result
+        valid for any batch with the same text.
+        """
         if self.test_processing_time is not None:
             # Test mode - just sleep for the specified time
             await asyncio.sleep(self.test_processing_time)
+        elif self.model is not None:
+            response = await self.model.complete(
+                chat_id, agent_messages(batch, context)
+            )
+            return parse_agent_reply(response.text, len(batch))
         else:
             # TODO: Implement actual agent processing logic here
             # This is where you would do task extraction, etc.
             pass
+        return {"tasks": []}
 
-        # Mark as processed
-        await db.execute(
-            update(Message)
-            .where(Message.message_id.in_(message_ids))
-            .values(status=MessageStatus.PROCESSED)
-        )
-        await db.commit()
+    async def store_tasks(self, db, batch: list, outcome: dict) -> int:
+        """Insert the tasks of an agent result, linked to their batch messages"""
+        tasks = outcome.get("tasks", [])
+        if not tasks:
+            return 0
+        task_rows, links = [], []
+        for spec in tasks:
+            task_id = uuid.uuid4()
+            sources = [batch[i].message_id for i in spec.get("message_indexes", [])]
+            task_rows.append(
+                {
+                    "task_id": task_id,
+                    "task_name": spec["task_name"],
+                    "task_context": spec.get("task_context"),
+                    "task_or_event": TaskOrEvent[spec["task_or_event"]],
+                    "task_type": TaskType[spec["task_type"]]
+                    if spec.get("task_type")
+                    else None,
+                    "source_message_id": sources[0] if sources else None,
+                }
+            )
+            links.extend(
+                {"task_id": task_id, "message_id": message_id}
+                for message_id in dict.fromkeys(sources)
+            )
+        await db.execute(insert(Task), task_rows)
+        if links:
+            await db.execute(insert(task_message_association), links)
+        return len(task_rows)
+
+    async def release_leases(self, db, message_ids: List[str]) -> int:
+        """Return this worker's leased messages to READY_FOR_AGENT
+
+        Runs on its own connection, as `db` may be mid-statement when the
+        batch is cancelled.
+        """
+        async with session_engine(db).begin() as conn:
+            result = await conn.execute(
+                update(Message)
+                .where(*self._owned(message_ids))
+                .values(
+                    status=MessageStatus.READY_FOR_AGENT,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+            )
+        return result.rowcount
+
+    async def renew_leases(self, db, message_ids: List[str]) -> int:
+        """Push back the expiry of this worker's leases; returns rows renewed
+
+        Runs on its own connection, as `db` is busy with the batch.
+        """
+        async with session_engine(db).begin() as conn:
+            result = await conn.execute(
+                update(Message)
+                .where(*self._owned(message_ids))
+                .values(lease_expires_at=self._lease_expiry())
+            )
+        return result.rowcount
+
+    async def _keep_leases(self, db, message_ids: List[str]):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.renew_leases(db, message_ids)
+            except Exception as e:
+                logger.error("Agent lease renewal failed", error=str(e))
+
+    async def reclaim_expired_leases(self, db) -> dict:
+        """Return messages whose lease expired to READY_FOR_AGENT
+
+        Expired means the owning worker died or stalled past `lease_seconds`
+        without renewing. Runs in batches of `batch_size`. Returns
+        chat_id -> newest time_received of its reclaimed messages, so the
+        chats can be scheduled again.
+        """
+        activity = {}
+        while True:
+            expired = (
+                select(Message.message_id)
+                .where(
+                    Message.status == MessageStatus.AGENT_PROCESSING,
+                    or_(
+                        Message.lease_expires_at.is_(None),
+                        Message.lease_expires_at < func.now(),
+                    ),
+                )
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            result = await db.execute(
+                update(Message)
+                .where(Message.message_id.in_(expired.scalar_subquery()))
+                .values(
+                    status=MessageStatus.READY_FOR_AGENT,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                )
+                .returning(Message.chat_id, Message.time_received)
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            await db.commit()
+            for chat_id, time_received in rows:
+                if chat_id not in activity or time_received > activity[chat_id]:
+                    activity[chat_id] = time_received
+            if rows:
+                AGENT_LEASES_RECLAIMED.inc(len(rows))
+                logger.warning(f"Reclaimed {len(rows)} expired agent leases")
+            if len(rows) < self.batch_size:
+                return activity
+
+    @asynccontextmanager
+    async def chat_lock(
+        self, db, chat_id: str
+    ) -> AsyncIterator[Optional[AsyncSession]]:
+        """Try to own `chat_id` across all workers
+
+        Yields a session for the chat's work, or None when another worker owns
+        it. The session-level advisory lock and the yielded session share one
+        connection checked out from `db`'s engine, so a chat holds a single
+        pooled connection while it drains. The lock is released when the block
+        exits, or by Postgres if this worker dies. Requires a session-mode
+        connection; a transaction-pooling proxy would drop it.
+        """
+        key = chat_lock_key(chat_id)
+        async with session_engine(db).connect() as conn:
+            result = await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": key}
+            )
+            acquired = result.scalar()
+            AGENT_CHAT_LOCKS.labels(
+                result="acquired" if acquired else "contended"
+            ).inc()
+            # Leave the lock query's transaction so it is not held open
+            await conn.commit()
+            try:
+                if not acquired:
+                    yield None
+                else:
+                    # Commits end the session's transactions on `conn` without
+                    # returning it to the pool
+                    async with AsyncSession(conn, expire_on_commit=False) as chat_db:
+                        yield chat_db
+            finally:
+                if acquired:
+                    try:
+                        await conn.execute(
+                            text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+                        )
+                        await conn.commit()
+                    except BaseException:
+                        # Never return a connection that may still hold the
+                        # lock to the pool; closing it releases the lock
+                        await conn.invalidate()
+                        raise
+
+    async def process_chat(self, db, chat_id: str) -> Optional[int]:
+        """Drain a chat's ready messages in bounded batches while owning it
 
-        logger.info(f"Processed {len(ready_messages)} messages")
+        Only `db`'s engine is used; the work runs on the chat lock's
+        connection. Returns the number processed, or None when the chat needs another
+        look later: another worker owns it, or one of its batches timed out.
+        """
+        async with self.chat_lock(db, chat_id) as chat_db:
+            if chat_db is None:
+                logger.info("Chat owned by another worker, skipping", chat_id=chat_id)
+                return None
+            total = 0
+            # A short batch may only mean the token budget was reached
+            while count := await self.process_batch(chat_db, chat_id=chat_id):
+                total += count
+            if count is None:
+                return None
+            return total
@@ -0,0 +1,51 @@
+import structlog
+from prometheus_client import Gauge
+
+logger = structlog.get_logger()
+
+AGENT_BATCH_LIMIT = Gauge(
+    "agent_batch_limit",
+    "Current adaptive cap on messages per agent batch",
+)
+
+
+class AdaptiveBatchSizer:
+    """AIMD cap on messages per agent batch, driven by measured batch latency
+
+    A batch slower than `target_seconds` halves the cap; a full batch within
+    the target grows it by `step`, up to `max_size`. Batches smaller than the
+    cap say nothing about whether a bigger one would fit, so they are ignored
+    unless they were too slow.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        target_seconds: float,
+        min_size: int = 1,
+        step: int = 0,
+        decrease: float = 0.5,
+    ):
+        self.max_size = max(min_size, max_size)
+        self.min_size = min_size
+        self.target_seconds = target_seconds
+        self.step = step or max(1, self.max_size // 10)
+        self.decrease = decrease
+        self.size = self.max_size
+        AGENT_BATCH_LIMIT.set(self.size)
+
+    def record(self, batch_size: int, seconds: float):
+        """Adjust the cap after a batch of `batch_size` took `seconds`"""
+        previous = self.size
+        if seconds > self.target_seconds:
+            self.size = max(self.min_size, int(self.size * self.decrease))
+        elif batch_size >= self.size:
+            self.size = min(self.max_size, self.size + self.step)
+        if self.size != previous:
+            AGENT_BATCH_LIMIT.set(self.size)
+            logger.info(
+                "Agent batch limit changed",
+                previous=previous,
+                limit=self.size,
+                seconds=round(seconds, 3),
+            )
@@ -0,0 +1,223 @@
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.message import Message
+
+CHAT_CONTEXT_LOOKUPS = Counter(
+    "chat_context_lookups_total",
+    "Agent context lookups: hit, filled (loaded the chat's window) or database "
+    "(history older than the cached window)",
+    ["result"],
+)
+CHAT_CONTEXT_CACHE_BYTES = Gauge(
+    "chat_context_cache_bytes",
+    "Estimated memory held by the chat context cache",
+)
+
+# Rough per-message cost beyond the text: tuple, ids, datetime, deque slot
+MESSAGE_OVERHEAD_BYTES = 300
+
+
+class ContextMessage(NamedTuple):
+    message_id: str
+    sender_name: Optional[str]
+    text: str
+    time_received: datetime
+    replied_to: Optional[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.text) + MESSAGE_OVERHEAD_BYTES
+
+
+class ChatWindow:
+    """A chat's newest messages, oldest first"""
+
+    __slots__ = ("messages", "complete", "expires_at", "size")
+
+    def __init__(self, messages: deque, complete: bool, expires_at: float):
+        self.messages = messages
+        # Whether these are all of the chat's messages, not just the newest
+        self.complete = complete
+        self.expires_at = expires_at
+        self.size = sum(message.size for message in messages)
+
+
+def context_message(row) -> ContextMessage:
+    """ContextMessage from a Message row or MessageResponse"""
+    return ContextMessage(
+        row.message_id,
+        row.sender_name,
+        row.text_content,
+        row.time_received,
+        row.replied_to_fk,
+    )
+
+
+class ChatContextCache:
+    """Ring buffers of the newest `messages_per_chat` messages of each chat
+
+    Filled from the database the first time a chat is needed, then kept
+    current by ingestion and by the agent's own batches. Chats are evicted
+    least recently used first once the estimated size passes `max_bytes`.
+    Windows expire after `ttl_seconds` to bound staleness from messages
+    stored by other processes.
+    """
+
+    def __init__(
+        self,
+        messages_per_chat: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.messages_per_chat = messages_per_chat
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.size = 0
+        self._windows: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def __contains__(self, chat_id: str) -> bool:
+        return self._window(chat_id) is not None
+
+    def _window(self, chat_id: str) -> Optional[ChatWindow]:
+        window = self._windows.get(chat_id)
+        if window is not None and window.expires_at <= self.clock():
+            self.invalidate(chat_id)
+            return None
+        return window
+
+    def recent(
+        self, chat_id: str, before: datetime, limit: int
+    ) -> Optional[List[ContextMessage]]:
+        """The last `limit` messages received before `before`, oldest first
+
+        None when the chat is not cached, or when the cached window may not
+        reach back far enough.
+        """
+        window = self._window(chat_id)
+        if window is None:
+            return None
+        older = [m for m in window.messages if m.time_received < before]
+        if len(older) < limit and not window.complete:
+            return None
+        self._windows.move_to_end(chat_id)
+        return older[-limit:] if limit else []
+
+    def store(self, chat_id: str, messages: List[ContextMessage], complete: bool):
+        """Cache a chat's newest messages, oldest first, read from the database"""
+        self.invalidate(chat_id)
+        window = ChatWindow(
+            deque(messages[-self.messages_per_chat :], maxlen=self.messages_per_chat),
+            complete and len(messages) <= self.messages_per_chat,
+            self.clock() + self.ttl_seconds,
+        )
+        self._windows[chat_id] = window
+        self._resize(window.size)
+
+    def append(self, chat_id: str, messages: Iterable[ContextMessage]):
+        """Add committed messages to a cached chat
+
+        Chats that are not cached are left alone; their window is read from
+        the database, new messages included, when it is next needed.
+        """
+        window = self._window(chat_id)
+        if window is None:
+            return
+        known = {m.message_id for m in window.messages}
+        new = [m for m in messages if m.message_id not in known]
+        if not new:
+            return
+        # Concurrent commits can land slightly out of time order
+        merged = sorted([*window.messages, *new], key=lambda m: m.time_received)
+        if len(merged) > self.messages_per_chat:
+            window.complete = False
+        window.messages = deque(
+            merged[-self.messages_per_chat :], maxlen=self.messages_per_chat
+        )
+        previous, window.size = window.size, sum(m.size for m in window.messages)
+        self._windows.move_to_end(chat_id)
+        self._resize(window.size - previous)
+
+    def _resize(self, delta: int):
+        self.size += delta
+        while self.size > self.max_bytes and self._windows:
+            self.invalidate(next(iter(self._windows)))
+        CHAT_CONTEXT_CACHE_BYTES.set(self.size)
+
+    def invalidate(self, chat_id: str):
+        window = self._windows.pop(chat_id, None)
+        if window is not None:
+            self.size -= window.size
+            CHAT_CONTEXT_CACHE_BYTES.set(self.size)
+
+    def clear(self):
+        self._windows.clear()
+        self.size = 0
+        CHAT_CONTEXT_CACHE_BYTES.set(0)
+
+
+chat_context_cache = ChatContextCache(
+    messages_per_chat=settings.CHAT_CONTEXT_CACHE_MESSAGES_PER_CHAT,
+    max_bytes=settings.CHAT_CONTEXT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.CHAT_CONTEXT_CACHE_TTL_SECONDS,
+)
+
+
+def _newest(chat_id: str, limit: int, before: Optional[datetime] = None):
+    query = (
+        select(
+            Message.message_id,
+            Message.sender_name,
+            Message.text_content,
+            Message.time_received,
+            Message.replied_to_fk,
+        )
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.time_received.desc(), Message.message_id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        query = query.where(Message.time_received < before)
+    return query
+
+
+async def chat_context(
+    db,
+    chat_id: str,
+    before: datetime,
+    limit: int = settings.AGENT_CONTEXT_MESSAGES,
+    cache: ChatContextCache = chat_context_cache,
+) -> List[ContextMessage]:
+    """The last `limit` messages of `chat_id` received before `before`
+
+    Served from the cache when it can be, filling the chat's window on a
+    miss; history older than the window is read from the database directly.
+    """
+    context = cache.recent(chat_id, before, limit)
+    if context is not None:
+        CHAT_CONTEXT_LOOKUPS.labels(result="hit").inc()
+        return context
+
+    if chat_id not in cache:
+        result = await db.execute(_newest(chat_id, cache.messages_per_chat))
+        newest = [context_message(row) for row in reversed(result.all())]
+        cache.store(chat_id, newest, complete=len(newest) < cache.messages_per_chat)
+        context = cache.recent(chat_id, before, limit)
+        if context is not None:
+            CHAT_CONTEXT_LOOKUPS.labels(result="filled").inc()
+            return context
+
+    CHAT_CONTEXT_LOOKUPS.labels(result="database").inc()
+    result = await db.execute(_newest(chat_id, limit, before))
+    return [context_message(row) for row in reversed(result.all())]
@@ -0,0 +1,124 @@
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+import structlog
+from prometheus_client import Gauge
+from sqlalchemy.future import select
+from sqlalchemy.sql import exists, func
+
+from app.core.config import settings
+from app.models.message import Message, MessageStatus
+
+logger = structlog.get_logger()
+
+DEBOUNCE_SCHEDULED_CHATS = Gauge(
+    "debounce_scheduled_chats",
+    "Chats waiting for their debounce window to close",
+)
+
+PENDING_STATUSES = (MessageStatus.UNPROCESSED, MessageStatus.READY_FOR_AGENT)
+
+
+class DebounceScheduler:
+    """Min-heap of chat_id -> time the chat will have been quiet long enough
+
+    Each chat keeps only its latest deadline; superseded heap entries are
+    skipped when they reach the top. Deadlines are derived from message
+    time_received, so the schedule can be rebuilt from the database after a
+    restart.
+    """
+
+    def __init__(self, debounce_seconds: float, clock: Callable[[], float] = time.time):
+        self.debounce_seconds = debounce_seconds
+        self.clock = clock
+        self._deadlines: dict = {}
+        self._heap: list = []
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, chat_id: str):
+        return chat_id in self._deadlines
+
+    def touch(self, chat_id: str, last_activity: datetime):
+        """Push the chat's deadline back to `debounce_seconds` after this activity"""
+        deadline = last_activity.timestamp() + self.debounce_seconds
+        if deadline <= self._deadlines.get(chat_id, float("-inf")):
+            return
+        self._deadlines[chat_id] = deadline
+        heapq.heappush(self._heap, (deadline, chat_id))
+        DEBOUNCE_SCHEDULED_CHATS.set(len(self._deadlines))
+
+    def defer(self, chat_id: str):
+        """Schedule the chat again one debounce window from now"""
+        self.touch(chat_id, datetime.fromtimestamp(self.clock(), tz=timezone.utc))
+
+    def is_quiet(self, last_activity: datetime) -> bool:
+        """Whether a chat last active at `last_activity` is past its window"""
+        return last_activity.timestamp() + self.debounce_seconds <= self.clock()
+
+    def quiet_since(self) -> datetime:
+        """Activity after this time means a chat is still inside its window"""
+        return datetime.fromtimestamp(
+            self.clock() - self.debounce_seconds, tz=timezone.utc
+        )
+
+    def due(self) -> List[str]:
+        """Remove and return every chat whose debounce window has closed"""
+        now = self.clock()
+        chat_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, chat_id = heapq.heappop(self._heap)
+            if self._deadlines.get(chat_id) == deadline:
+                del self._deadlines[chat_id]
+                chat_ids.append(chat_id)
+        DEBOUNCE_SCHEDULED_CHATS.set(len(self._deadlines))
+        return chat_ids
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Time until the earliest deadline, or None when nothing is scheduled"""
+        while self._heap:
+            deadline, chat_id = self._heap[0]
+            if self._deadlines.get(chat_id) == deadline:
+                return max(0.0, deadline - self.clock())
+            heapq.heappop(self._heap)
+        return None
+
+    async def rebuild(self, db, page_size: int = settings.WORKER_SCAN_PAGE_SIZE):
+        """Schedule every chat with pending messages from its latest message
+
+        Rows are streamed from a server-side cursor `page_size` chats at a
+        time, so a large backlog is never held in memory at once.
+        """
+        result = await db.stream(
+            select(Message.chat_id, func.max(Message.time_received))
+            .where(Message.status.in_(PENDING_STATUSES))
+            .group_by(Message.chat_id)
+            .execution_options(yield_per=page_size)
+        )
+        chats = 0
+        async for page in result.partitions():
+            for chat_id, last_activity in page:
+                self.touch(chat_id, last_activity)
+            chats += len(page)
+        logger.info("Debounce schedule rebuilt", chats=chats)
+
+
+async def has_activity_since(db, chat_id: str, since: datetime) -> bool:
+    """Whether the chat received any message after `since`"""
+    result = await db.execute(
+        select(
+            exists().where(Message.chat_id == chat_id, Message.time_received > since)
+        )
+    )
+    return result.scalar()
+
+
+async def latest_activity(db, chat_id: str) -> Optional[datetime]:
+    """time_received of the chat's newest message"""
+    result = await db.execute(
+        select(func.max(Message.time_received)).where(Message.chat_id == chat_id)
+    )
+    return result.scalar()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import structlog
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.agent_service import AgentService
+from app.services.debounce_scheduler import DebounceScheduler
+from app.services.message_processor import processor_from_settings
+from app.worker import run_agent_stage, run_lease_sweep, run_processor_stage
+
+logger = structlog.get_logger()
+
+EMBEDDED_QUEUE_OVERFLOWS = Counter(
+    "embedded_worker_queue_overflows_total",
+    "New-message notifications dropped because the embedded worker queue was "
+    "full; the worker rebuilds its schedule from the database instead",
+)
+
+
+class DebounceService:
+    """Runs the processor and agent stages inside the API process
+
+    The messages router calls `notify` after each commit; notifications go
+    through a bounded in-memory queue to one background task, which processes
+    the new messages and runs the agent for each chat once its debounce
+    window closes (per-chat deadlines in a DebounceScheduler). Startup, a full
+    queue and any stage failure all resync from the database, so nothing is
+    lost if a notification is. Safe to run next to standalone workers: claims
+    use SKIP LOCKED and chats are owned through advisory locks.
+    """
+
+    def __init__(
+        self,
+        debounce_seconds: float = settings.DEBOUNCE_SECONDS,
+        max_queue: int = settings.EMBEDDED_WORKER_MAX_QUEUE,
+        session_factory=AsyncSessionLocal,
+        retry_delay_seconds: float = 5,
+    ):
+        self.debounce_seconds = debounce_seconds
+        self.max_queue = max_queue
+        self.session_factory = session_factory
+        self.retry_delay = retry_delay_seconds
+        self.scheduler = DebounceScheduler(debounce_seconds)
+        self.processor = processor_from_settings()
+        self.agent = AgentService()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._resync = True
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        self.scheduler = DebounceScheduler(self.debounce_seconds)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._resync = True
+        self._task = asyncio.create_task(self._run(self._queue))
+        logger.info("Embedded worker enabled", debounce_seconds=self.debounce_seconds)
+
+    def notify(self, chat_id: str):
+        """Report a committed message in `chat_id`; never blocks the request"""
+        if not self.running or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(chat_id)
+        except asyncio.QueueFull:
+            EMBEDDED_QUEUE_OVERFLOWS.inc()
+            self._resync = True
+
+    async def shutdown(self):
+        """Stop the background task; unfinished work is resumed from the database"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.processor.shutdown()
+        await self.agent.aclose()
+        logger.info("Embedded worker stopped")
+
+    async def _next_chats(self, queue: asyncio.Queue, timeout: Optional[float]) -> set:
+        """Wait up to `timeout` for notifications and drain everything queued"""
+        try:
+            chat_ids = {await asyncio.wait_for(queue.get(), timeout)}
+        except asyncio.TimeoutError:
+            return set()
+        while not queue.empty():
+            chat_ids.add(queue.get_nowait())
+        return chat_ids
+
+    async def _run(self, queue: asyncio.Queue):
+        next_sweep = time.monotonic()
+        chat_ids: set = set()
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    resync, self._resync = self._resync, False
+                    if resync:
+                        # Covers messages committed while stopped, dropped
+                        # from a full queue or left by a failed pass
+                        await self.scheduler.rebuild(db)
+                    if time.monotonic() >= next_sweep:
+                        await run_lease_sweep(db, self.agent, self.scheduler)
+                        next_sweep = (
+                            time.monotonic() + settings.AGENT_LEASE_SWEEP_SECONDS
+                        )
+                    if chat_ids or resync:
+                        now = datetime.now(timezone.utc)
+                        for chat_id in chat_ids:
+                            self.scheduler.touch(chat_id, now)
+                        await run_processor_stage(
+                            db,
+                            self.processor,
+                            settings.WORKER_CLAIM_BATCH_SIZE,
+                            self.scheduler,
+                        )
+                    remaining = await run_agent_stage(db, self.agent, self.scheduler)
+            except Exception as e:
+                logger.error("Embedded worker pass failed", error=str(e))
+                self._resync = True
+                remaining = self.retry_delay
+
+            timeout = max(0.0, next_sweep - time.monotonic())
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            chat_ids = await self._next_chats(queue, timeout)
+
+
+debounce_service = DebounceService()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from typing import Optional
+
+import structlog
+from prometheus_client import Gauge, Histogram
+
+from app.api_schemas.message import MessageBatchItemResult, MessageCreate
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.message_ingestion import ingest_message_batch
+
+logger = structlog.get_logger()
+
+GROUP_COMMIT_FLUSH_SIZE = Histogram(
+    "group_commit_flush_size",
+    "Messages committed per group-commit flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+GROUP_COMMIT_FLUSH_DURATION = Histogram(
+    "group_commit_flush_duration_seconds",
+    "Time to write and commit one group-commit flush",
+)
+
+GROUP_COMMIT_QUEUE_DEPTH = Gauge(
+    "group_commit_queue_depth",
+    "Messages waiting for the next group-commit flush",
+)
+
+_STOP = object()
+
+
+class WriteBufferFullError(Exception):
+    """Raised when the group-commit queue is at capacity"""
+
+
+class GroupCommitBuffer:
+    """Coalesces concurrent message inserts into shared transactions
+
+    Requests enqueue their message and wait; a single flusher task writes up to
+    `max_batch` queued messages in one transaction, at most `max_delay_ms` after
+    the first of them arrived. Each waiter is resolved only after its flush has
+    committed.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        max_delay_ms: float,
+        max_queue: int,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_queue = max_queue
+        self.session_factory = session_factory
+        self.flushes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closing = False
+        self._task = asyncio.create_task(self._run(self._queue))
+        logger.info(
+            "Group commit enabled",
+            max_batch=self.max_batch,
+            max_delay_ms=self.max_delay * 1000,
+        )
+
+    async def submit(self, message_data: MessageCreate) -> MessageBatchItemResult:
+        """Queue a message and wait until the transaction containing it commits"""
+        if not self.running or self._queue is None:
+            raise RuntimeError("Group commit buffer is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((message_data, future))
+        except asyncio.QueueFull:
+            raise WriteBufferFullError(f"{self.max_queue} messages already queued")
+        GROUP_COMMIT_QUEUE_DEPTH.set(self._queue.qsize())
+        return await future
+
+    async def shutdown(self):
+        """Stop accepting messages and flush everything already queued"""
+        if self._task is None or self._queue is None:
+            return
+        self._closing = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info("Group commit buffer drained", flushes=self.flushes)
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await queue.get()
+            if entry is _STOP:
+                break
+
+            batch = [entry]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            GROUP_COMMIT_QUEUE_DEPTH.set(queue.qsize())
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                results = await ingest_message_batch(db, [item for item, _ in batch])
+        except Exception as e:
+            logger.error("Group commit flush failed", size=len(batch), error=str(e))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.flushes += 1
+            GROUP_COMMIT_FLUSH_SIZE.observe(len(batch))
+            GROUP_COMMIT_FLUSH_DURATION.observe(time.perf_counter() - started)
+
+        for (_, future), result in zip(batch, results):
+            # The waiting request may have been cancelled by its client
+            if not future.done():
+                future.set_result(result)
+
+
+write_buffer = GroupCommitBuffer(
+    max_batch=settings.GROUP_COMMIT_MAX_BATCH,
+    max_delay_ms=settings.GROUP_COMMIT_MAX_DELAY_MS,
+    max_queue=settings.GROUP_COMMIT_MAX_QUEUE,
+)
@@ -0,0 +1,476 @@
+from typing import Iterable, List, Optional
+
+import structlog
+from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import func
+
+from app.api_schemas.message import (
+    ChatMember,
+    MessageBatchItemResult,
+    MessageBatchItemStatus,
+    MessageCreate,
+    MessageResponse,
+)
+from app.models import Chat, ChatRoster, Message, User
+from app.models.chat import ChatType, chat_users
+from app.models.message import MessageStatus
+from app.services.chat_context_cache import chat_context_cache, context_message
+from app.services.recent_message_ids import MESSAGE_REDELIVERIES, recent_message_ids
+from app.services.roster_cache import roster_cache, roster_fingerprint, roster_hash
+
+logger = structlog.get_logger()
+
+
+def roster_members(message_data: MessageCreate) -> list:
+    """Chat members as stored in chat_rosters"""
+    return [member.model_dump() for member in message_data.chat_members_struct]
+
+
+def build_message_values(message_data: MessageCreate) -> dict:
+    """Column values for a new message, with the sender taken from the roster"""
+    sender_name = None
+    user_id = None
+    for member in message_data.chat_members_struct:
+        if member.is_sender:
+            sender_name = member.name
+            user_id = member.user_id
+            break
+
+    return {
+        "message_id": message_data.message_id,
+        "text_content": message_data.text_content,
+        "text_character_count": len(message_data.text_content),
+        "status": MessageStatus.UNPROCESSED,
+        "user_id": user_id,
+        "chat_id": message_data.chat_id,
+        "roster_hash": roster_hash(roster_members(message_data)),
+        "sender_name": sender_name,
+        "is_spam": message_data.is_spam or False,
+        "replied_to_fk": message_data.replied_to_fk,
+    }
+
+
+def validate_message(values: dict, message_data: MessageCreate) -> Optional[str]:
+    """Reason a message cannot be stored, checked before touching the database"""
+    if values["user_id"] is None:
+        return "No sender in chat_members_struct"
+    if any(member.name is None for member in message_data.chat_members_struct):
+        return "Every chat member needs a name"
+    return None
+
+
+def chat_type_for(chat_members_struct: Iterable[ChatMember]) -> ChatType:
+    """Chats with more than two distinct members are groups"""
+    user_ids = {member.user_id for member in chat_members_struct}
+    return ChatType.GROUP if len(user_ids) > 2 else ChatType.PRIVATE
+
+
+async def upsert_users(db: AsyncSession, members: Iterable[ChatMember]) -> set:
+    """Create missing users and rename changed ones in a single statement
+
+    Returns the ids of users that were created or renamed.
+    """
+    # Later occurrences win, matching one-message-at-a-time ingestion
+    rows = {
+        member.user_id: {"user_id": member.user_id, "name": member.name}
+        for member in members
+    }
+    if not rows:
+        return set()
+
+    stmt = pg_insert(User)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.user_id],
+        set_={"name": stmt.excluded.name, "updated_at": func.now()},
+        where=User.name.is_distinct_from(stmt.excluded.name),
+    ).returning(User.user_id)
+    # Sorted keys give concurrent upserts a consistent lock order
+    result = await db.execute(stmt, [rows[user_id] for user_id in sorted(rows)])
+    return set(result.scalars())
+
+
+async def upsert_chats(db: AsyncSession, chats: dict):
+    """Create missing chats and update changed display names
+
+    `chats` maps chat_id to a (chat_display_name, chat_type) tuple. The chat type
+    is only used when the chat is created.
+    """
+    if not chats:
+        return
+
+    stmt = pg_insert(Chat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Chat.chat_id],
+        set_={
+            "chat_display_name": stmt.excluded.chat_display_name,
+            "updated_at": func.now(),
+        },
+        where=and_(
+            stmt.excluded.chat_display_name.isnot(None),
+            Chat.chat_display_name.is_distinct_from(stmt.excluded.chat_display_name),
+        ),
+    )
+    await db.execute(
+        stmt,
+        [
+            {
+                "chat_id": chat_id,
+                "chat_display_name": chats[chat_id][0],
+                "chat_type": chats[chat_id][1],
+            }
+            for chat_id in sorted(chats)
+        ],
+    )
+
+
+async def link_chat_users(db: AsyncSession, pairs: Iterable[tuple]):
+    """Add (chat_id, user_id) memberships that do not exist yet"""
+    rows = [
+        {"chat_id": chat_id, "user_id": user_id}
+        for chat_id, user_id in sorted(set(pairs))
+    ]
+    if not rows:
+        return
+
+    await db.execute(pg_insert(chat_users).on_conflict_do_nothing(), rows)
+
+
+def rosters_to_store(items: Iterable[MessageCreate]) -> dict:
+    """Member lists by roster hash, skipping ones the roster cache knows are stored"""
+    rosters = {}
+    for item in items:
+        members = roster_members(item)
+        key = roster_hash(members)
+        if not roster_cache.has_roster(item.chat_id, key):
+            rosters[key] = members
+    return rosters
+
+
+async def insert_rosters(db: AsyncSession, rosters: dict):
+    """Store member lists by roster hash; existing rosters are left untouched"""
+    rows = [{"roster_hash": key, "members": rosters[key]} for key in sorted(rosters)]
+    if not rows:
+        return
+
+    await db.execute(pg_insert(ChatRoster).on_conflict_do_nothing(), rows)
+
+
+def message_response(row, members: list) -> MessageResponse:
+    """Response for a messages row returned by INSERT ... RETURNING"""
+    return MessageResponse.model_validate(
+        {**row._mapping, "chat_members_struct": members}
+    )
+
+
+async def insert_messages(
+    db: AsyncSession, rows: List[dict], members_by_hash: dict
+) -> dict:
+    """Insert messages, skipping existing ids, and return created messages by id"""
+    if not rows:
+        return {}
+
+    stmt = (
+        pg_insert(Message)
+        .on_conflict_do_nothing(index_elements=[Message.message_id])
+        .returning(*Message.__table__.columns)
+    )
+    result = await db.execute(stmt, rows)
+    return {
+        row.message_id: message_response(row, members_by_hash[row.roster_hash])
+        for row in result
+    }
+
+
+async def insert_message(
+    db: AsyncSession, values: dict, members: list
+) -> Optional[MessageResponse]:
+    """Insert one message and return it, or None if the id exists"""
+    result = await db.execute(
+        pg_insert(Message)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[Message.message_id])
+        .returning(*Message.__table__.columns)
+    )
+    row = result.first()
+    return None if row is None else message_response(row, members)
+
+
+async def get_stored_messages(db: AsyncSession, message_ids: Iterable[str]) -> dict:
+    """Stored messages by id with their rosters, in one SELECT"""
+    result = await db.execute(
+        select(
+            *Message.__table__.columns,
+            ChatRoster.members.label("chat_members_struct"),
+        )
+        .outerjoin(ChatRoster, Message.roster_hash == ChatRoster.roster_hash)
+        .where(Message.message_id.in_(message_ids))
+    )
+    return {row.message_id: MessageResponse.model_validate(row) for row in result}
+
+
+async def find_redelivery(
+    db: AsyncSession, message_id: str
+) -> Optional[MessageResponse]:
+    """Stored message for a recently stored message_id, found without any writes"""
+    if message_id not in recent_message_ids:
+        return None
+    stored = (await get_stored_messages(db, [message_id])).get(message_id)
+    if stored is not None:
+        MESSAGE_REDELIVERIES.labels(detected_by="filter").inc()
+    return stored
+
+
+async def reconcile_rosters(db: AsyncSession, items: List[MessageCreate]) -> set:
+    """Upsert the users, chats and memberships named by these messages
+
+    Runs one statement per table regardless of how many messages are passed and
+    returns the ids of users that were created or renamed.
+    """
+    chats = {}
+    pairs = []
+    for item in items:
+        display_name, chat_type = chats.get(
+            item.chat_id, (None, chat_type_for(item.chat_members_struct))
+        )
+        if item.chat_display_name is not None:
+            display_name = item.chat_display_name
+        chats[item.chat_id] = (display_name, chat_type)
+        pairs.extend(
+            (item.chat_id, member.user_id) for member in item.chat_members_struct
+        )
+
+    renamed = await upsert_users(
+        db, (member for item in items for member in item.chat_members_struct)
+    )
+    await upsert_chats(db, chats)
+    await link_chat_users(db, pairs)
+    return renamed
+
+
+def remember_rosters(
+    reconciled: List[MessageCreate], renamed: set, stored: List[MessageCreate]
+):
+    """Record committed reconciliations and member lists in the roster cache"""
+    roster_cache.invalidate_users(renamed)
+    for item in reconciled:
+        roster_cache.store(item, chat_type_for(item.chat_members_struct))
+    for item in stored:
+        roster_cache.add_roster(item.chat_id, roster_hash(roster_members(item)))
+
+
+def remember_context(messages: Iterable[MessageResponse]):
+    """Add committed messages to the cached context windows of their chats"""
+    for message in messages:
+        chat_context_cache.append(message.chat_id, [context_message(message)])
+
+
+async def ingest_message(db: AsyncSession, message_data: MessageCreate) -> tuple:
+    """Store and commit one message with its users, chat and memberships
+
+    Returns the stored message and whether it was created. When the roster
+    cache already holds this chat's roster and member list, reconciliation is
+    skipped and the message INSERT is the only statement. A message_id that
+    already exists is not written again; its stored message is returned instead.
+    """
+    message_id = message_data.message_id
+    reconcile = not roster_cache.is_current(
+        message_data.chat_id, roster_fingerprint(message_data)
+    )
+    renamed = set()
+    try:
+        if reconcile:
+            renamed = await reconcile_rosters(db, [message_data])
+        await insert_rosters(db, rosters_to_store([message_data]))
+        message = await insert_message(
+            db, build_message_values(message_data), roster_members(message_data)
+        )
+        if message is None:
+            # Redelivery the filter did not know about; keep nothing from it
+            await db.rollback()
+            MESSAGE_REDELIVERIES.labels(detected_by="insert").inc()
+            recent_message_ids.add([message_id])
+            stored = await get_stored_messages(db, [message_id])
+            return stored[message_id], False
+        await db.commit()
+    except IntegrityError:
+        # The cached roster may no longer match the database
+        roster_cache.invalidate(message_data.chat_id)
+        raise
+
+    recent_message_ids.add([message_id])
+    remember_rosters([message_data] if reconcile else [], renamed, [message_data])
+    remember_context([message])
+    return message, True
+
+
+async def ingest_message_batch(
+    db: AsyncSession, items: List[MessageCreate]
+) -> List[MessageBatchItemResult]:
+    """Store a batch of messages in one transaction with a fixed number of statements
+
+    Every item gets its own result, so duplicates and invalid items do not fail
+    the rest of the batch.
+    """
+    results: dict = {}
+    candidates: dict = {}
+
+    for index, item in enumerate(items):
+        values = build_message_values(item)
+        invalid_reason = validate_message(values, item)
+        if item.message_id in candidates:
+            results[index] = _duplicate(item)
+        elif invalid_reason is not None:
+            results[index] = _error(item, invalid_reason)
+        else:
+            candidates[item.message_id] = (index, item, values)
+
+    # One lookup covers both already-stored messages and reply targets
+    lookup_ids = set(candidates) | {
+        item.replied_to_fk
+        for _, item, _ in candidates.values()
+        if item.replied_to_fk is not None
+    }
+    stored = await get_stored_messages(db, lookup_ids) if lookup_ids else {}
+    existing_ids = set(stored)
+
+    for message_id in list(candidates):
+        if message_id in existing_ids:
+            index, item, _ = candidates.pop(message_id)
+            results[index] = _duplicate(item, stored[message_id])
+
+    # Drop replies to unknown messages, including replies to other dropped items
+    dropped = True
+    while dropped:
+        dropped = False
+        for message_id, (index, item, _) in list(candidates.items()):
+            target = item.replied_to_fk
+            if (
+                target is not None
+                and target not in existing_ids
+                and target not in candidates
+            ):
+                del candidates[message_id]
+                results[index] = _error(item, f"Unknown replied_to_fk: {target}")
+                dropped = True
+
+    if candidates:
+        try:
+            created, reconciled, renamed = await _store_candidates(
+                db, list(candidates.values())
+            )
+            await db.commit()
+        except IntegrityError as e:
+            # Something slipped past validation; isolate items with savepoints
+            logger.warning("Batch insert failed, retrying per item", error=str(e.orig))
+            await db.rollback()
+            for _, item, _ in candidates.values():
+                roster_cache.invalidate(item.chat_id)
+            created, reconciled, renamed = await _store_candidates_individually(
+                db, list(candidates.values()), results
+            )
+            await db.commit()
+        remember_rosters(
+            reconciled,
+            renamed,
+            [
+                item
+                for message_id, (_, item, _) in candidates.items()
+                if message_id in created
+            ],
+        )
+        recent_message_ids.add(created)
+        remember_context(created.values())
+        stored.update(created)
+
+        for message_id, (index, item, _) in candidates.items():
+            if index in results:
+                continue
+            message = created.get(message_id)
+            if message is None:
+                # Inserted concurrently by another request
+                results[index] = _duplicate(item)
+            else:
+                results[index] = MessageBatchItemResult(
+                    message_id=message_id,
+                    status=MessageBatchItemStatus.CREATED,
+                    message=message,
+                )
+
+    # Repeats within the batch return whatever the first occurrence stored
+    for index, result in results.items():
+        if (
+            result.status == MessageBatchItemStatus.DUPLICATE
+            and result.message is None
+            and result.message_id in stored
+        ):
+            results[index] = _duplicate(items[index], stored[result.message_id])
+    recent_message_ids.add(
+        r.message_id
+        for r in results.values()
+        if r.status == MessageBatchItemStatus.DUPLICATE and r.message is not None
+    )
+
+    logger.info(
+        "Message batch ingested",
+        items=len(items),
+        created=sum(
+            r.status == MessageBatchItemStatus.CREATED for r in results.values()
+        ),
+    )
+    return [results[index] for index in range(len(items))]
+
+
+async def _store_candidates(db: AsyncSession, candidates: list) -> tuple:
+    reconciled = [
+        item
+        for _, item, _ in candidates
+        if not roster_cache.is_current(item.chat_id, roster_fingerprint(item))
+    ]
+    renamed = await reconcile_rosters(db, reconciled)
+    await insert_rosters(db, rosters_to_store(item for _, item, _ in candidates))
+    created = await insert_messages(
+        db,
+        [values for _, _, values in candidates],
+        {values["roster_hash"]: roster_members(item) for _, item, values in candidates},
+    )
+    return created, reconciled, renamed
+
+
+async def _store_candidates_individually(
+    db: AsyncSession, candidates: list, results: dict
+) -> tuple:
+    created, reconciled, renamed = {}, [], set()
+    for candidate in candidates:
+        index, item, _ = candidate
+        try:
+            async with db.begin_nested():
+                item_created, item_reconciled, item_renamed = await _store_candidates(
+                    db, [candidate]
+                )
+        except IntegrityError as e:
+            results[index] = _error(item, f"Database error: {e.orig}")
+            continue
+        created.update(item_created)
+        reconciled.extend(item_reconciled)
+        renamed |= item_renamed
+    return created, reconciled, renamed
+
+
+def _duplicate(
+    item: MessageCreate, stored: Optional[MessageResponse] = None
+) -> MessageBatchItemResult:
+    return MessageBatchItemResult(
+        message_id=item.message_id,
+        status=MessageBatchItemStatus.DUPLICATE,
+        message=stored,
+    )
+
+
+def _error(item: MessageCreate, detail: str) -> MessageBatchItemResult:
+    return MessageBatchItemResult(
+        message_id=item.message_id, status=MessageBatchItemStatus.ERROR, detail=detail
+    )
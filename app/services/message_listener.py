@@ -0,0 +1,105 @@
+import asyncio
+from typing import Optional
+
+import asyncpg
+import structlog
+from prometheus_client import Counter
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# Sent by the messages_notify_insert trigger after new messages commit
+NEW_MESSAGES_CHANNEL = "new_messages"
+
+WORKER_WAKEUPS = Counter(
+    "worker_wakeups_total",
+    "Worker passes by what triggered them",
+    ["reason"],
+)
+
+
+class MessageListener:
+    """LISTENs for new messages on a dedicated asyncpg connection
+
+    The connection is reopened after it drops, and the worker is woken on every
+    reconnect because notifications sent while disconnected are lost. The DSN
+    must reach Postgres directly: a transaction-mode pooler does not deliver
+    notifications.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str = NEW_MESSAGES_CHANNEL,
+        heartbeat_seconds: float = 60,
+        reconnect_delay_seconds: float = 5,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reconnect_delay = reconnect_delay_seconds
+        self.connected = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for new messages; False on timeout
+
+        Pending wake-ups are consumed, so messages committed while the caller
+        is busy trigger exactly one more pass.
+        """
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            return False
+        self._wakeup.clear()
+        return True
+
+    def _notified(self, connection, pid, channel, payload):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            conn = None
+            lost = asyncio.Event()
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(self.channel, self._notified)
+                self.connected = True
+                logger.info("Listening for new messages", channel=self.channel)
+                # Anything committed before LISTEN took effect was missed
+                self._wakeup.set()
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.heartbeat_seconds)
+                    except asyncio.TimeoutError:
+                        # Detects connections that died without closing
+                        await conn.fetchval("SELECT 1", timeout=10)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Message listener connection lost", error=str(e))
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+message_listener = MessageListener(settings.ASYNCPG_DSN)
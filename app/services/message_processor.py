@@ -1,38 +1,300 @@
 import asyncio
-from typing import Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Collection, List, NamedTuple, Optional
 
 import structlog
-from sqlalchemy import update
+from prometheus_client import Counter
+from sqlalchemy import String, all_, any_, bindparam, case, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.future import select
 
+from app.core.config import settings
 from app.models.message import Message, MessageStatus
+from app.services.message_transform import (
+    MessageFields,
+    transform_chunk,
+    transform_message,
+)
 
 logger = structlog.get_logger()
 
+PROCESSOR_FAILURES = Counter(
+    "message_processor_failures_total",
+    "Messages whose processing raised and were left UNPROCESSED for a later pass",
+)
+PROCESSOR_DEAD_LETTERS = Counter(
+    "message_processor_dead_letters_total",
+    "Messages marked FAILED after raising on every allowed processing pass",
+)
+
+
+class BatchOutcome(NamedTuple):
+    claimed: int
+    processed: int
+    activity: dict  # chat_id -> newest time_received among claimed messages
+    failed: List[str]  # message_ids whose processing raised
+
 
 class MessageProcessor:
     """Service for processing individual messages"""
 
-    def __init__(self, test_processing_time: Optional[float] = None):
+    def __init__(
+        self,
+        test_processing_time: Optional[float] = None,
+        concurrency: int = settings.PROCESSOR_CONCURRENCY,
+        pool_workers: int = settings.PROCESSOR_POOL_WORKERS,
+        pool_chunksize: int = settings.PROCESSOR_POOL_CHUNKSIZE,
+        transform_fn: Callable[[MessageFields], object] = transform_message,
+        max_attempts: int = settings.PROCESSOR_MAX_ATTEMPTS,
+    ):
         self.test_processing_time = test_processing_time
+        self.max_attempts = max(1, max_attempts)
+        self.concurrency = concurrency
+        self.pool_workers = pool_workers
+        self.pool_chunksize = max(1, pool_chunksize)
+        # Must be a top-level function so pool children can unpickle it
+        self.transform_fn = transform_fn
+        self._pool: Optional[ProcessPoolExecutor] = None
 
-    async def process_message(self, message_id: str, db):
-        """Process a single message and mark it as ready for agent"""
-        logger.info("Processing message", message_id=message_id)
+    @property
+    def uses_pool(self) -> bool:
+        return self.pool_workers > 0 and self.test_processing_time is None
+
+    def shutdown(self):
+        """Stop the process pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def claim_batch(self, db, limit: int, exclude: Collection[str] = ()) -> list:
+        """Lock up to `limit` unprocessed messages that no other worker holds,
+        other than those in `exclude`
+
+        Returns (message_id, chat_id, time_received, text_content,
+        processing_attempts) rows. The row locks last until the caller
+        commits, so concurrent workers skip these messages instead of
+        processing them a second time.
+        """
+        unprocessed = select(
+            Message.message_id,
+            Message.chat_id,
+            Message.time_received,
+            Message.text_content,
+            Message.processing_attempts,
+        ).where(Message.status == MessageStatus.UNPROCESSED)
+        if exclude:
+            unprocessed = unprocessed.where(
+                Message.message_id
+                != all_(bindparam("exclude", list(exclude), type_=ARRAY(String)))
+            )
+        result = await db.execute(
+            unprocessed.order_by(Message.time_received)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return result.all()
+
+    async def process_pending(
+        self, db, limit: int, exclude: Collection[str] = ()
+    ) -> BatchOutcome:
+        """Claim one batch, process it concurrently and mark it in one UPDATE
+
+        A message whose processing raises stays UNPROCESSED without affecting
+        the rest of the batch, until it has failed `max_attempts` passes and
+        is marked FAILED instead. Messages in `exclude` are not claimed.
+        """
+        claimed = await self.claim_batch(db, limit, exclude)
+        batch = [
+            MessageFields(row.message_id, row.text_content, row.chat_id)
+            for row in claimed
+        ]
+        activity = {}
+        for row in claimed:
+            if row.chat_id not in activity or row.time_received > activity[row.chat_id]:
+                activity[row.chat_id] = row.time_received
+
+        errors = await self.run_transforms(batch)
+        processed = []
+        failed = []
+        for row, error in zip(claimed, errors):
+            if error is not None:
+                PROCESSOR_FAILURES.inc()
+                logger.error(
+                    "Message processing failed",
+                    message_id=row.message_id,
+                    attempt=row.processing_attempts + 1,
+                    error=error,
+                )
+                failed.append(row)
+            else:
+                processed.append(row.message_id)
+
+        await self.mark_ready(db, processed)
+        await self.record_failures(db, failed)
+        await db.commit()
+        return BatchOutcome(
+            claimed=len(batch),
+            processed=len(processed),
+            activity=activity,
+            failed=[row.message_id for row in failed],
+        )
+
+    async def run_transforms(self, batch: List[MessageFields]) -> List[Optional[str]]:
+        """Transform a batch, returning an error string or None per message
+
+        With a process pool the batch is split into chunks of
+        `pool_chunksize`, so CPU-bound work never blocks the event loop and
+        each message is not a separate round trip to a child process.
+        Otherwise up to `concurrency` transforms run on the event loop.
+        """
+        if self.uses_pool:
+            return await self._run_in_pool(batch)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(fields: MessageFields):
+            async with semaphore:
+                await self.transform(fields)
+
+        outcomes = await asyncio.gather(
+            *(guarded(fields) for fields in batch), return_exceptions=True
+        )
+        return [
+            str(outcome) if isinstance(outcome, BaseException) else None
+            for outcome in outcomes
+        ]
+
+    async def _run_in_pool(self, batch: List[MessageFields]) -> List[Optional[str]]:
+        if self._pool is None:
+            # Forking a process that runs an event loop and holds open
+            # connections is unsafe; spawned children start clean
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        loop = asyncio.get_running_loop()
+        chunks = [
+            batch[start : start + self.pool_chunksize]
+            for start in range(0, len(batch), self.pool_chunksize)
+        ]
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._pool, transform_chunk, self.transform_fn, chunk
+                )
+                for chunk in chunks
+            ),
+            return_exceptions=True,
+        )
+        errors = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                # The child died (e.g. BrokenProcessPool); fail the whole chunk
+                errors.extend([str(result) or type(result).__name__] * len(chunk))
+            else:
+                errors.extend(result)
+        return errors
+
+    async def transform(self, fields: MessageFields):
+        """Process one message on the event loop; touches no database state"""
+        logger.info("Processing message", message_id=fields.message_id)
 
         if self.test_processing_time is not None:
             # Test mode - just sleep for the specified time
             await asyncio.sleep(self.test_processing_time)
         else:
-            # TODO: Implement actual message processing logic here
-            # This is where you would do NLP, entity extraction, etc.
-            pass
+            self.transform_fn(fields)
 
-        # Mark as ready for agent
+    async def mark_ready(self, db, message_ids: List[str]):
+        """Move processed messages to READY_FOR_AGENT in a single statement"""
+        if not message_ids:
+            return
         await db.execute(
             update(Message)
-            .where(Message.message_id == message_id)
+            .where(
+                Message.message_id
+                == any_(bindparam("message_ids", message_ids, type_=ARRAY(String)))
+            )
             .values(status=MessageStatus.READY_FOR_AGENT)
+            .execution_options(synchronize_session=False)
         )
-        await db.commit()
+        logger.info("Messages ready for agent", count=len(message_ids))
+
+    async def record_failures(self, db, rows: list):
+        """Count a failed pass for each claimed row, marking FAILED the ones
+        that have used up `max_attempts`
+        """
+        if not rows:
+            return
+        dead = [
+            row.message_id
+            for row in rows
+            if row.processing_attempts + 1 >= self.max_attempts
+        ]
+        await db.execute(
+            update(Message)
+            .where(
+                Message.message_id
+                == any_(
+                    bindparam(
+                        "message_ids",
+                        [row.message_id for row in rows],
+                        type_=ARRAY(String),
+                    )
+                )
+            )
+            .values(
+                processing_attempts=Message.processing_attempts + 1,
+                status=case(
+                    (
+                        Message.processing_attempts + 1 >= self.max_attempts,
+                        MessageStatus.FAILED,
+                    ),
+                    else_=Message.status,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if dead:
+            PROCESSOR_DEAD_LETTERS.inc(len(dead))
+            logger.error(
+                "Messages failed processing too often and were marked FAILED",
+                message_ids=dead,
+                attempts=self.max_attempts,
+            )
+
+    async def process_message(self, message_id: str, db, commit: bool = True):
+        """Process a single message and mark it as ready for agent"""
+        result = await db.execute(
+            select(Message.text_content, Message.chat_id).where(
+                Message.message_id == message_id
+            )
+        )
+        row = result.one()
+        error = (
+            await self.run_transforms(
+                [MessageFields(message_id, row.text_content, row.chat_id)]
+            )
+        )[0]
+        if error is not None:
+            raise RuntimeError(error)
+        await self.mark_ready(db, [message_id])
+        if commit:
+            await db.commit()
+
+
+def processor_from_settings(
+    test_processing_time: Optional[float] = None,
+) -> MessageProcessor:
+    """The configured message processor, reading settings at call time
 
-        logger.info("Message ready for agent", message_id=message_id)
+    Pool workers only take effect without `test_processing_time`.
+    """
+    return MessageProcessor(
+        test_processing_time=test_processing_time,
+        concurrency=settings.PROCESSOR_CONCURRENCY,
+        pool_workers=settings.PROCESSOR_POOL_WORKERS,
+        pool_chunksize=settings.PROCESSOR_POOL_CHUNKSIZE,
+        max_attempts=settings.PROCESSOR_MAX_ATTEMPTS,
+    )
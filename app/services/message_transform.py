@@ -0,0 +1,41 @@
+"""CPU-bound per-message processing, kept importable without the app
+
+Everything here runs in process pool children, so it only takes and returns
+plain picklable values and must not import settings, the database or the
+event loop.
+"""
+
+from typing import Callable, List, NamedTuple, Optional
+
+
+class MessageFields(NamedTuple):
+    """The columns a transform needs, copied out of the claimed rows"""
+
+    message_id: str
+    text: str
+    chat_id: str
+
+
+def transform_message(fields: MessageFields):
+    """Per-message processing work; touches no database state"""
+    # TODO: Implement actual message processing logic here
+    # This is where you would do NLP, entity extraction, etc.
+
+
+def transform_chunk(
+    transform: Callable[[MessageFields], object], chunk: List[MessageFields]
+) -> List[Optional[str]]:
+    """Run `transform` over a chunk, returning an error string or None per message
+
+    Errors come back as strings so one failing message neither fails the
+    chunk nor depends on its exception type being picklable.
+    """
+    errors = []
+    for fields in chunk:
+        try:
+            transform(fields)
+        except Exception as exc:
+            errors.append(f"{type(exc).__name__}: {exc}")
+        else:
+            errors.append(None)
+    return errors
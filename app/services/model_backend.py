@@ -0,0 +1,343 @@
+import abc
+import asyncio
+import importlib.util
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, NamedTuple, Optional
+
+import httpx
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+MODEL_REQUESTS = Counter(
+    "model_requests_total",
+    "Model calls by outcome, counting a retried call once",
+    ["outcome"],
+)
+MODEL_RETRIES = Counter(
+    "model_request_retries_total",
+    "Model attempts retried after a transport error or retryable status",
+    ["reason"],
+)
+MODEL_REQUEST_SECONDS = Histogram(
+    "model_request_seconds",
+    "Model call latency including retries and waits for a concurrency slot",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160),
+)
+MODEL_FIRST_TOKEN_SECONDS = Histogram(
+    "model_first_token_seconds",
+    "Time from starting a streamed model call to its first text",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20),
+)
+MODEL_IN_FLIGHT = Gauge(
+    "model_requests_in_flight",
+    "Model attempts holding a concurrency slot",
+)
+MODEL_TOKENS = Counter(
+    "model_tokens_total",
+    "Tokens reported by the model, by prompt or completion",
+    ["kind"],
+)
+
+# Statuses worth another attempt; anything else is the request's fault
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+COMPLETIONS_PATH = "/v1/chat/completions"
+
+
+class ModelUsage(NamedTuple):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def __add__(self, other):
+        return ModelUsage(
+            self.prompt_tokens + other.prompt_tokens,
+            self.completion_tokens + other.completion_tokens,
+        )
+
+
+class ModelResponse(NamedTuple):
+    text: str
+    usage: ModelUsage
+
+
+class ModelError(Exception):
+    """A model call failed for good, after any retries"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ModelBackend(abc.ABC):
+    """What the agent needs from a model; subclass once per provider
+
+    `messages` are chat-style {"role", "content"} dicts. `chat_id` lets a
+    backend limit how much of its capacity a single chat can take.
+    """
+
+    @abc.abstractmethod
+    async def complete(self, chat_id: Optional[str], messages: List[dict]):
+        """Return the whole reply as a ModelResponse"""
+
+    @abc.abstractmethod
+    def stream(
+        self, chat_id: Optional[str], messages: List[dict]
+    ) -> AsyncIterator[str]:
+        """Yield the reply as it is generated"""
+
+    async def aclose(self):
+        pass
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _parse_json(text: str, status: int):
+    """Decode a response body, or raise ModelError if it is not JSON"""
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise ModelError(f"Malformed model response: {e}", status=status) from e
+
+
+def _usage(body: dict) -> Optional[ModelUsage]:
+    usage = body.get("usage")
+    if not usage:
+        return None
+    return ModelUsage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+
+class HTTPModelBackend(ModelBackend):
+    """OpenAI-compatible chat completions over a shared, pooled HTTP client
+
+    One AsyncClient keeps connections open across calls (multiplexed over
+    HTTP/2 when h2 is installed). At most `max_concurrency` attempts run at
+    once and at most `per_chat_concurrency` for any one chat; a chat waits
+    for its own slot before taking a global one, so a busy chat cannot hold
+    global slots it is not using. Transport errors and RETRY_STATUSES are
+    retried up to `max_retries` times with full-jitter exponential backoff,
+    not holding a slot while backing off. A stream is only retried until it
+    has yielded text.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = settings.AGENT_MODEL,
+        api_key: Optional[str] = None,
+        max_concurrency: int = settings.MODEL_MAX_CONCURRENCY,
+        per_chat_concurrency: int = settings.MODEL_MAX_CONCURRENCY_PER_CHAT,
+        timeout_seconds: float = settings.MODEL_TIMEOUT_SECONDS,
+        connect_timeout_seconds: float = settings.MODEL_CONNECT_TIMEOUT_SECONDS,
+        max_retries: int = settings.MODEL_MAX_RETRIES,
+        retry_base_seconds: float = settings.MODEL_RETRY_BASE_SECONDS,
+        retry_max_seconds: float = settings.MODEL_RETRY_MAX_SECONDS,
+        http2: bool = settings.MODEL_HTTP2,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.per_chat_concurrency = per_chat_concurrency
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.max_retries = max_retries
+        self.retry_base = retry_base_seconds
+        self.retry_max = retry_max_seconds
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("h2 is not installed; model client falls back to HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.transport = transport
+        self.usage = ModelUsage()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global = asyncio.Semaphore(max_concurrency)
+        # chat_id -> [semaphore, callers]; dropped when the last caller leaves
+        self._chat_slots: dict = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use and again after aclose"""
+        if self._client is None:
+            headers = {}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _slot(self, chat_id: Optional[str]):
+        slot = self._chat_slots.get(chat_id)
+        if slot is None:
+            slot = self._chat_slots[chat_id] = [
+                asyncio.Semaphore(self.per_chat_concurrency),
+                0,
+            ]
+        slot[1] += 1
+        try:
+            async with slot[0], self._global:
+                MODEL_IN_FLIGHT.inc()
+                try:
+                    yield
+                finally:
+                    MODEL_IN_FLIGHT.dec()
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._chat_slots[chat_id]
+
+    def _payload(self, messages: List[dict], stream: bool) -> dict:
+        payload = {"model": self.model, "messages": messages, "stream": stream}
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _account(self, usage: Optional[ModelUsage]):
+        if usage is None:
+            return
+        self.usage += usage
+        MODEL_TOKENS.labels(kind="prompt").inc(usage.prompt_tokens)
+        MODEL_TOKENS.labels(kind="completion").inc(usage.completion_tokens)
+
+    async def _raise_for_status(self, response: httpx.Response):
+        if response.status_code < 400:
+            return
+        await response.aread()
+        raise ModelError(
+            f"Model returned {response.status_code}: {response.text[:200]}",
+            status=response.status_code,
+            retry_after=_retry_after(response),
+        )
+
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Seconds to wait before retrying after `error`, or None to give up"""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, httpx.TransportError):
+            reason = type(error).__name__
+        elif isinstance(error, ModelError) and error.status in RETRY_STATUSES:
+            reason = str(error.status)
+        else:
+            return None
+        MODEL_RETRIES.labels(reason=reason).inc()
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2**attempt))
+        if isinstance(error, ModelError) and error.retry_after is not None:
+            delay = max(delay, min(self.retry_max, error.retry_after))
+        return delay
+
+    def _failed(self, error: Exception) -> ModelError:
+        MODEL_REQUESTS.labels(outcome="error").inc()
+        if isinstance(error, ModelError):
+            return error
+        return ModelError(f"Model request failed: {type(error).__name__}: {error}")
+
+    async def complete(self, chat_id: Optional[str], messages: List[dict]):
+        payload = self._payload(messages, stream=False)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                async with self._slot(chat_id):
+                    response = await self.client.post(COMPLETIONS_PATH, json=payload)
+                    await self._raise_for_status(response)
+                body = _parse_json(response.text, response.status_code)
+                try:
+                    content = body["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError) as e:
+                    raise ModelError(
+                        f"Model response has no reply: {e!r}",
+                        status=response.status_code,
+                    ) from e
+                break
+            except (httpx.TransportError, ModelError) as e:
+                delay = self._retry_delay(attempt, e)
+                if delay is None:
+                    raise self._failed(e) from e
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        MODEL_REQUESTS.labels(outcome="ok").inc()
+        MODEL_REQUEST_SECONDS.observe(time.monotonic() - started)
+        usage = _usage(body)
+        self._account(usage)
+        return ModelResponse(content or "", usage or ModelUsage())
+
+    async def stream(self, chat_id: Optional[str], messages: List[dict]):
+        payload = self._payload(messages, stream=True)
+        started = time.monotonic()
+        attempt = 0
+        yielded = False
+        while True:
+            try:
+                async with self._slot(chat_id):
+                    async with self.client.stream(
+                        "POST", COMPLETIONS_PATH, json=payload
+                    ) as response:
+                        await self._raise_for_status(response)
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:") :].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = _parse_json(data, response.status_code)
+                            self._account(_usage(chunk))
+                            for choice in chunk.get("choices", []):
+                                text = choice.get("delta", {}).get("content")
+                                if not text:
+                                    continue
+                                if not yielded:
+                                    yielded = True
+                                    MODEL_FIRST_TOKEN_SECONDS.observe(
+                                        time.monotonic() - started
+                                    )
+                                yield text
+                break
+            except (httpx.TransportError, ModelError) as e:
+                # Text already handed to the caller cannot be taken back
+                delay = None if yielded else self._retry_delay(attempt, e)
+                if delay is None:
+                    raise self._failed(e) from e
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        MODEL_REQUESTS.labels(outcome="ok").inc()
+        MODEL_REQUEST_SECONDS.observe(time.monotonic() - started)
+
+
+def model_backend_from_settings() -> Optional[ModelBackend]:
+    """The configured model backend, or None to keep the placeholder agent"""
+    if not settings.MODEL_BASE_URL:
+        return None
+    return HTTPModelBackend(settings.MODEL_BASE_URL, api_key=settings.MODEL_API_KEY)
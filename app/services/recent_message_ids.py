@@ -0,0 +1,56 @@
+from typing import Iterable
+
+from prometheus_client import Counter
+
+from app.core.config import settings
+
+RECENT_ID_LOOKUPS = Counter(
+    "recent_message_id_lookups_total",
+    "Recently-stored message_id filter lookups on the ingestion path",
+    ["result"],
+)
+
+MESSAGE_REDELIVERIES = Counter(
+    "message_redeliveries_total",
+    "Messages received again after being stored",
+    ["detected_by"],
+)
+
+
+class RecentIdFilter:
+    """Bounded, exact set of recently committed message ids
+
+    Oldest ids are forgotten first once `max_ids` is reached. A hit still has to
+    be confirmed against the database, a miss only means the id is not recent.
+    """
+
+    def __init__(self, max_ids: int):
+        self.max_ids = max_ids
+        self.hits = 0
+        self.misses = 0
+        self._ids: dict = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, message_id: str) -> bool:
+        if message_id in self._ids:
+            self.hits += 1
+            RECENT_ID_LOOKUPS.labels(result="hit").inc()
+            return True
+        self.misses += 1
+        RECENT_ID_LOOKUPS.labels(result="miss").inc()
+        return False
+
+    def add(self, message_ids: Iterable[str]):
+        for message_id in message_ids:
+            self._ids.pop(message_id, None)
+            self._ids[message_id] = None
+        while len(self._ids) > self.max_ids:
+            del self._ids[next(iter(self._ids))]
+
+    def clear(self):
+        self._ids.clear()
+
+
+recent_message_ids = RecentIdFilter(max_ids=settings.RECENT_MESSAGE_IDS_MAX)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import structlog
+from prometheus_client import Counter
+
+from app.api_schemas.message import MessageCreate
+from app.core.config import settings
+from app.models.chat import ChatType
+
+logger = structlog.get_logger()
+
+ROSTER_CACHE_LOOKUPS = Counter(
+    "roster_cache_lookups_total",
+    "Chat roster cache lookups on the ingestion path",
+    ["result"],
+)
+
+
+class CachedRoster(NamedTuple):
+    fingerprint: str
+    chat_display_name: Optional[str]
+    chat_type: ChatType
+    user_ids: frozenset
+    expires_at: float
+    roster_hashes: set  # chat_rosters rows known to be stored for this chat
+
+
+def roster_fingerprint(message_data: MessageCreate) -> str:
+    """Hash of everything user/chat reconciliation writes for a message"""
+    digest = hashlib.sha256()
+    digest.update(repr(message_data.chat_display_name).encode())
+    for user_id, name in sorted(
+        {(m.user_id, m.name) for m in message_data.chat_members_struct},
+        key=repr,
+    ):
+        digest.update(b"\0" + repr((user_id, name)).encode())
+    return digest.hexdigest()
+
+
+def roster_hash(members: list) -> str:
+    """Content address of a member list in chat_rosters
+
+    Member order and is_sender are part of the identity, so the stored list
+    round-trips exactly.
+    """
+    canonical = json.dumps(members, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class RosterCache:
+    """Bounded LRU/TTL cache of chat_id -> last reconciled roster
+
+    A hit means the users, chat and chat_users rows for the roster are already
+    in the database, so ingestion can skip straight to the message insert.
+    Entries expire after `ttl_seconds` to bound staleness from renames made
+    by other processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._chats_by_user: dict = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_current(self, chat_id: str, fingerprint: str) -> bool:
+        """Whether the chat was last reconciled with this exact roster"""
+        entry = self._entries.get(chat_id)
+        if entry is not None and entry.expires_at <= self.clock():
+            self.invalidate(chat_id)
+            entry = None
+
+        if entry is not None and entry.fingerprint == fingerprint:
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            ROSTER_CACHE_LOOKUPS.labels(result="hit").inc()
+            return True
+
+        self.misses += 1
+        ROSTER_CACHE_LOOKUPS.labels(result="miss").inc()
+        return False
+
+    def store(self, message_data: MessageCreate, chat_type: ChatType):
+        """Remember a roster once its reconciliation has been committed"""
+        chat_id = message_data.chat_id
+        self.invalidate(chat_id)
+
+        user_ids = frozenset(m.user_id for m in message_data.chat_members_struct)
+        self._entries[chat_id] = CachedRoster(
+            fingerprint=roster_fingerprint(message_data),
+            chat_display_name=message_data.chat_display_name,
+            chat_type=chat_type,
+            user_ids=user_ids,
+            expires_at=self.clock() + self.ttl_seconds,
+            roster_hashes=set(),
+        )
+        for user_id in user_ids:
+            self._chats_by_user.setdefault(user_id, set()).add(chat_id)
+
+        while len(self._entries) > self.max_entries:
+            self.invalidate(next(iter(self._entries)))
+
+    def has_roster(self, chat_id: str, roster_hash: str) -> bool:
+        """Whether this member list is already stored in chat_rosters"""
+        entry = self._entries.get(chat_id)
+        return entry is not None and roster_hash in entry.roster_hashes
+
+    def add_roster(self, chat_id: str, roster_hash: str):
+        """Remember a committed chat_rosters row for a cached chat"""
+        entry = self._entries.get(chat_id)
+        if entry is not None:
+            entry.roster_hashes.add(roster_hash)
+
+    def invalidate(self, chat_id: str):
+        entry = self._entries.pop(chat_id, None)
+        if entry is None:
+            return
+        for user_id in entry.user_ids:
+            chat_ids = self._chats_by_user.get(user_id)
+            if chat_ids is not None:
+                chat_ids.discard(chat_id)
+                if not chat_ids:
+                    del self._chats_by_user[user_id]
+
+    def invalidate_users(self, user_ids: Iterable[str]):
+        """Drop every cached chat containing one of these (renamed) users"""
+        for user_id in user_ids:
+            for chat_id in list(self._chats_by_user.get(user_id, ())):
+                self.invalidate(chat_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._chats_by_user.clear()
+
+
+roster_cache = RosterCache(
+    max_entries=settings.ROSTER_CACHE_MAX_CHATS,
+    ttl_seconds=settings.ROSTER_CACHE_TTL_SECONDS,
+)
@@ -1,16 +1,125 @@
 #!/usr/bin/env python3
 import asyncio
 import os
-from datetime import datetime, timedelta
+import time
 from typing import Optional
 
-from sqlalchemy.future import select
+import structlog
+from sqlalchemy.pool import QueuePool
 
-from app.core.config import settings
+from app.core.config import AGENT_CONNECTIONS_PER_CHAT, settings
 from app.core.database import AsyncSessionLocal
-from app.models.message import Message, MessageStatus
-from app.services.agent_service import AgentService
-from app.services.message_processor import MessageProcessor
+from app.services.agent_log_partitions import agent_log_partitions
+from app.services.agent_log_writer import agent_log_writer
+from app.services.agent_service import AgentService, session_engine
+from app.services.debounce_scheduler import (
+    DebounceScheduler,
+    has_activity_since,
+    latest_activity,
+)
+from app.services.message_listener import WORKER_WAKEUPS, message_listener
+from app.services.message_processor import MessageProcessor, processor_from_settings
+
+logger = structlog.get_logger()
+
+
+async def run_processor_stage(
+    db,
+    processor: MessageProcessor,
+    batch_size: int,
+    scheduler: Optional[DebounceScheduler] = None,
+) -> int:
+    """Process unprocessed messages in claimed batches until none are left
+
+    Safe to run from several workers at once; each batch is claimed with
+    FOR UPDATE SKIP LOCKED. A message that fails is not claimed again in the
+    same pass, so each pass costs it at most one of its attempts. Returns the
+    number of messages marked ready.
+    """
+    total = 0
+    failed: set = set()
+    while True:
+        outcome = await processor.process_pending(db, batch_size, exclude=failed)
+        total += outcome.processed
+        failed.update(outcome.failed)
+        if scheduler is not None:
+            for chat_id, last_activity in outcome.activity.items():
+                scheduler.touch(chat_id, last_activity)
+        if outcome.claimed < batch_size:
+            return total
+
+
+def pool_agent_concurrency(engine, concurrency: int) -> int:
+    """How many of `concurrency` agent chats `engine`'s pool can serve at once
+
+    Keeps one connection for the stage's own session. Unbounded pools are
+    not capped.
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return concurrency
+    available = pool.size() + pool._max_overflow - 1
+    return max(1, min(concurrency, available // AGENT_CONNECTIONS_PER_CHAT))
+
+
+async def run_agent_stage(
+    db,
+    agent: AgentService,
+    scheduler: DebounceScheduler,
+    concurrency: int = settings.MAX_CONCURRENT_AGENTS,
+) -> Optional[float]:
+    """Run the agent for every chat that has been quiet for the debounce window
+
+    Up to `concurrency` chats run at once, each on one connection of `db`'s
+    engine that it holds while it drains, fewer if the engine's pool cannot
+    serve that many. Returns seconds until the next chat's window closes, if
+    any is scheduled.
+    """
+    quiet_chats = []
+    for chat_id in scheduler.due():
+        # Another worker may have seen newer messages in this chat
+        if await has_activity_since(db, chat_id, scheduler.quiet_since()):
+            last_activity = await latest_activity(db, chat_id)
+            if last_activity is not None:
+                scheduler.touch(chat_id, last_activity)
+                continue
+        quiet_chats.append(chat_id)
+
+    semaphore = asyncio.Semaphore(
+        pool_agent_concurrency(session_engine(db), concurrency)
+    )
+
+    async def run_chat(chat_id: str):
+        async with semaphore:
+            if await agent.process_chat(db, chat_id) is None:
+                # Another worker is running the agent on this chat, or a
+                # batch timed out and was handed back; look again after
+                # another window
+                scheduler.defer(chat_id)
+
+    outcomes = await asyncio.gather(
+        *(run_chat(chat_id) for chat_id in quiet_chats), return_exceptions=True
+    )
+    for chat_id, outcome in zip(quiet_chats, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error("Agent run failed", chat_id=chat_id, error=str(outcome))
+            scheduler.defer(chat_id)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+    return scheduler.seconds_until_next()
+
+
+async def run_lease_sweep(db, agent: AgentService, scheduler: DebounceScheduler):
+    """Return expired agent claims to READY_FOR_AGENT and schedule their chats
+
+    Also prunes the agent result cache table and maintains the agent log
+    partitions, each at its own slower interval.
+    """
+    reclaimed = await agent.reclaim_expired_leases(db)
+    for chat_id, last_activity in reclaimed.items():
+        scheduler.touch(chat_id, last_activity)
+    await agent.results.maybe_prune(db)
+    await agent_log_partitions.maybe_maintain(db)
 
 
 async def worker_loop(
@@ -20,39 +129,61 @@ async def worker_loop(
     if os.getenv("PYTEST_RUNNING") and not test_database_session:
         return
 
-    processor = MessageProcessor(test_processing_time=0.2)
-    agent = AgentService(test_processing_time=0.2)
+    # Tests stand in a short sleep for the real transforms and agent
+    test_processing_time = 0.2 if test_database_session else None
+    processor = processor_from_settings(test_processing_time)
+    agent = AgentService(test_processing_time=test_processing_time)
+    scheduler = DebounceScheduler(
+        override_debounce_seconds or settings.DEBOUNCE_SECONDS
+    )
+    batch_size = settings.WORKER_CLAIM_BATCH_SIZE
 
-    while True:
+    if test_database_session:
+        await run_lease_sweep(test_database_session, agent, scheduler)
+        await scheduler.rebuild(test_database_session)
+        await run_processor_stage(
+            test_database_session, processor, batch_size, scheduler
+        )
+        await run_agent_stage(test_database_session, agent, scheduler)
+        return
 
-        async def process_messages(db):
-            # Process unprocessed messages
-            unprocessed = await db.execute(
-                select(Message).where(Message.status == MessageStatus.UNPROCESSED)
-            )
-            for message in unprocessed.scalars():
-                await processor.process_message(str(message.message_id), db)
-
-            # Run agent on ready messages if no recent activity
-            cutoff = datetime.now() - timedelta(
-                seconds=override_debounce_seconds or settings.DEBOUNCE_SECONDS
-            )
-            recent_messages = await db.execute(
-                select(Message).where(Message.time_received > cutoff)
-            )
-            if not recent_messages.scalars().first():
-                await agent.process_batch(db)
-
-        if test_database_session:
-            await process_messages(test_database_session)
-        else:
+    async with AsyncSessionLocal() as db:
+        await scheduler.rebuild(db)
+    await message_listener.start()
+    await agent_log_writer.start()
+    next_sweep = time.monotonic()
+    try:
+        while True:
             async with AsyncSessionLocal() as db:
-                await process_messages(db)
-
-        if test_database_session:
-            break
+                if time.monotonic() >= next_sweep:
+                    await run_lease_sweep(db, agent, scheduler)
+                    next_sweep = time.monotonic() + settings.AGENT_LEASE_SWEEP_SECONDS
+                await run_processor_stage(db, processor, batch_size, scheduler)
+                remaining = await run_agent_stage(db, agent, scheduler)
 
-        await asyncio.sleep(5)
+            # Sleep until new messages are committed, the next chat's debounce
+            # window closes, the next lease sweep, or the fallback poll in case
+            # a notification was lost
+            until_sweep = max(0.0, next_sweep - time.monotonic())
+            timeout = min(settings.WORKER_FALLBACK_POLL_SECONDS, until_sweep)
+            if remaining is not None:
+                timeout = min(timeout, remaining)
+            if await message_listener.wait(timeout):
+                WORKER_WAKEUPS.labels(reason="notify").inc()
+            elif remaining is not None and timeout == remaining:
+                WORKER_WAKEUPS.labels(reason="debounce").inc()
+            elif timeout == until_sweep:
+                WORKER_WAKEUPS.labels(reason="lease_sweep").inc()
+            else:
+                WORKER_WAKEUPS.labels(reason="fallback_poll").inc()
+                # Pick up chats whose messages another worker processed
+                async with AsyncSessionLocal() as db:
+                    await scheduler.rebuild(db)
+    finally:
+        await message_listener.shutdown()
+        processor.shutdown()
+        await agent.aclose()
+        await agent_log_writer.shutdown()
 
 
 if __name__ == "__main__":
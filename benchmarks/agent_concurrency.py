@@ -0,0 +1,52 @@
+"""Agent stage drain time at different MAX_CONCURRENT_AGENTS levels
+
+Seeds READY_FOR_AGENT messages spread over `--chats` chats, then drains
+them with run_agent_stage using AgentService's test_processing_time hook as
+the per-batch agent latency. Run it against an otherwise idle database, since
+any other ready chats are drained too. Needs DATABASE_URL.
+
+    python -m benchmarks.agent_concurrency --chats 100 --levels 1 4 16
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.core.database import AsyncSessionLocal
+from app.models.message import MessageStatus
+from app.services.agent_service import AgentService
+from app.services.debounce_scheduler import DebounceScheduler
+from app.worker import run_agent_stage
+from benchmarks.processor_concurrency import seed
+
+
+async def run(args):
+    print(f"{'concurrency':>11} {'chats':>6} {'seconds':>8} {'chats/s':>8}")
+    for concurrency in args.levels:
+        await seed(
+            args.chats * args.messages_per_chat,
+            args.chats,
+            MessageStatus.READY_FOR_AGENT,
+        )
+        agent = AgentService(test_processing_time=args.agent_time)
+        scheduler = DebounceScheduler(debounce_seconds=0)
+        async with AsyncSessionLocal() as db:
+            await scheduler.rebuild(db)
+            chats = len(scheduler)
+            started = time.perf_counter()
+            await run_agent_stage(db, agent, scheduler, concurrency=concurrency)
+            elapsed = time.perf_counter() - started
+        print(f"{concurrency:>11} {chats:>6} {elapsed:>8.2f} {chats / elapsed:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages-per-chat", type=int, default=5)
+    parser.add_argument("--agent-time", type=float, default=0.5)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
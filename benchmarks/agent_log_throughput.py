@@ -0,0 +1,96 @@
+"""Logged agent steps per second: per-row commits against AgentLogWriter
+
+`--agents` concurrent coroutines each log `--steps` entries. The naive mode
+inserts and commits every entry in its own transaction, the way an agent
+would without the writer; the insert and copy modes go through
+AgentLogWriter with multi-row INSERT or COPY flushes. Timing includes the
+final flush, and the rows are deleted afterwards. Needs DATABASE_URL.
+
+    python -m benchmarks.agent_log_throughput --agents 8 --steps 500
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete
+
+from app.core.database import AsyncSessionLocal
+from app.models.agent_log import AgentLog, AgentLogLevel, AgentLogType
+from app.services.agent_log_writer import AgentLogWriter
+
+
+def step(session_id: str, i: int) -> dict:
+    return {
+        "session_id": session_id,
+        "log_type": AgentLogType.THOUGHT,
+        "message": f"Considering message {i} for tasks",
+        "level": AgentLogLevel.DEBUG if i % 2 else AgentLogLevel.INFO,
+        "extra_data": {"step": i, "candidates": ["buy milk", "call mum"]},
+    }
+
+
+async def naive(session_id: str, steps: int):
+    for i in range(steps):
+        async with AsyncSessionLocal() as db:
+            db.add(AgentLog(**step(session_id, i)))
+            await db.commit()
+
+
+async def buffered(logs: AgentLogWriter, session_id: str, steps: int):
+    for i in range(steps):
+        await logs.log(**step(session_id, i))
+
+
+async def run_mode(args, mode: str) -> float:
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    sessions = [f"{prefix}-{agent}" for agent in range(args.agents)]
+    started = time.perf_counter()
+    if mode == "naive":
+        await asyncio.gather(*(naive(s, args.steps) for s in sessions))
+    else:
+        logs = AgentLogWriter(
+            max_batch=args.max_batch,
+            max_delay_ms=args.max_delay_ms,
+            max_queue=args.max_queue,
+            full_policy="block",
+            copy_min_rows=1 if mode == "copy" else 10**9,
+        )
+        await logs.start()
+        await asyncio.gather(*(buffered(logs, s, args.steps) for s in sessions))
+        await logs.shutdown()
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(AgentLog).where(AgentLog.session_id.in_(sessions)))
+        await db.commit()
+    return elapsed
+
+
+async def run(args):
+    total = args.agents * args.steps
+    print(f"{'mode':>6} {'steps':>7} {'seconds':>8} {'steps/s':>9}")
+    for mode in args.modes:
+        elapsed = await run_mode(args, mode)
+        print(f"{mode:>6} {total:>7} {elapsed:>8.2f} {total / elapsed:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-delay-ms", type=float, default=100)
+    parser.add_argument("--max-queue", type=int, default=10000)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=["naive", "insert", "copy"],
+        default=["naive", "insert", "copy"],
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
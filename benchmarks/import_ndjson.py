@@ -0,0 +1,80 @@
+"""Benchmark the NDJSON COPY importer against a synthetic chat history
+
+Generates a file of MessageCreate records spread over group and private chats,
+then imports it with app.importer and prints rows/sec. Needs DATABASE_URL.
+
+    python -m benchmarks.import_ndjson --messages 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.importer import import_ndjson
+from app.models.message import MessageStatus
+
+
+def write_history(path, messages, chats, seed=0):
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex[:8]
+    rosters = []
+    for chat_index in range(chats):
+        size = 2 if chat_index % 3 else rng.randint(3, 30)
+        rosters.append(
+            [
+                {"user_id": f"bench-{run_id}-{chat_index}-{n}", "name": f"User {n}"}
+                for n in range(size)
+            ]
+        )
+
+    started = datetime.now(timezone.utc) - timedelta(days=180)
+    with open(path, "w", encoding="utf-8") as out:
+        for index in range(messages):
+            chat_index = rng.randrange(chats)
+            roster = rosters[chat_index]
+            sender = rng.randrange(len(roster))
+            record = {
+                "message_id": f"bench-{run_id}-{index}",
+                "text_content": "lorem ipsum " * rng.randint(1, 20),
+                "chat_id": f"bench-{run_id}-chat-{chat_index}",
+                "chat_display_name": f"Chat {chat_index}",
+                "chat_members_struct": [
+                    {**member, "is_sender": n == sender}
+                    for n, member in enumerate(roster)
+                ],
+                "time_received": (started + timedelta(seconds=index * 15)).isoformat(),
+            }
+            out.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=2_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".ndjson")
+    os.close(fd)
+    try:
+        write_history(path, args.messages, args.chats)
+        print(f"Wrote {args.messages} messages ({os.path.getsize(path) >> 20} MiB)")
+        with open(path, encoding="utf-8") as stream:
+            stats = asyncio.run(
+                import_ndjson(stream, MessageStatus.PROCESSED, args.chunk_size)
+            )
+        print(
+            f"Imported {stats.inserted} rows in {stats.elapsed:.1f}s "
+            f"= {stats.rows_per_second:.0f} rows/sec"
+        )
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
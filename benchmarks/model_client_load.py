@@ -0,0 +1,148 @@
+"""Agent model calls under load against the fake model server
+
+Runs `--batches` agent batches spread over `--chats` chats through
+AgentService.run_agent with an HTTPModelBackend, at each global concurrency
+level, and reports throughput, latency percentiles, retries and tokens.
+Starts `python -m app.fake_model_server` with the given latency and error
+rate unless `--url` points at a running server. No database is touched, but
+settings still need DATABASE_URL to be set.
+
+    python -m benchmarks.model_client_load --latency-ms 200 --tail-ms 300 \\
+        --error-rate 0.05 --levels 4 16 64
+"""
+
+import argparse
+import asyncio
+import socket
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from app.services.agent_service import AgentService
+from app.services.model_backend import MODEL_RETRIES, HTTPModelBackend, ModelError
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(args):
+    port = free_port()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-m",
+        "app.fake_model_server",
+        "--port",
+        str(port),
+        "--latency-ms",
+        str(args.latency_ms),
+        "--tail-ms",
+        str(args.tail_ms),
+        "--error-rate",
+        str(args.error_rate),
+        "--seed",
+        "1",
+    )
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{url}/docs")
+                return process, url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Fake model server did not start")
+
+
+def retries() -> float:
+    return sum(
+        sample.value
+        for metric in MODEL_RETRIES.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    )
+
+
+async def run_level(args, url: str, concurrency: int):
+    model = HTTPModelBackend(
+        url,
+        max_concurrency=concurrency,
+        per_chat_concurrency=args.per_chat,
+        max_retries=args.retries,
+        retry_base_seconds=args.retry_base,
+    )
+    agent = AgentService(model=model)
+    batch = [
+        SimpleNamespace(sender_name="Alex", text_content=f"message {i} " + "x" * 200)
+        for i in range(args.messages_per_batch)
+    ]
+    latencies, failures = [], 0
+
+    async def one(i: int):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            await agent.run_agent(f"chat-{i % args.chats}", batch)
+        except ModelError:
+            failures += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+
+    retried = retries()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.batches)))
+    elapsed = time.perf_counter() - started
+    await agent.aclose()
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    print(
+        f"{concurrency:>11} {args.batches / elapsed:>9.1f} {cuts[49]:>7.3f} "
+        f"{cuts[94]:>7.3f} {cuts[98]:>7.3f} {int(retries() - retried):>7} "
+        f"{failures:>7} {model.usage.prompt_tokens:>9} "
+        f"{model.usage.completion_tokens:>9}"
+    )
+
+
+async def run(args):
+    process = None
+    url = args.url
+    if url is None:
+        process, url = await start_server(args)
+    try:
+        print(
+            f"{'concurrency':>11} {'batches/s':>9} {'p50':>7} {'p95':>7} "
+            f"{'p99':>7} {'retries':>7} {'failed':>7} {'prompt':>9} "
+            f"{'completion':>9}"
+        )
+        for concurrency in args.levels:
+            await run_level(args, url, concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            await process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Model server to use instead of a fake one")
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--messages-per-batch", type=int, default=20)
+    parser.add_argument("--per-chat", type=int, default=2)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--retry-base", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--tail-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--levels", type=int, nargs="+", default=[4, 16, 64])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Process pool scaling of MessageProcessor.run_transforms
+
+Runs a CPU-bound synthetic transform (repeated sha256 over the message text)
+through the processor's process pool at increasing worker counts. No database
+is needed. On an idle machine msg/s should grow close to linearly up to the
+number of physical cores; "inline" is the same work on the event loop.
+
+    python -m benchmarks.process_pool_scaling --messages 2000 --rounds 2000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+from functools import partial
+
+from app.services.message_processor import MessageProcessor
+from app.services.message_transform import MessageFields
+
+
+def burn_cpu(fields, rounds):
+    digest = fields.text.encode()
+    for _ in range(rounds):
+        digest = hashlib.sha256(digest).digest()
+    return digest
+
+
+async def measure(processor, batch, batch_size):
+    started = time.perf_counter()
+    for start in range(0, len(batch), batch_size):
+        errors = await processor.run_transforms(batch[start : start + batch_size])
+        assert not any(errors), errors
+    return time.perf_counter() - started
+
+
+async def run(args):
+    batch = [
+        MessageFields(f"bench-{i}", f"message body {i}", f"chat-{i % 50}")
+        for i in range(args.messages)
+    ]
+    transform = partial(burn_cpu, rounds=args.rounds)
+    print(f"{'workers':>8} {'messages':>9} {'seconds':>8} {'msg/s':>8} {'speedup':>8}")
+
+    inline = MessageProcessor(pool_workers=0, transform_fn=transform)
+    baseline = await measure(inline, batch, args.batch_size)
+    print(
+        f"{'inline':>8} {args.messages:>9} {baseline:>8.2f} "
+        f"{args.messages / baseline:>8.0f} {1.0:>8.2f}"
+    )
+
+    for workers in args.workers:
+        processor = MessageProcessor(
+            pool_workers=workers,
+            pool_chunksize=args.chunksize,
+            transform_fn=transform,
+        )
+        try:
+            # Start the children outside the timed run
+            await processor.run_transforms(batch[:workers])
+            elapsed = await measure(processor, batch, args.batch_size)
+        finally:
+            processor.shutdown()
+        print(
+            f"{workers:>8} {args.messages:>9} {elapsed:>8.2f} "
+            f"{args.messages / elapsed:>8.0f} {baseline / elapsed:>8.2f}"
+        )
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))),
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
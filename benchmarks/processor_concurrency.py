@@ -0,0 +1,67 @@
+"""Processor stage throughput at different concurrency levels
+
+Seeds UNPROCESSED messages, then drains them with run_processor_stage using
+MessageProcessor's test_processing_time hook as the per-message cost. Run it
+against an otherwise idle database, since any other UNPROCESSED rows are
+drained too. Needs DATABASE_URL.
+
+    python -m benchmarks.processor_concurrency --messages 2000 --levels 1 4 16 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.importer import import_ndjson
+from app.models.message import MessageStatus
+from app.services.message_processor import MessageProcessor
+from app.worker import run_processor_stage
+from benchmarks.import_ndjson import write_history
+
+
+async def seed(messages, chats, status=MessageStatus.UNPROCESSED):
+    fd, path = tempfile.mkstemp(suffix=".ndjson")
+    os.close(fd)
+    try:
+        write_history(path, messages, chats)
+        with open(path, encoding="utf-8") as stream:
+            await import_ndjson(stream, status)
+    finally:
+        os.remove(path)
+
+
+async def run(args):
+    print(f"{'concurrency':>11} {'messages':>9} {'seconds':>8} {'msg/s':>8}")
+    for concurrency in args.levels:
+        await seed(args.messages, args.chats)
+        processor = MessageProcessor(
+            test_processing_time=args.processing_time, concurrency=concurrency
+        )
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            processed = await run_processor_stage(db, processor, args.batch_size)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{concurrency:>11} {processed:>9} {elapsed:>8.2f} "
+            f"{processed / elapsed:>8.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--processing-time", type=float, default=0.05)
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.WORKER_CLAIM_BATCH_SIZE
+    )
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
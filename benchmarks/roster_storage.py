@@ -0,0 +1,94 @@
+"""Compare message table size and scan time with and without inline rosters
+
+Builds `messages_inline`, a temp copy of messages that carries the member list
+as JSON on every row (the layout before chat_rosters), and prints the on-disk
+size and full-scan time of both layouts. Needs DATABASE_URL; pass --seed to
+import a synthetic history first.
+
+    python -m benchmarks.roster_storage --seed 200000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import asyncpg
+
+from app.core.config import settings
+from app.importer import import_ndjson
+from app.models.message import MessageStatus
+from benchmarks.import_ndjson import write_history
+
+BUILD_INLINE_COPY = """
+CREATE TEMP TABLE messages_inline AS
+SELECT m.message_id, m.text_content, m.time_received, m.user_id, m.sender_name,
+       r.members AS chat_members_struct, m.chat_id, m.is_spam, m.replied_to_fk,
+       m.status, m.text_character_count
+FROM messages m LEFT JOIN chat_rosters r ON r.roster_hash = m.roster_hash
+"""
+
+
+async def scan_seconds(conn, table, repeats):
+    """Best-of-n time to stream every row of `table` to the client"""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        async with conn.transaction():
+            async for _ in conn.cursor(f"SELECT * FROM {table}", prefetch=10000):
+                pass
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def relation_size(conn, table):
+    return await conn.fetchval("SELECT pg_total_relation_size($1::regclass)", table)
+
+
+async def run(repeats):
+    conn = await asyncpg.connect(settings.ASYNCPG_DSN)
+    try:
+        await conn.execute(BUILD_INLINE_COPY)
+        await conn.execute("ANALYZE messages_inline")
+        rows = await conn.fetchval("SELECT count(*) FROM messages")
+
+        before = await relation_size(conn, "messages_inline")
+        after = await relation_size(conn, "messages")
+        rosters = await relation_size(conn, "chat_rosters")
+        before_scan = await scan_seconds(conn, "messages_inline", repeats)
+        after_scan = await scan_seconds(conn, "messages", repeats)
+    finally:
+        await conn.close()
+
+    print(f"{rows} messages")
+    print(f"inline rosters:  {before >> 20:6d} MiB, scan {before_scan:.2f}s")
+    print(
+        f"chat_rosters:    {(after + rosters) >> 20:6d} MiB "
+        f"(messages {after >> 20} MiB + rosters {rosters >> 20} MiB), "
+        f"scan {after_scan:.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0, help="messages to import")
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.seed:
+        fd, path = tempfile.mkstemp(suffix=".ndjson")
+        os.close(fd)
+        try:
+            write_history(path, args.seed, args.chats)
+            with open(path, encoding="utf-8") as stream:
+                asyncio.run(import_ndjson(stream, MessageStatus.PROCESSED))
+        finally:
+            os.remove(path)
+
+    asyncio.run(run(args.repeats))
+
+
+if __name__ == "__main__":
+    main()
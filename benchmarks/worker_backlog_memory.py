@@ -0,0 +1,65 @@
+"""Worker memory while draining backlogs of different sizes
+
+Seeds an UNPROCESSED backlog, then drains it through the processor and agent
+stages (debounce 0) and reports the peak Python heap during the drain
+(tracemalloc) and the process peak RSS. Both should stay roughly flat as the
+backlog grows, since every scan is paged. Run it against an otherwise idle
+database, since any other pending rows are drained too. Needs DATABASE_URL.
+
+    python -m benchmarks.worker_backlog_memory --sizes 10000 100000 300000
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+import tracemalloc
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.agent_service import AgentService
+from app.services.debounce_scheduler import DebounceScheduler
+from app.services.message_processor import MessageProcessor
+from app.worker import run_agent_stage, run_processor_stage
+from benchmarks.processor_concurrency import seed
+
+
+async def drain():
+    processor = MessageProcessor(test_processing_time=0)
+    agent = AgentService(test_processing_time=0)
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    async with AsyncSessionLocal() as db:
+        await scheduler.rebuild(db)
+        processed = await run_processor_stage(
+            db, processor, settings.WORKER_CLAIM_BATCH_SIZE, scheduler
+        )
+        await run_agent_stage(db, agent, scheduler)
+    return processed
+
+
+async def run(args):
+    print(f"{'backlog':>8} {'seconds':>8} {'heap peak MB':>13} {'max RSS MB':>11}")
+    tracemalloc.start()
+    for size in args.sizes:
+        await seed(size, args.chats)
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        processed = await drain()
+        elapsed = time.perf_counter() - started
+        _, heap_peak = tracemalloc.get_traced_memory()
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"{processed:>8} {elapsed:>8.1f} {heap_peak / 2**20:>13.1f} "
+            f"{max_rss:>11.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chats", type=int, default=500)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
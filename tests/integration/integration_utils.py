@@ -1,5 +1,6 @@
 """Test utilities for DRY testing across test files"""
 
+import asyncio
 import uuid
 
 from sqlalchemy.future import select
@@ -44,6 +45,11 @@ async def post_message_with_data(client, **kwargs):
     return response, data
 
 
+async def post_message_batch(client, items):
+    """Post a list of message payloads to the batch endpoint"""
+    return await client.post("/api/v1/messages/batch", json=items)
+
+
 async def post_and_get_message(client, db_session, **kwargs):
     """Post a test message and return the DB model instance."""
     response, data = await post_message_with_data(client, **kwargs)
@@ -51,3 +57,13 @@ async def post_and_get_message(client, db_session, **kwargs):
         select(Message).where(Message.message_id == data["message_id"])
     )
     return result.scalars().first()
+
+
+async def wait_for_status(db_session, message, status, timeout=10, interval=0.1):
+    """Poll a message until it reaches status, failing after timeout seconds"""
+    for _ in range(int(timeout / interval)):
+        await db_session.refresh(message)
+        if message.status == status:
+            return
+        await asyncio.sleep(interval)
+    raise AssertionError(f"{message.message_id} never reached {status}")
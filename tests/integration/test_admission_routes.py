@@ -0,0 +1,108 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import status
+from sqlalchemy import update
+
+from app.models.message import Message
+from app.services.admission import admission
+from app.services.message_processor import MessageProcessor
+from app.worker import run_processor_stage
+from tests.integration.integration_utils import (
+    create_message_data,
+    post_and_get_message,
+    post_message_batch,
+    post_message_with_data,
+)
+
+
+@pytest.fixture
+def admission_enabled():
+    saved = (admission.enabled, admission.chat_rate, admission.chat_burst)
+    admission.reset()
+    admission.enabled = True
+    admission.chat_rate = 0.01
+    admission.chat_burst = 2
+    try:
+        yield admission
+    finally:
+        admission.enabled, admission.chat_rate, admission.chat_burst = saved
+        admission.reset()
+
+
+@pytest.mark.asyncio
+async def test_chat_rate_limit_returns_429(async_client, admission_enabled):
+    chat_id = f"limited_{str(uuid.uuid4())[:8]}"
+    for _ in range(2):
+        response, _ = await post_message_with_data(async_client, chat_id=chat_id)
+        assert response.status_code == status.HTTP_201_CREATED
+
+    response, _ = await post_message_with_data(async_client, chat_id=chat_id)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other chats are unaffected
+    response, _ = await post_message_with_data(async_client)
+    assert response.status_code == status.HTTP_201_CREATED
+
+
+@pytest.mark.asyncio
+async def test_batch_items_over_limit_fail_individually(
+    async_client, admission_enabled
+):
+    chat_id = f"limited_{str(uuid.uuid4())[:8]}"
+    items = [create_message_data(chat_id=chat_id) for _ in range(3)]
+
+    response = await post_message_batch(async_client, items)
+
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert (body["created"], body["errors"]) == (2, 1)
+    assert body["results"][2]["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_lag_returns_503(async_client, admission_enabled):
+    admission_enabled.sampled_at = admission_enabled.clock()
+    admission_enabled.lag_seconds = admission_enabled.max_lag_seconds + 1
+
+    response, _ = await post_message_with_data(async_client)
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == str(admission_enabled.retry_after)
+
+
+@pytest.mark.asyncio
+async def test_sample_measures_lag_and_pool_wait(db_session, admission_enabled):
+    await admission_enabled.sample()
+
+    assert admission_enabled.sampled_at is not None
+    assert admission_enabled.lag_seconds >= 0
+    assert admission_enabled.pool_wait_seconds >= 0
+
+
+@pytest.mark.serial
+@pytest.mark.asyncio
+async def test_busy_chat_held_by_debounce_does_not_add_lag(
+    async_client, db_session, admission_enabled
+):
+    await admission_enabled.sample()
+    before = admission_enabled.lag_seconds
+
+    # A chat that has had a message every few seconds for an hour
+    chat_id = f"busy_{str(uuid.uuid4())[:8]}"
+    oldest = await post_and_get_message(async_client, db_session, chat_id=chat_id)
+    await post_and_get_message(async_client, db_session, chat_id=chat_id)
+    await db_session.execute(
+        update(Message)
+        .where(Message.message_id == oldest.message_id)
+        .values(time_received=Message.time_received - timedelta(hours=1))
+    )
+    await db_session.commit()
+    await run_processor_stage(db_session, MessageProcessor(test_processing_time=0), 50)
+
+    await admission_enabled.sample()
+
+    # Still inside its debounce window, so it is not waiting on the pipeline
+    assert admission_enabled.lag_seconds < before + 60
@@ -0,0 +1,110 @@
+import asyncio
+import sys
+import uuid
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models.message import MessageStatus
+from app.services.agent_service import AgentService
+from app.services.message_processor import MessageProcessor
+from app.worker import run_processor_stage
+from tests.integration.integration_utils import (
+    post_and_get_message,
+    wait_for_status,
+)
+
+pytestmark = pytest.mark.serial
+
+# Runs the agent on one chat with a 1s lease and never finishes the batch
+CRASHING_WORKER = """
+import asyncio, sys
+from app.core.database import AsyncSessionLocal
+from app.services.agent_service import AgentService
+
+async def main():
+    agent = AgentService(test_processing_time=600, lease_seconds=1)
+    async with AsyncSessionLocal() as db:
+        await agent.process_chat(db, sys.argv[1])
+
+asyncio.run(main())
+"""
+
+
+def reclaimed_total():
+    return REGISTRY.get_sample_value("agent_leases_reclaimed_total") or 0
+
+
+async def ready_message(async_client, db_session, chat_id):
+    # Unique text, so no cached agent result can short-circuit the batch
+    message = await post_and_get_message(
+        async_client, db_session, chat_id=chat_id, text=str(uuid.uuid4())
+    )
+    await run_processor_stage(db_session, MessageProcessor(test_processing_time=0), 50)
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+    return message
+
+
+@pytest.mark.asyncio
+async def test_lease_is_renewed_while_agent_runs(async_client, db_session):
+    chat_id = "lease-renewal-chat"
+    message = await ready_message(async_client, db_session, chat_id)
+    agent = AgentService(test_processing_time=2.5, lease_seconds=1)
+
+    SessionLocal = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    async def run_agent():
+        async with SessionLocal() as db:
+            return await agent.process_chat(db, chat_id)
+
+    batch = asyncio.create_task(run_agent())
+    await wait_for_status(
+        db_session, message, MessageStatus.AGENT_PROCESSING, timeout=15
+    )
+    await asyncio.sleep(1.5)
+
+    # Past the original expiry, but renewed
+    sweeper = AgentService()
+    assert chat_id not in await sweeper.reclaim_expired_leases(db_session)
+
+    assert await batch == 1
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.PROCESSED
+    assert message.lease_owner is None
+
+
+@pytest.mark.asyncio
+async def test_crashed_worker_lease_is_reclaimed(async_client, db_session):
+    chat_id = "lease-crash-chat"
+    message = await ready_message(async_client, db_session, chat_id)
+    before = reclaimed_total()
+
+    worker = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", CRASHING_WORKER, chat_id
+    )
+    try:
+        await wait_for_status(
+            db_session, message, MessageStatus.AGENT_PROCESSING, timeout=15
+        )
+        await asyncio.sleep(1.5)
+        # Still alive and renewing, so nothing to reclaim yet
+        sweeper = AgentService()
+        assert chat_id not in await sweeper.reclaim_expired_leases(db_session)
+    finally:
+        worker.kill()
+        await worker.wait()
+
+    await asyncio.sleep(1.5)
+    reclaimed = await sweeper.reclaim_expired_leases(db_session)
+
+    assert chat_id in reclaimed
+    assert reclaimed_total() >= before + 1
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+    assert message.lease_owner is None
+
+    assert await sweeper.process_chat(db_session, chat_id) == 1
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.PROCESSED
@@ -0,0 +1,67 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.future import select
+
+from app.models.agent_log import AgentLog, AgentLogType
+from app.services.agent_log_partitions import AgentLogPartitions
+
+pytestmark = pytest.mark.serial
+
+
+async def partition_of(db_session, session_id: str) -> str:
+    return await db_session.scalar(
+        select(text("tableoid::regclass::text"))
+        .select_from(AgentLog)
+        .where(AgentLog.session_id == session_id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_creates_partitions_ahead_and_drops_expired(db_session):
+    partitions = AgentLogPartitions(
+        interval="day", ahead_days=3, retention_days=30, check_seconds=0
+    )
+    await db_session.commit()
+    # No partition covers 2020 yet, so this row starts in the default one
+    await db_session.execute(
+        insert(AgentLog).values(
+            session_id="test-partition-move",
+            log_type=AgentLogType.THOUGHT,
+            message="from before maintenance",
+            created_at=datetime(2020, 1, 2, 12, tzinfo=timezone.utc),
+        )
+    )
+    await db_session.commit()
+    assert await partition_of(db_session, "test-partition-move") == (
+        "agent_logs_default"
+    )
+
+    try:
+        assert await partitions.maintain(db_session, today=date(2020, 1, 1))
+        names = [p.name for p in await partitions.existing(db_session)]
+        assert {
+            "agent_logs_20200101_20200102",
+            "agent_logs_20200102_20200103",
+            "agent_logs_20200103_20200104",
+            "agent_logs_20200104_20200105",
+        } <= set(names)
+        assert await partition_of(db_session, "test-partition-move") == (
+            "agent_logs_20200102_20200103"
+        )
+
+        # Already covered, so nothing new
+        assert await partitions.maintain(db_session, today=date(2020, 1, 1))
+        assert [p.name for p in await partitions.existing(db_session)] == names
+
+        assert await partitions.maintain(db_session, today=date(2020, 3, 1))
+        names = [p.name for p in await partitions.existing(db_session)]
+        assert not [name for name in names if name.startswith("agent_logs_202001")]
+        assert "agent_logs_20200301_20200302" in names
+        assert await partition_of(db_session, "test-partition-move") is None
+    finally:
+        for partition in await partitions.existing(db_session):
+            if partition.start.year == 2020:
+                await db_session.execute(text(f'DROP TABLE "{partition.name}"'))
+        await db_session.commit()
@@ -0,0 +1,58 @@
+import uuid
+
+import pytest
+from sqlalchemy import delete, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+from app.models.agent_log import AgentLog, AgentLogLevel, AgentLogType
+from app.services.agent_log_writer import AgentLogWriter
+
+pytestmark = pytest.mark.serial
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("copy_min_rows", [1, 10**6], ids=["copy", "insert"])
+async def test_writes_queued_entries_in_bulk(db_session, copy_min_rows):
+    session_id = f"test-{uuid.uuid4()}"
+    logs = AgentLogWriter(
+        max_batch=50,
+        max_delay_ms=10,
+        max_queue=1000,
+        full_policy="block",
+        copy_min_rows=copy_min_rows,
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+    )
+    await logs.start()
+    for i in range(120):
+        await logs.log(
+            session_id,
+            AgentLogType.THOUGHT,
+            f"step {i}",
+            level=AgentLogLevel.DEBUG,
+            extra_data={"step": i},
+        )
+    await logs.shutdown()
+
+    try:
+        assert logs.flushes >= 3
+        count = await db_session.scalar(
+            select(func.count()).where(AgentLog.session_id == session_id)
+        )
+        assert count == 120
+        last = (
+            await db_session.execute(
+                select(AgentLog)
+                .where(AgentLog.session_id == session_id)
+                .order_by(AgentLog.created_at.desc(), AgentLog.id.desc())
+                .limit(1)
+            )
+        ).scalar_one()
+        assert last.message == "step 119"
+        assert last.level == AgentLogLevel.DEBUG
+        assert last.extra_data == {"step": 119}
+    finally:
+        await db_session.execute(
+            delete(AgentLog).where(AgentLog.session_id == session_id)
+        )
+        await db_session.commit()
@@ -0,0 +1,133 @@
+import uuid
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.future import select
+
+from app.models.agent_result import AgentResult
+from app.models.message import MessageStatus
+from app.models.todo import Task, task_message_association
+from app.services.agent_result_cache import batch_cache_key
+from app.services.agent_service import AgentService, message_line
+from app.services.message_processor import MessageProcessor
+from app.worker import run_processor_stage
+from tests.integration.integration_utils import post_and_get_message
+
+pytestmark = pytest.mark.serial
+
+
+class CountingAgent(AgentService):
+    """Extracts one task per batch and counts real agent runs"""
+
+    runs = 0
+
+    async def run_agent(self, chat_id, batch, context=()):
+        CountingAgent.runs += 1
+        return {
+            "tasks": [
+                {
+                    "task_name": "Pick up the cake",
+                    "task_or_event": "TASK",
+                    "task_type": "ERRAND",
+                    "message_indexes": [0],
+                }
+            ]
+        }
+
+
+@pytest.mark.asyncio
+async def test_identical_batch_reuses_stored_result(async_client, db_session):
+    text = f"Can someone pick up the cake? {uuid.uuid4()}"
+    first = await post_and_get_message(async_client, db_session, text=text)
+    # Forwarded into another chat, with different spacing and case
+    forwarded = await post_and_get_message(
+        async_client, db_session, text=f"  {text.upper()} "
+    )
+    await run_processor_stage(db_session, MessageProcessor(test_processing_time=0), 50)
+    CountingAgent.runs = 0
+
+    assert await CountingAgent().process_chat(db_session, first.chat_id) == 1
+    # A fresh agent has an empty memory tier, so this hit comes from Postgres
+    assert await CountingAgent().process_chat(db_session, forwarded.chat_id) == 1
+
+    assert CountingAgent.runs == 1
+    stored = await db_session.get(
+        AgentResult, batch_cache_key([message_line(first.sender_name, text)])
+    )
+    assert stored is not None
+    for message in (first, forwarded):
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+        result = await db_session.execute(
+            select(Task.task_name)
+            .join(task_message_association)
+            .where(task_message_association.c.message_id == message.message_id)
+        )
+        assert result.scalars().all() == ["Pick up the cake"]
+
+
+def cache_lookups(result):
+    return (
+        REGISTRY.get_sample_value(
+            "agent_result_cache_lookups_total", {"result": result}
+        )
+        or 0
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_shown_same_context_reuses_result(async_client, db_session):
+    question = f"Who is bringing the cake? {uuid.uuid4()}"
+    answer = f"I'll pick it up {uuid.uuid4()}"
+    processor = MessageProcessor(test_processing_time=0)
+    chats = [f"context-chat-{uuid.uuid4()}" for _ in range(2)]
+
+    # The same conversation in two chats, answered after the question's batch
+    for chat_id in chats:
+        await post_and_get_message(
+            async_client, db_session, chat_id=chat_id, text=question
+        )
+    await run_processor_stage(db_session, processor, 50)
+    for chat_id in chats:
+        assert await CountingAgent().process_chat(db_session, chat_id) == 1
+    for chat_id in chats:
+        await post_and_get_message(
+            async_client, db_session, chat_id=chat_id, text=answer
+        )
+    await run_processor_stage(db_session, processor, 50)
+
+    CountingAgent.runs = 0
+    misses = cache_lookups("miss")
+    assert await CountingAgent().process_chat(db_session, chats[0]) == 1
+    # A fresh agent, so the hit comes from Postgres
+    assert await CountingAgent().process_chat(db_session, chats[1]) == 1
+
+    assert CountingAgent.runs == 1
+    assert cache_lookups("miss") == misses + 1
+
+
+class UnstorableAgent(AgentService):
+    """Returns a result that fails at INSERT"""
+
+    async def run_agent(self, chat_id, batch, context=()):
+        return {"tasks": [{"task_name": None, "task_or_event": "TASK"}]}
+
+
+@pytest.mark.asyncio
+async def test_unstorable_result_is_evicted_and_batch_released(
+    async_client, db_session
+):
+    text = f"Unstorable {uuid.uuid4()}"
+    message = await post_and_get_message(async_client, db_session, text=text)
+    await run_processor_stage(db_session, MessageProcessor(test_processing_time=0), 50)
+    agent = UnstorableAgent(context_messages=0)
+    key = batch_cache_key([message_line(message.sender_name, text)])
+
+    with pytest.raises(Exception):
+        await agent.process_chat(db_session, message.chat_id)
+
+    assert agent.results.get(key) is None
+    assert await db_session.get(AgentResult, key) is None
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+    assert message.lease_owner is None
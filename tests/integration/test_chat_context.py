@@ -0,0 +1,53 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services.chat_context_cache import chat_context, chat_context_cache
+from tests.integration.integration_utils import post_and_get_message
+
+pytestmark = pytest.mark.serial
+
+# After anything the test stores, whatever the database clock says
+LATER = datetime(2100, 1, 1, tzinfo=timezone.utc)
+
+
+def lookups(result: str) -> float:
+    return (
+        REGISTRY.get_sample_value("chat_context_lookups_total", {"result": result}) or 0
+    )
+
+
+@pytest.mark.asyncio
+async def test_context_is_filled_once_and_kept_current_by_ingestion(
+    async_client, db_session
+):
+    chat_id = str(uuid.uuid4())
+    chat_context_cache.clear()
+    first = await post_and_get_message(
+        async_client, db_session, chat_id=chat_id, text="Dinner on Friday?"
+    )
+    second = await post_and_get_message(
+        async_client,
+        db_session,
+        chat_id=chat_id,
+        text="Sure, I'll book",
+        replied_to_fk=first.message_id,
+    )
+    filled, hits = lookups("filled"), lookups("hit")
+
+    context = await chat_context(db_session, chat_id, LATER)
+    assert [m.message_id for m in context] == [first.message_id, second.message_id]
+    assert context[1].replied_to == first.message_id
+
+    third = await post_and_get_message(
+        async_client, db_session, chat_id=chat_id, text="Booked for 7"
+    )
+    context = await chat_context(db_session, chat_id, LATER)
+    assert [m.text for m in context][-1] == "Booked for 7"
+    context = await chat_context(db_session, chat_id, third.time_received)
+    assert [m.message_id for m in context] == [first.message_id, second.message_id]
+
+    assert lookups("filled") - filled == 1
+    assert lookups("hit") - hits == 2
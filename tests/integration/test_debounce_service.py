@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api.routes import messages as messages_routes
+from app.models.message import MessageStatus
+from app.services.debounce_service import DebounceService
+from tests.integration.integration_utils import (
+    post_and_get_message,
+    wait_for_status,
+)
+
+pytestmark = pytest.mark.serial
+
+
+@pytest.fixture
+async def embedded_worker(db_session, monkeypatch):
+    service = DebounceService(
+        debounce_seconds=0.5,
+        max_queue=2,
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+    )
+    service.processor.test_processing_time = 0
+    service.agent.test_processing_time = 0
+    monkeypatch.setattr(messages_routes, "debounce_service", service)
+    yield service
+    await service.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_router_notification_drives_processing(
+    async_client, db_session, embedded_worker
+):
+    await embedded_worker.start()
+    message = await post_and_get_message(async_client, db_session)
+
+    await wait_for_status(db_session, message, MessageStatus.PROCESSED)
+
+
+@pytest.mark.asyncio
+async def test_startup_recovers_messages_committed_while_stopped(
+    async_client, db_session, embedded_worker
+):
+    # Not running yet, so the router's notification is dropped
+    message = await post_and_get_message(async_client, db_session)
+    assert message.status == MessageStatus.UNPROCESSED
+
+    await embedded_worker.start()
+
+    await wait_for_status(db_session, message, MessageStatus.PROCESSED)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_falls_back_to_database(
+    async_client, db_session, embedded_worker
+):
+    await embedded_worker.start()
+    # Let startup recovery finish so the task is waiting on the queue
+    await asyncio.sleep(0.5)
+    before = REGISTRY.get_sample_value("embedded_worker_queue_overflows_total") or 0
+
+    message = await post_and_get_message(async_client, db_session)
+    # Synchronous, so the queue of 2 overflows before the task can drain it
+    for chat_id in ("other-chat-1", "other-chat-2", "other-chat-3", "other-chat-4"):
+        embedded_worker.notify(chat_id)
+
+    overflows = REGISTRY.get_sample_value("embedded_worker_queue_overflows_total")
+    assert overflows >= before + 2
+    await wait_for_status(db_session, message, MessageStatus.PROCESSED)
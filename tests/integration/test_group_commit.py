@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api_schemas.message import MessageBatchItemStatus, MessageCreate
+from app.services.group_commit import GroupCommitBuffer, WriteBufferFullError
+from tests.integration.integration_utils import create_message_data
+
+
+def make_buffer(db_session, **kwargs):
+    options = {"max_batch": 50, "max_delay_ms": 50, "max_queue": 100, **kwargs}
+    return GroupCommitBuffer(
+        session_factory=async_sessionmaker(db_session.bind, expire_on_commit=False),
+        **options,
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_messages_share_a_flush(db_session):
+    buffer = make_buffer(db_session)
+    await buffer.start()
+    try:
+        items = [MessageCreate(**create_message_data()) for _ in range(10)]
+        results = await asyncio.gather(*(buffer.submit(item) for item in items))
+    finally:
+        await buffer.shutdown()
+
+    assert [r.status for r in results] == [MessageBatchItemStatus.CREATED] * 10
+    assert [r.message.message_id for r in results] == [i.message_id for i in items]
+    assert buffer.flushes < len(items)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_queued_messages(db_session):
+    buffer = make_buffer(db_session, max_delay_ms=1000)
+    await buffer.start()
+    pending = [
+        asyncio.create_task(buffer.submit(MessageCreate(**create_message_data())))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+
+    await buffer.shutdown()
+
+    results = await asyncio.gather(*pending)
+    assert all(r.status == MessageBatchItemStatus.CREATED for r in results)
+    assert not buffer.running
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected(db_session):
+    buffer = make_buffer(db_session, max_queue=1)
+    await buffer.start()
+    try:
+        results = await asyncio.gather(
+            *(buffer.submit(MessageCreate(**create_message_data())) for _ in range(5)),
+            return_exceptions=True,
+        )
+    finally:
+        await buffer.shutdown()
+
+    rejected = [r for r in results if isinstance(r, WriteBufferFullError)]
+    accepted = [r for r in results if not isinstance(r, Exception)]
+    assert rejected
+    assert len(rejected) + len(accepted) == 5
+    assert all(r.status == MessageBatchItemStatus.CREATED for r in accepted)
@@ -0,0 +1,77 @@
+import io
+import json
+import uuid
+
+import pytest
+from sqlalchemy.future import select
+
+from app.importer import import_ndjson
+from app.models import ChatRoster, Message
+from app.models.message import MessageStatus
+from tests.integration.integration_utils import create_message_data
+
+
+@pytest.mark.asyncio
+async def test_import_ndjson(db_session):
+    chat_id = f"import_chat_{str(uuid.uuid4())[:8]}"
+    members = [
+        {"user_id": str(uuid.uuid4()), "name": "Alice", "is_sender": True},
+        {"user_id": str(uuid.uuid4()), "name": "Bob", "is_sender": False},
+    ]
+    first = create_message_data(text="first", chat_id=chat_id, members=members)
+    first["time_received"] = "2025-01-01T12:00:00+00:00"
+    reply = create_message_data(
+        text="reply",
+        chat_id=chat_id,
+        members=members,
+        replied_to_fk=first["message_id"],
+    )
+    lines = [json.dumps(first), json.dumps(reply), json.dumps(first), "not json"]
+
+    stats = await import_ndjson(
+        io.StringIO("\n".join(lines)), MessageStatus.PROCESSED, chunk_size=2
+    )
+
+    assert stats.read == 4
+    assert stats.inserted == 2
+    assert stats.duplicates == 1
+    assert stats.invalid == 1
+    result = await db_session.execute(
+        select(Message)
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.time_received)
+    )
+    imported = result.scalars().all()
+    assert [m.text_content for m in imported] == ["first", "reply"]
+    assert all(m.status == MessageStatus.PROCESSED for m in imported)
+    assert imported[0].time_received.year == 2025
+    assert imported[1].replied_to_fk == first["message_id"]
+    assert imported[0].roster_hash == imported[1].roster_hash
+    roster = await db_session.get(ChatRoster, imported[0].roster_hash)
+    assert roster.members == members
+
+
+@pytest.mark.asyncio
+async def test_import_links_replies_to_later_chunks(db_session):
+    chat_id = f"import_chat_{str(uuid.uuid4())[:8]}"
+    target = create_message_data(text="target", chat_id=chat_id)
+    reply = create_message_data(
+        text="reply", chat_id=chat_id, replied_to_fk=target["message_id"]
+    )
+    orphan = create_message_data(
+        text="orphan", chat_id=chat_id, replied_to_fk=str(uuid.uuid4())
+    )
+    # The reply's chunk is merged before its target's
+    lines = [json.dumps(reply), json.dumps(orphan), json.dumps(target)]
+
+    stats = await import_ndjson(
+        io.StringIO("\n".join(lines)), MessageStatus.PROCESSED, chunk_size=2
+    )
+
+    assert stats.inserted == 3
+    assert stats.replies_linked_late == 1
+    assert stats.replies_dropped == 1
+    stored = await db_session.get(Message, reply["message_id"])
+    assert stored.replied_to_fk == target["message_id"]
+    stored = await db_session.get(Message, orphan["message_id"])
+    assert stored.replied_to_fk is None
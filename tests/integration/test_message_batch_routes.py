@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+from fastapi import status
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from app.models import Chat, Message
+from app.models.chat import ChatType
+from tests.integration.integration_utils import (
+    create_message_data,
+    post_message_batch,
+    post_message_with_data,
+)
+
+
+class TestMessageBatchRoutes:
+    """Integration tests for the batch message endpoint"""
+
+    @staticmethod
+    def unique_id(prefix="test"):
+        """Generate a unique ID for tests"""
+        return f"{prefix}_{str(uuid.uuid4())[:8]}"
+
+    @pytest.mark.asyncio
+    async def test_batch_creates_messages_users_and_chat(
+        self, async_client, db_session
+    ):
+        """Test a burst for one group chat creates everything in one request"""
+        chat_id = self.unique_id("batch_chat")
+        members = [
+            {"user_id": self.unique_id("batch_user"), "name": name, "is_sender": False}
+            for name in ("Alice", "Bob", "Charlie")
+        ]
+        items = []
+        for sender in range(3):
+            roster = [
+                {**member, "is_sender": index == sender}
+                for index, member in enumerate(members)
+            ]
+            items.append(
+                create_message_data(
+                    text=f"Message {sender}",
+                    chat_id=chat_id,
+                    chat_name="Batch Chat",
+                    members=roster,
+                )
+            )
+
+        response = await post_message_batch(async_client, items)
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["created"] == 3
+        assert body["duplicates"] == body["errors"] == 0
+        for item, result in zip(items, body["results"]):
+            assert result["status"] == "created"
+            assert result["message_id"] == item["message_id"]
+            assert result["message"]["status"] == "unprocessed"
+        assert body["results"][1]["message"]["sender_name"] == "Bob"
+
+        result = await db_session.execute(
+            select(Chat)
+            .options(selectinload(Chat.users))
+            .where(Chat.chat_id == chat_id)
+        )
+        chat = result.scalars().first()
+        assert chat.chat_display_name == "Batch Chat"
+        assert chat.chat_type == ChatType.GROUP
+        assert len(chat.users) == 3
+
+    @pytest.mark.asyncio
+    async def test_batch_reports_per_item_results(self, async_client, db_session):
+        """Test duplicates and invalid items do not fail the rest of the batch"""
+        existing_response, existing = await post_message_with_data(async_client)
+        assert existing_response.status_code == status.HTTP_201_CREATED
+
+        original = create_message_data()
+        reply = create_message_data(replied_to_fk=original["message_id"])
+        no_sender = create_message_data(
+            members=[
+                {
+                    "user_id": self.unique_id("user"),
+                    "name": "Lurker",
+                    "is_sender": False,
+                }
+            ]
+        )
+        bad_reply = create_message_data(replied_to_fk=self.unique_id("missing"))
+        items = [original, existing, reply, original, no_sender, bad_reply]
+
+        response = await post_message_batch(async_client, items)
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert [result["status"] for result in body["results"]] == [
+            "created",
+            "duplicate",
+            "created",
+            "duplicate",
+            "error",
+            "error",
+        ]
+        assert (body["created"], body["duplicates"], body["errors"]) == (2, 2, 2)
+        assert body["results"][2]["message"]["replied_to_fk"] == original["message_id"]
+        # Duplicates carry the stored message
+        assert body["results"][1]["message"] == existing_response.json()
+        assert body["results"][3]["message"] == body["results"][0]["message"]
+
+        result = await db_session.execute(
+            select(Message.message_id).where(
+                Message.message_id.in_(
+                    [no_sender["message_id"], bad_reply["message_id"]]
+                )
+            )
+        )
+        assert result.scalars().first() is None
+
+    @pytest.mark.asyncio
+    async def test_empty_batch_rejected(self, async_client):
+        """Test an empty batch is rejected"""
+        response = await post_message_batch(async_client, [])
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,36 @@
+import pytest
+
+from app.core.config import settings
+from app.services.message_listener import MessageListener
+from tests.integration.integration_utils import (
+    create_message_data,
+    post_message,
+    post_message_batch,
+)
+
+# Asserts that no other wake-up arrives, so no other test may insert messages
+pytestmark = pytest.mark.serial
+
+
+@pytest.mark.asyncio
+async def test_listener_wakes_on_committed_messages(async_client):
+    listener = MessageListener(settings.ASYNCPG_DSN)
+    await listener.start()
+    try:
+        # The first wake-up follows the initial LISTEN
+        assert await listener.wait(timeout=10)
+        assert listener.connected
+
+        response = await post_message(async_client)
+        assert response.status_code == 201
+        assert await listener.wait(timeout=5)
+
+        # A whole batch is one statement, so one wake-up
+        response = await post_message_batch(
+            async_client, [create_message_data() for _ in range(3)]
+        )
+        assert response.status_code == 200
+        assert await listener.wait(timeout=5)
+        assert not await listener.wait(timeout=0.5)
+    finally:
+        await listener.shutdown()
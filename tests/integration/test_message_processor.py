@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from app.models.message import MessageStatus
+from app.services.message_processor import MessageProcessor
+from app.worker import run_processor_stage
+from tests.integration.integration_utils import post_and_get_message
+
+pytestmark = pytest.mark.serial
+
+
+class FlakyProcessor(MessageProcessor):
+    """Fails one message and records how many transforms overlap"""
+
+    def __init__(self, failing_id, **kwargs):
+        super().__init__(**kwargs)
+        self.failing_id = failing_id
+        self.in_flight = 0
+        self.peak = 0
+
+    async def transform(self, fields):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if fields.message_id == self.failing_id:
+                raise RuntimeError("transform failed")
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_processor_stage_isolates_failures(async_client, db_session):
+    messages = [await post_and_get_message(async_client, db_session) for _ in range(6)]
+    processor = FlakyProcessor(messages[0].message_id, concurrency=4)
+
+    processed = await run_processor_stage(db_session, processor, batch_size=50)
+
+    assert processed >= 5
+    assert 1 < processor.peak <= 4
+    await db_session.refresh(messages[0])
+    assert messages[0].status == MessageStatus.UNPROCESSED
+    for message in messages[1:]:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.READY_FOR_AGENT
+
+
+def fail_on_text(fields):
+    if fields.text.startswith("fail"):
+        raise ValueError("cannot process")
+
+
+@pytest.mark.asyncio
+async def test_processor_stage_in_process_pool(async_client, db_session):
+    ok = await post_and_get_message(async_client, db_session)
+    failing = await post_and_get_message(async_client, db_session, text="fail me")
+    processor = MessageProcessor(
+        pool_workers=2, pool_chunksize=1, transform_fn=fail_on_text
+    )
+    try:
+        await run_processor_stage(db_session, processor, batch_size=50)
+    finally:
+        processor.shutdown()
+
+    await db_session.refresh(ok)
+    await db_session.refresh(failing)
+    assert ok.status == MessageStatus.READY_FOR_AGENT
+    assert failing.status == MessageStatus.UNPROCESSED
+
+
+@pytest.mark.asyncio
+async def test_processor_marks_repeated_failures_failed(async_client, db_session):
+    failing = await post_and_get_message(async_client, db_session, text="fail me")
+    processor = MessageProcessor(transform_fn=fail_on_text, max_attempts=2)
+
+    await processor.process_pending(db_session, 50)
+    await db_session.refresh(failing)
+    assert failing.status == MessageStatus.UNPROCESSED
+    assert failing.processing_attempts == 1
+
+    await processor.process_pending(db_session, 50)
+    await db_session.refresh(failing)
+    assert failing.status == MessageStatus.FAILED
+    assert failing.processing_attempts == 2
+
+    # FAILED messages are no longer claimed
+    await processor.process_pending(db_session, 50)
+    await db_session.refresh(failing)
+    assert failing.processing_attempts == 2
+
+
+class BrokenUntilFixed(MessageProcessor):
+    """Fails one message while `broken` is set"""
+
+    def __init__(self, failing_id, **kwargs):
+        super().__init__(**kwargs)
+        self.failing_id = failing_id
+        self.broken = True
+
+    async def transform(self, fields):
+        if self.broken and fields.message_id == self.failing_id:
+            raise RuntimeError("dependency unavailable")
+
+
+@pytest.mark.asyncio
+async def test_failure_costs_one_attempt_per_pass(async_client, db_session):
+    # The oldest message, so it heads every claim
+    flaky = await post_and_get_message(async_client, db_session)
+    others = [await post_and_get_message(async_client, db_session) for _ in range(4)]
+    processor = BrokenUntilFixed(flaky.message_id, max_attempts=2)
+
+    # Several batches, so the pass claims again after the failure
+    await run_processor_stage(db_session, processor, batch_size=2)
+    await db_session.refresh(flaky)
+    assert flaky.status == MessageStatus.UNPROCESSED
+    assert flaky.processing_attempts == 1
+    for message in others:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.READY_FOR_AGENT
+
+    processor.broken = False
+    await run_processor_stage(db_session, processor, batch_size=2)
+    await db_session.refresh(flaky)
+    assert flaky.status == MessageStatus.READY_FOR_AGENT
@@ -2,11 +2,14 @@ import uuid
 
 import pytest
 from fastapi import status
+from sqlalchemy import event
 from sqlalchemy.future import select
 
-from app.models import Chat, User
+from app.models import Chat, ChatRoster, Message, User
 from app.models.chat import ChatType
 from app.models.message import MessageStatus
+from app.services.recent_message_ids import recent_message_ids
+from app.services.roster_cache import roster_cache
 from tests.integration.integration_utils import post_message_with_data
 
 
@@ -103,10 +106,43 @@ class TestMessageRoutes:
         response, _ = await post_message_with_data(async_client, message_id=msg_id)
         assert response.status_code == status.HTTP_201_CREATED
 
-        # Duplicate fails
-        response, _ = await post_message_with_data(async_client, message_id=msg_id)
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert "Database error" in response.json()["detail"]
+        # Redelivery returns the stored message
+        first = response.json()
+        response, _ = await post_message_with_data(
+            async_client, message_id=msg_id, text="Retried payload"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == first
+
+    @pytest.mark.asyncio
+    async def test_redelivery_after_filter_forgets_id(self, async_client):
+        """Test a duplicate the recent-id filter missed is caught by the insert"""
+        response, data = await post_message_with_data(async_client)
+        assert response.status_code == status.HTTP_201_CREATED
+        recent_message_ids.clear()
+
+        response, _ = await post_message_with_data(
+            async_client, message_id=data["message_id"], text="Retried payload"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["text_content"] == data["text_content"]
+
+    @pytest.mark.asyncio
+    async def test_redelivery_does_no_writes(self, async_client, db_session):
+        """Test a recently seen message_id is answered with a single SELECT"""
+        response, data = await post_message_with_data(async_client)
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response, statements = await self._post_and_record_statements(
+            async_client,
+            db_session,
+            message_id=data["message_id"],
+            chat_id=data["chat_id"],
+            members=data["chat_members_struct"],
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert len(statements) == 1, statements
+        assert statements[0].lstrip().upper().startswith("SELECT")
 
     @pytest.mark.asyncio
     async def test_message_with_minimal_data(self, async_client):
@@ -275,3 +311,120 @@ class TestMessageRoutes:
         # Verify user name was updated in database
         await self._verify_users_created(db_session, updated_members)
         await self._verify_users_created(db_session, updated_members)
+
+    @staticmethod
+    async def _post_and_record_statements(async_client, db_session, **kwargs):
+        """Post a message and return the response with the SQL it executed"""
+        statements = []
+
+        def record_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", record_statement)
+        try:
+            response, _ = await post_message_with_data(async_client, **kwargs)
+        finally:
+            event.remove(engine, "before_cursor_execute", record_statement)
+        return response, statements
+
+    def _members(self, *names):
+        return [
+            {
+                "user_id": self.unique_id(f"user_{name.lower()}"),
+                "name": name,
+                "is_sender": index == 0,
+            }
+            for index, name in enumerate(names)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_create_message_statement_count(self, async_client, db_session):
+        """Test a message costs one statement per table and no follow-up reads"""
+        chat_id = self.unique_id("count_chat")
+        members = self._members("Alice", "Bob")
+        await post_message_with_data(async_client, chat_id=chat_id, members=members)
+        roster_cache.invalidate(chat_id)
+
+        response, statements = await self._post_and_record_statements(
+            async_client, db_session, chat_id=chat_id, members=members
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        # users, chats, chat_users and chat_rosters upserts plus the message
+        # INSERT ... RETURNING
+        assert len(statements) == 5, statements
+        assert not any(s.lstrip().upper().startswith("SELECT") for s in statements)
+
+    @pytest.mark.asyncio
+    async def test_cached_roster_skips_reconciliation(self, async_client, db_session):
+        """Test a repeated roster only costs the message INSERT"""
+        chat_id = self.unique_id("cached_chat")
+        members = self._members("Alice", "Bob", "Charlie")
+        await post_message_with_data(async_client, chat_id=chat_id, members=members)
+        hits = roster_cache.hits
+
+        response, statements = await self._post_and_record_statements(
+            async_client, db_session, chat_id=chat_id, members=members
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert roster_cache.hits == hits + 1
+        assert len(statements) == 1, statements
+        assert statements[0].lstrip().upper().startswith("INSERT INTO MESSAGES")
+
+    @pytest.mark.asyncio
+    async def test_roster_change_invalidates_cache(self, async_client, db_session):
+        """Test added and renamed members are reconciled despite the cache"""
+        chat_id = self.unique_id("changing_chat")
+        members = self._members("Alice", "Bob")
+        await post_message_with_data(async_client, chat_id=chat_id, members=members)
+
+        # New member joins
+        members.append(
+            {"user_id": self.unique_id("user_dana"), "name": "Dana", "is_sender": False}
+        )
+        response, statements = await self._post_and_record_statements(
+            async_client, db_session, chat_id=chat_id, members=members
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(statements) == 5, statements
+        await self._verify_chat_created(db_session, chat_id, expected_user_count=3)
+
+        # Existing member renamed
+        members[1] = {**members[1], "name": "Robert"}
+        response, statements = await self._post_and_record_statements(
+            async_client, db_session, chat_id=chat_id, members=members
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(statements) == 5, statements
+        await self._verify_users_created(db_session, members)
+
+    @pytest.mark.asyncio
+    async def test_messages_share_stored_roster(self, async_client, db_session):
+        """Test a member list is stored once and returned in the same shape"""
+        chat_id = self.unique_id("roster_chat")
+        members = self._members("Alice", "Bob", "Charlie")
+        first, data = await post_message_with_data(
+            async_client, chat_id=chat_id, members=members
+        )
+        second, _ = await post_message_with_data(
+            async_client, chat_id=chat_id, members=members
+        )
+        assert first.json()["chat_members_struct"] == members
+        assert second.json()["chat_members_struct"] == members
+
+        result = await db_session.execute(
+            select(Message.roster_hash).where(Message.chat_id == chat_id)
+        )
+        hashes = set(result.scalars())
+        assert len(hashes) == 1
+        roster = await db_session.get(ChatRoster, hashes.pop())
+        assert roster.members == members
+
+        # Redelivery reads the member list back from chat_rosters
+        response, _ = await post_message_with_data(
+            async_client, message_id=data["message_id"], chat_id=chat_id
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == first.json()
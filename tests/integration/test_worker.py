@@ -1,9 +1,18 @@
 import asyncio
+import uuid
+from collections import Counter
 
 import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from app.core.config import settings
 from app.models.message import MessageStatus
-from app.worker import worker_loop
+from app.services.agent_service import AgentService, chat_lock_key
+from app.services.debounce_scheduler import DebounceScheduler
+from app.services.message_processor import MessageProcessor, processor_from_settings
+from app.worker import run_agent_stage, run_processor_stage, worker_loop
 from tests.integration.integration_utils import (
     post_and_get_message,
 )
@@ -52,3 +61,318 @@ async def test_staggered_batch_agent_processing(async_client, db_session):
     for m in (msg1, msg2, msg3):
         await db_session.refresh(m)
         assert m.status == MessageStatus.PROCESSED
+
+
+@pytest.mark.asyncio
+async def test_concurrent_workers_process_each_message_once(
+    async_client, db_session, monkeypatch
+):
+    messages = [await post_and_get_message(async_client, db_session) for _ in range(12)]
+    message_ids = {m.message_id for m in messages}
+    claims = Counter()
+
+    def recording(stage, claim_batch):
+        async def claim_and_record(self, db, *args, **kwargs):
+            claimed = await claim_batch(self, db, *args, **kwargs)
+            for claim in claimed:
+                message_id = getattr(claim, "message_id", claim)
+                if message_id in message_ids:
+                    claims[stage, message_id] += 1
+            return claimed
+
+        return claim_and_record
+
+    monkeypatch.setattr(
+        MessageProcessor,
+        "claim_batch",
+        recording("processor", MessageProcessor.claim_batch),
+    )
+    monkeypatch.setattr(
+        AgentService, "claim_batch", recording("agent", AgentService.claim_batch)
+    )
+    monkeypatch.setattr(settings, "WORKER_CLAIM_BATCH_SIZE", 3)
+    SessionLocal = async_sessionmaker(db_session.bind, expire_on_commit=False)
+
+    async def run_worker():
+        async with SessionLocal() as db:
+            await worker_loop(test_database_session=db, override_debounce_seconds=1)
+
+    await asyncio.sleep(1.1)
+    await asyncio.gather(*(run_worker() for _ in range(4)))
+    # Messages that became ready after every agent stage ran
+    await run_worker()
+
+    for message_id in message_ids:
+        assert claims["processor", message_id] == 1
+        assert claims["agent", message_id] == 1
+    for message in messages:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_delay_quiet_chat(async_client, db_session):
+    quiet = await post_and_get_message(async_client, db_session)
+    await asyncio.sleep(3.1)
+    busy = await post_and_get_message(async_client, db_session)
+
+    await worker_loop(test_database_session=db_session, override_debounce_seconds=3)
+
+    await db_session.refresh(quiet)
+    await db_session.refresh(busy)
+    assert quiet.status == MessageStatus.PROCESSED
+    assert busy.status == MessageStatus.READY_FOR_AGENT
+
+
+@pytest.mark.asyncio
+async def test_worker_processor_uses_configured_pool(
+    async_client, db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "PROCESSOR_POOL_WORKERS", 2)
+    monkeypatch.setattr(settings, "PROCESSOR_POOL_CHUNKSIZE", 1)
+    message = await post_and_get_message(async_client, db_session)
+
+    # As built by worker_loop outside of tests
+    processor = processor_from_settings()
+    try:
+        assert processor.uses_pool
+        await run_processor_stage(db_session, processor, batch_size=50)
+        assert processor._pool is not None
+    finally:
+        processor.shutdown()
+
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+
+
+@pytest.mark.parametrize(
+    "texts, batch_size, token_budget, expected",
+    [
+        # Capped by message count
+        (["Test message"] * 5, 2, 8000, [2, 2, 1, 0]),
+        # Capped by estimated tokens: 40 characters is 10 tokens
+        (["x" * 40] * 5, 10, 25, [2, 2, 1, 0]),
+        # A message over the budget on its own still goes through alone
+        (["x" * 400, "x" * 40], 10, 25, [1, 1, 0]),
+    ],
+)
+@pytest.mark.asyncio
+async def test_agent_drains_chat_in_bounded_batches(
+    async_client, db_session, texts, batch_size, token_budget, expected
+):
+    chat_id = f"bounded-batches-chat-{uuid.uuid4()}"
+    messages = []
+    for text_content in texts:
+        messages.append(
+            await post_and_get_message(
+                async_client, db_session, chat_id=chat_id, text=text_content
+            )
+        )
+        # Distinct time_received keeps the claim order deterministic
+        await asyncio.sleep(0.01)
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+
+    agent = AgentService(
+        test_processing_time=0, batch_size=batch_size, token_budget=token_budget
+    )
+    claimed = []
+    process_batch = agent.process_batch
+
+    async def recording(db, **kwargs):
+        count = await process_batch(db, **kwargs)
+        if kwargs.get("chat_id") == chat_id:
+            claimed.append(count)
+        return count
+
+    agent.process_batch = recording
+    await run_agent_stage(db_session, agent, scheduler)
+
+    assert claimed == expected
+    for message in messages:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+
+
+def contended_lock_attempts():
+    return (
+        REGISTRY.get_sample_value(
+            "agent_chat_lock_attempts_total", {"result": "contended"}
+        )
+        or 0
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_skips_chat_locked_by_another_worker(async_client, db_session):
+    chat_id = f"chat-{uuid.uuid4()}"
+    message = await post_and_get_message(async_client, db_session, chat_id=chat_id)
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+    agent = AgentService(test_processing_time=0)
+    before = contended_lock_attempts()
+
+    # Another worker host owns the chat
+    key = {"key": chat_lock_key(chat_id)}
+    async with db_session.bind.connect() as other_worker:
+        await other_worker.execute(text("SELECT pg_advisory_lock(:key)"), key)
+        try:
+            await run_agent_stage(db_session, agent, scheduler)
+            await db_session.refresh(message)
+            assert message.status == MessageStatus.READY_FOR_AGENT
+            assert contended_lock_attempts() == before + 1
+            assert chat_id in scheduler
+        finally:
+            await other_worker.execute(text("SELECT pg_advisory_unlock(:key)"), key)
+
+    assert await agent.process_chat(db_session, chat_id) == 1
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.PROCESSED
+
+
+class OverlapAgent(AgentService):
+    """Records how many agent batches run at once"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def run_agent(self, chat_id, batch, context=()):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().run_agent(chat_id, batch, context)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_agent_stage_runs_chats_concurrently(async_client, db_session):
+    # Distinct texts, so the batches are not coalesced by the result cache
+    messages = [
+        await post_and_get_message(async_client, db_session, text=str(uuid.uuid4()))
+        for _ in range(6)
+    ]
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+    agent = OverlapAgent(test_processing_time=0.3)
+
+    await run_agent_stage(db_session, agent, scheduler, concurrency=3)
+
+    assert agent.peak == 3
+    for message in messages:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+
+
+@pytest.mark.parametrize(
+    "pool_size, max_overflow, expected_peak",
+    [
+        # Exactly enough for the 8 chats
+        (17, 0, 8),
+        # One connection for the stage, two per chat: 2 chats at once
+        (5, 0, 2),
+    ],
+)
+@pytest.mark.asyncio
+async def test_agent_stage_concurrency_is_capped_by_pool(
+    async_client, db_session, pool_size, max_overflow, expected_peak
+):
+    messages = [
+        await post_and_get_message(async_client, db_session, text=str(uuid.uuid4()))
+        for _ in range(8)
+    ]
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+    engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=10,
+    )
+    agent = OverlapAgent(test_processing_time=0.3)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            await run_agent_stage(db, agent, scheduler, concurrency=8)
+    finally:
+        await engine.dispose()
+
+    assert agent.peak == expected_peak
+    for message in messages:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+
+
+@pytest.mark.asyncio
+async def test_agent_stage_runs_with_concurrency_above_pool_size(
+    async_client, db_session
+):
+    messages = [
+        await post_and_get_message(async_client, db_session, text=str(uuid.uuid4()))
+        for _ in range(6)
+    ]
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+    # One connection for the stage's session and one for a chat; a chat that
+    # needed a second connection while holding its lock would time out
+    engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL, pool_size=2, max_overflow=0, pool_timeout=10
+    )
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            await run_agent_stage(
+                db, AgentService(test_processing_time=0), scheduler, concurrency=8
+            )
+    finally:
+        await engine.dispose()
+
+    for message in messages:
+        await db_session.refresh(message)
+        assert message.status == MessageStatus.PROCESSED
+
+
+@pytest.mark.asyncio
+async def test_timed_out_agent_batch_is_released(async_client, db_session):
+    message = await post_and_get_message(
+        async_client, db_session, text=str(uuid.uuid4())
+    )
+    await run_processor_stage(db_session, MessageProcessor(test_processing_time=0), 50)
+    agent = AgentService(test_processing_time=5, timeout_seconds=0.2)
+    before = REGISTRY.get_sample_value("agent_batch_timeouts_total") or 0
+
+    assert await agent.process_chat(db_session, message.chat_id) is None
+
+    assert REGISTRY.get_sample_value("agent_batch_timeouts_total") == before + 1
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+    assert message.lease_owner is None
+
+
+@pytest.mark.asyncio
+async def test_agent_stage_reschedules_timed_out_chat(async_client, db_session):
+    message = await post_and_get_message(
+        async_client, db_session, text=str(uuid.uuid4())
+    )
+    scheduler = DebounceScheduler(debounce_seconds=0)
+    await run_processor_stage(
+        db_session, MessageProcessor(test_processing_time=0), 50, scheduler
+    )
+    agent = AgentService(test_processing_time=5, timeout_seconds=0.2)
+
+    await run_agent_stage(db_session, agent, scheduler)
+
+    await db_session.refresh(message)
+    assert message.status == MessageStatus.READY_FOR_AGENT
+    # Without waiting for a schedule rebuild or a new message
+    assert message.chat_id in scheduler.due()
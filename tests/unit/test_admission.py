@@ -0,0 +1,88 @@
+from app.services.admission import AdmissionController, TokenBucket
+from tests.unit.unit_utils import FakeClock
+
+
+def make_controller(clock, **overrides):
+    options = dict(
+        enabled=True,
+        chat_rate=1.0,
+        chat_burst=2,
+        max_chats=2,
+        max_lag_seconds=60,
+        max_pool_wait_ms=500,
+        sample_interval_seconds=1,
+        retry_after_seconds=5,
+        clock=clock,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, capacity=2, now=0.0)
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == 0.5
+
+    assert bucket.take(0.5) == 0.0
+    assert bucket.take(0.5) == 0.5
+
+
+def test_chat_bucket_rejects_with_retry_after():
+    clock = FakeClock()
+    controller = make_controller(clock)
+    assert controller.admit_chat("a") is None
+    assert controller.admit_chat("a") is None
+
+    rejection = controller.admit_chat("a")
+    assert rejection.status_code == 429
+    assert rejection.retry_after == 1
+    assert controller.admit_chat("b") is None
+
+    clock.now = 1.0
+    assert controller.admit_chat("a") is None
+
+
+def test_least_recently_used_bucket_is_forgotten():
+    controller = make_controller(FakeClock())
+    controller.admit_chat("a")
+    controller.admit_chat("a")
+    controller.admit_chat("b")
+    controller.admit_chat("c")
+
+    # "a" was evicted and starts again with a full bucket
+    assert controller.admit_chat("a") is None
+
+
+def test_pipeline_lag_and_pool_wait_trigger_503():
+    clock = FakeClock()
+    controller = make_controller(clock)
+    assert controller.check_pipeline() is None
+
+    controller.sampled_at = 0.0
+    controller.lag_seconds = 120
+    rejection = controller.check_pipeline()
+    assert (rejection.status_code, rejection.reason) == (503, "pipeline_lag")
+    assert rejection.retry_after == 5
+
+    controller.lag_seconds = 0
+    controller.pool_wait_seconds = 0.6
+    assert controller.check_pipeline().reason == "pool_wait"
+
+
+def test_stale_lag_sample_fails_open():
+    clock = FakeClock()
+    controller = make_controller(clock)
+    controller.sampled_at = 0.0
+    controller.lag_seconds = 120
+
+    clock.now = 10.0
+    assert controller.check_pipeline() is None
+
+
+def test_disabled_controller_admits_everything():
+    controller = make_controller(FakeClock(), enabled=False, chat_burst=0)
+    controller.sampled_at = 0.0
+    controller.lag_seconds = 120
+    assert controller.admit_chat("a") is None
+    assert controller.check_pipeline() is None
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from app.services.agent_log_partitions import (
+    AgentLogPartitions,
+    Partition,
+    parse_partition,
+    partition_name,
+    period_end,
+    plan_partitions,
+)
+
+
+def partition(start: date, end: date) -> Partition:
+    return Partition(partition_name(start, end), start, end)
+
+
+def test_period_end():
+    # 2024-01-03 is a Wednesday
+    assert period_end(date(2024, 1, 3), "day") == date(2024, 1, 4)
+    assert period_end(date(2024, 1, 3), "week") == date(2024, 1, 8)
+    assert period_end(date(2024, 1, 8), "week") == date(2024, 1, 15)
+    assert period_end(date(2023, 12, 31), "day") == date(2024, 1, 1)
+
+
+def test_names_round_trip():
+    name = partition_name(date(2024, 1, 8), date(2024, 1, 15))
+    assert name == "agent_logs_20240108_20240115"
+    assert parse_partition(name) == partition(date(2024, 1, 8), date(2024, 1, 15))
+    assert parse_partition("agent_logs_default") is None
+
+
+def test_plans_daily_partitions_through_the_horizon():
+    planned = plan_partitions([], date(2024, 1, 30), 3, "day")
+    assert [p.name for p in planned] == [
+        "agent_logs_20240130_20240131",
+        "agent_logs_20240131_20240201",
+        "agent_logs_20240201_20240202",
+        "agent_logs_20240202_20240203",
+    ]
+
+
+def test_plans_around_existing_partitions():
+    existing = [
+        partition(date(2024, 1, 3), date(2024, 1, 4)),
+        partition(date(2024, 1, 9), date(2024, 1, 10)),
+    ]
+    # Switching to weekly after daily partitions were made: the first week is
+    # cut short by the old partitions instead of overlapping them
+    planned = plan_partitions(existing, date(2024, 1, 3), 10, "week")
+    assert [(p.start, p.end) for p in planned] == [
+        (date(2024, 1, 4), date(2024, 1, 8)),
+        (date(2024, 1, 8), date(2024, 1, 9)),
+        (date(2024, 1, 10), date(2024, 1, 15)),
+    ]
+    assert plan_partitions(existing + planned, date(2024, 1, 3), 10, "week") == []
+
+
+def test_rejects_unknown_interval():
+    with pytest.raises(ValueError):
+        AgentLogPartitions(
+            interval="month", ahead_days=7, retention_days=30, check_seconds=60
+        )
@@ -0,0 +1,133 @@
+import asyncio
+import random
+
+import pytest
+
+from app.models.agent_log import AgentLogLevel, AgentLogType
+from app.services.agent_log_writer import AgentLogWriter
+
+
+class RecordingSession:
+    """Session stand-in that records the rows of each flush"""
+
+    flushed: list = []
+    gate: asyncio.Event = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        if RecordingSession.gate is not None:
+            await RecordingSession.gate.wait()
+        RecordingSession.flushed.append([row["message"] for row in rows])
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def flushed():
+    RecordingSession.flushed = []
+    RecordingSession.gate = None
+    return RecordingSession.flushed
+
+
+def writer(**kwargs) -> AgentLogWriter:
+    kwargs.setdefault("max_batch", 100)
+    kwargs.setdefault("max_delay_ms", 10)
+    kwargs.setdefault("max_queue", 1000)
+    kwargs.setdefault("full_policy", "drop_debug")
+    kwargs.setdefault("copy_min_rows", 10**6)
+    return AgentLogWriter(session_factory=RecordingSession, **kwargs)
+
+
+async def log(logs: AgentLogWriter, message: str, level=AgentLogLevel.INFO):
+    return await logs.log("session", AgentLogType.THOUGHT, message, level=level)
+
+
+async def test_flushes_by_size_and_time_and_drains_on_shutdown(flushed):
+    logs = writer(max_batch=3, max_delay_ms=50)
+    await logs.start()
+
+    for i in range(4):
+        await log(logs, f"step {i}")
+    await asyncio.sleep(0.01)
+    assert flushed == [["step 0", "step 1", "step 2"]]
+
+    await asyncio.sleep(0.1)
+    assert flushed[-1] == ["step 3"]
+
+    await log(logs, "last")
+    await logs.shutdown()
+    assert flushed[-1] == ["last"]
+    assert not await log(logs, "after shutdown")
+
+
+async def test_drop_debug_policy_sheds_debug_entries_first(flushed):
+    logs = writer(max_queue=3)
+    await logs.start()
+    RecordingSession.gate = asyncio.Event()
+    await log(logs, "held in flush")
+    await asyncio.sleep(0.05)
+
+    await log(logs, "debug 1", AgentLogLevel.DEBUG)
+    await log(logs, "info 1")
+    await log(logs, "debug 2", AgentLogLevel.DEBUG)
+    assert await log(logs, "error", AgentLogLevel.ERROR)
+    assert not await log(logs, "debug 3", AgentLogLevel.DEBUG)
+    assert await log(logs, "info 2")
+    assert not await log(logs, "info 3")
+
+    RecordingSession.gate.set()
+    await logs.shutdown()
+    assert flushed[1] == ["info 1", "error", "info 2"]
+
+
+async def test_block_policy_waits_for_the_next_flush(flushed):
+    logs = writer(max_queue=2, full_policy="block")
+    await logs.start()
+    RecordingSession.gate = asyncio.Event()
+    await log(logs, "held in flush")
+    await asyncio.sleep(0.05)
+    await log(logs, "a")
+    await log(logs, "b")
+
+    blocked = asyncio.create_task(log(logs, "c"))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    RecordingSession.gate.set()
+    assert await blocked
+    await logs.shutdown()
+    assert [message for batch in flushed for message in batch] == [
+        "held in flush",
+        "a",
+        "b",
+        "c",
+    ]
+
+
+async def test_sample_policy_keeps_a_sample_of_the_overflow(flushed):
+    logs = writer(max_queue=10, full_policy="sample", rng=random.Random(1))
+    await logs.start()
+    RecordingSession.gate = asyncio.Event()
+    await log(logs, "held in flush")
+    await asyncio.sleep(0.05)
+
+    for i in range(1000):
+        await log(logs, f"step {i}")
+    assert len(logs) == 10
+
+    RecordingSession.gate.set()
+    await logs.shutdown()
+    kept = [int(message.split()[1]) for message in flushed[1]]
+    # Mostly entries from after the queue filled, not just its first ten
+    assert sum(step >= 10 for step in kept) >= 8
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        writer(full_policy="drop_everything")
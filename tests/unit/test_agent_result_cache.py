@@ -0,0 +1,142 @@
+import asyncio
+
+from app.services.agent_result_cache import AgentResultCache, batch_cache_key
+from app.services.agent_service import message_line
+from tests.unit.unit_utils import FakeClock
+
+
+class EmptyDatabase:
+    """Session stand-in whose agent_results table has no rows"""
+
+    def __init__(self):
+        self.writes = 0
+
+    async def execute(self, statement):
+        if statement.is_insert:
+            self.writes += 1
+        return self
+
+    def first(self):
+        return None
+
+
+class PruneDatabase:
+    """Session stand-in that counts prune deletes against a row estimate"""
+
+    def __init__(self, estimate):
+        self.estimate = estimate
+        self.deletes = 0
+        self.rowcount = 0
+
+    async def execute(self, statement):
+        self.deletes += 1
+        return self
+
+    async def scalar(self, statement, params):
+        return self.estimate
+
+    async def commit(self):
+        pass
+
+
+def test_key_ignores_case_spacing_and_unicode_forms():
+    assert batch_cache_key(["Meeting at  5pm\n"]) == batch_cache_key(
+        ["meeting at 5ｐｍ"]
+    )
+    assert batch_cache_key(["a", "b"]) != batch_cache_key(["b", "a"])
+    assert batch_cache_key(["a"], prompt_version="v1") != batch_cache_key(
+        ["a"], prompt_version="v2"
+    )
+
+
+def test_key_includes_senders():
+    assert batch_cache_key([message_line("Ana", "I'll buy milk")]) != (
+        batch_cache_key([message_line("Ben", "I'll buy milk")])
+    )
+
+
+def test_key_covers_context():
+    question = [message_line("Ana", "who buys milk?")]
+
+    assert batch_cache_key(["ok"], context=question) == batch_cache_key(
+        ["ok"], context=[message_line("ana", "Who buys  milk?")]
+    )
+    assert batch_cache_key(["ok"], context=question) != batch_cache_key(["ok"])
+    assert batch_cache_key(["ok"], context=question) != batch_cache_key(
+        ["ok"], context=[message_line("Ben", "who buys milk?")]
+    )
+    # Moving a line between context and batch changes what the agent is shown
+    assert batch_cache_key(["b"], context=["a"]) != batch_cache_key(["a", "b"])
+
+
+async def test_prune_runs_on_its_own_interval_and_skips_overflow_under_cap():
+    clock = FakeClock(1000.0)
+    cache = AgentResultCache(max_rows=100, prune_seconds=3600, clock=clock)
+    db = PruneDatabase(estimate=10)
+
+    await cache.maybe_prune(db)
+    # Expired rows only; the estimate is under max_rows
+    assert db.deletes == 1
+    clock.now += 60
+    await cache.maybe_prune(db)
+    assert db.deletes == 1
+
+    clock.now += 3600
+    db.estimate = 150
+    await cache.maybe_prune(db)
+    assert db.deletes == 3
+
+
+def test_lru_and_age_eviction():
+    clock = FakeClock(1000.0)
+    cache = AgentResultCache(max_entries=2, max_age_seconds=60, clock=clock)
+    cache.put("a", {"tasks": []}, 1.0)
+    cache.put("b", {"tasks": []}, 1.0)
+    cache.get("a")
+    cache.put("c", {"tasks": []}, 1.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    clock.now += 60
+    assert cache.get("a") is None
+
+
+async def test_identical_batches_in_flight_share_one_computation():
+    cache = AgentResultCache()
+    db = EmptyDatabase()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"tasks": [{"task_name": "buy milk"}]}
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute(db, "key", compute) for _ in range(5))
+    )
+
+    assert calls == 1
+    assert db.writes == 1
+    assert all(result == results[0] for result in results)
+    # Later lookups come from memory
+    assert await cache.get_or_compute(db, "key", compute) == results[0]
+    assert calls == 1
+
+
+async def test_failed_computation_is_not_cached():
+    cache = AgentResultCache()
+    db = EmptyDatabase()
+
+    async def fail():
+        raise RuntimeError("model unavailable")
+
+    async def succeed():
+        return {"tasks": []}
+
+    for _ in range(2):
+        try:
+            await cache.get_or_compute(db, "key", fail)
+        except RuntimeError:
+            pass
+    assert await cache.get_or_compute(db, "key", succeed) == {"tasks": []}
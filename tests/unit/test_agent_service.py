@@ -0,0 +1,77 @@
+import pytest
+
+from app.services.agent_service import (
+    AgentService,
+    chat_lock_key,
+    parse_agent_reply,
+)
+
+
+def test_chat_lock_key_is_stable_signed_bigint():
+    key = chat_lock_key("chat-1")
+
+    assert key == chat_lock_key("chat-1")
+    assert key != chat_lock_key("chat-2")
+    assert -(2**63) <= key < 2**63
+
+
+def test_parse_agent_reply_keeps_valid_tasks_and_indexes():
+    outcome = parse_agent_reply(
+        'Sure:\n{"tasks": [{"task_name": "Buy milk", "task_or_event": "TASK",'
+        ' "task_type": "unknown", "message_indexes": [0, 5, "1"]}]}',
+        batch_size=2,
+    )
+
+    assert outcome["tasks"] == [
+        {
+            "task_name": "Buy milk",
+            "task_or_event": "TASK",
+            "task_context": None,
+            "task_type": None,
+            "message_indexes": [0],
+        }
+    ]
+
+
+def test_parse_agent_reply_drops_optional_fields_of_wrong_type():
+    outcome = parse_agent_reply(
+        '{"tasks": [{"task_name": "Buy milk", "task_or_event": "TASK",'
+        ' "task_context": {"store": "corner"}, "task_type": ["ERRAND"],'
+        ' "message_indexes": {"0": true}}, {"task_name": "Call mum",'
+        ' "task_or_event": "EVENT", "task_context": 5,'
+        ' "message_indexes": [true, 0]}]}',
+        batch_size=1,
+    )
+
+    assert [task["task_context"] for task in outcome["tasks"]] == [None, None]
+    assert [task["task_type"] for task in outcome["tasks"]] == [None, None]
+    assert [task["message_indexes"] for task in outcome["tasks"]] == [[], [0]]
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        "no json",
+        '{"tasks": "none"}',
+        '{"tasks": [{"task_name": "x"}]}',
+        '{"tasks": ["Buy milk"]}',
+        '{"tasks": [{"task_name": {"a": 1}, "task_or_event": "TASK"}]}',
+        '{"tasks": [{"task_name": "x", "task_or_event": ["TASK"]}]}',
+    ],
+)
+def test_parse_agent_reply_rejects_unusable_replies(reply):
+    with pytest.raises(ValueError):
+        parse_agent_reply(reply, batch_size=1)
+
+
+class UnreachableModel:
+    """Model backend that fails the test if the agent calls it"""
+
+    async def complete(self, chat_id, messages):
+        raise AssertionError("test mode must not call the model")
+
+
+async def test_test_mode_skips_the_model_backend():
+    agent = AgentService(test_processing_time=0, model=UnreachableModel())
+
+    assert await agent.run_agent("chat-1", [object()]) == {"tasks": []}
@@ -0,0 +1,37 @@
+from app.services.batch_sizer import AdaptiveBatchSizer
+
+
+def test_slow_batches_halve_the_cap():
+    sizer = AdaptiveBatchSizer(max_size=100, target_seconds=10)
+
+    sizer.record(100, 30)
+    assert sizer.size == 50
+    sizer.record(50, 30)
+    assert sizer.size == 25
+
+
+def test_full_fast_batches_grow_back_to_max():
+    sizer = AdaptiveBatchSizer(max_size=100, target_seconds=10, step=20)
+    sizer.record(100, 30)
+    assert sizer.size == 50
+
+    sizer.record(50, 1)
+    assert sizer.size == 70
+    sizer.record(70, 1)
+    sizer.record(90, 1)
+    assert sizer.size == 100
+
+
+def test_small_batches_do_not_grow_the_cap():
+    sizer = AdaptiveBatchSizer(max_size=100, target_seconds=10)
+    sizer.record(100, 30)
+
+    sizer.record(3, 1)
+    assert sizer.size == 50
+
+
+def test_cap_never_drops_below_min_size():
+    sizer = AdaptiveBatchSizer(max_size=4, target_seconds=1, min_size=2)
+    for _ in range(5):
+        sizer.record(4, 5)
+    assert sizer.size == 2
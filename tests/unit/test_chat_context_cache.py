@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+
+from app.services.chat_context_cache import (
+    MESSAGE_OVERHEAD_BYTES,
+    ChatContextCache,
+    ContextMessage,
+    chat_context,
+)
+from tests.unit.unit_utils import FakeClock
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class MessagesDatabase:
+    """Session stand-in whose queries return a chat's messages, newest first"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        params = statement.compile().params
+        before = next(
+            (value for value in params.values() if isinstance(value, datetime)), None
+        )
+        limit = statement._limit
+        rows = [m for m in self.messages if before is None or m.time_received < before]
+        self.rows = [
+            Row(m.message_id, m.sender_name, m.text, m.time_received, m.replied_to)
+            for m in reversed(rows[-limit:])
+        ]
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class Row:
+    def __init__(self, message_id, sender_name, text_content, time_received, reply):
+        self.message_id = message_id
+        self.sender_name = sender_name
+        self.text_content = text_content
+        self.time_received = time_received
+        self.replied_to_fk = reply
+
+
+def message(i: int, text: str = "hi") -> ContextMessage:
+    return ContextMessage(f"m{i}", "Alex", text, START + timedelta(seconds=i), None)
+
+
+def cache(**kwargs) -> ChatContextCache:
+    kwargs.setdefault("messages_per_chat", 5)
+    kwargs.setdefault("max_bytes", 10**6)
+    kwargs.setdefault("ttl_seconds", 60)
+    return ChatContextCache(**kwargs)
+
+
+def ids(messages):
+    return [m.message_id for m in messages]
+
+
+def test_recent_only_answers_what_the_window_covers():
+    contexts = cache()
+    contexts.store("chat", [message(i) for i in range(3)], complete=True)
+    contexts.store("busy", [message(i) for i in range(5, 10)], complete=False)
+
+    assert ids(contexts.recent("chat", message(2).time_received, 5)) == ["m0", "m1"]
+    assert ids(contexts.recent("busy", message(9).time_received, 2)) == ["m7", "m8"]
+    # The busy chat has older messages than its window holds
+    assert contexts.recent("busy", message(9).time_received, 5) is None
+    assert contexts.recent("unknown", START, 5) is None
+
+
+def test_append_keeps_newest_in_time_order_and_skips_uncached_chats():
+    contexts = cache(messages_per_chat=3)
+    contexts.store("chat", [message(0), message(2)], complete=True)
+
+    contexts.append("chat", [message(3), message(1), message(2)])
+    contexts.append("other", [message(4)])
+
+    assert ids(contexts.recent("chat", message(9).time_received, 3)) == [
+        "m1",
+        "m2",
+        "m3",
+    ]
+    # m0 fell out of the ring, so the chat is no longer held whole
+    assert contexts.recent("chat", message(9).time_received, 4) is None
+    assert "other" not in contexts
+
+
+def test_evicts_least_recently_used_chats_over_the_byte_cap():
+    size = len("hi") + MESSAGE_OVERHEAD_BYTES
+    contexts = cache(max_bytes=4 * size)
+    contexts.store("a", [message(0), message(1)], complete=True)
+    contexts.store("b", [message(0), message(1)], complete=True)
+    contexts.recent("a", START, 0)
+
+    contexts.append("a", [message(2)])
+
+    assert "a" in contexts and "b" not in contexts
+    assert contexts.size == 3 * size
+
+
+def test_windows_expire():
+    clock = FakeClock(1000.0)
+    contexts = cache(clock=clock)
+    contexts.store("chat", [message(0)], complete=True)
+
+    clock.now += 60
+
+    assert contexts.recent("chat", START, 1) is None
+    assert len(contexts) == 0 and contexts.size == 0
+
+
+async def test_chat_context_fills_window_then_serves_from_memory():
+    db = MessagesDatabase([message(i) for i in range(8)])
+    contexts = cache()
+
+    first = await chat_context(db, "chat", message(6).time_received, 2, contexts)
+    second = await chat_context(db, "chat", message(7).time_received, 2, contexts)
+
+    assert ids(first) == ["m4", "m5"] and ids(second) == ["m5", "m6"]
+    assert db.queries == 1
+
+    # Reaching back past the window goes to the database, uncached
+    older = await chat_context(db, "chat", message(4).time_received, 3, contexts)
+    assert ids(older) == ["m1", "m2", "m3"]
+    assert db.queries == 2
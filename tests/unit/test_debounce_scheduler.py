@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+from app.services.debounce_scheduler import DebounceScheduler
+from tests.unit.unit_utils import FakeClock
+
+
+def at(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def test_chats_fire_independently():
+    clock = FakeClock(1000.0)
+    scheduler = DebounceScheduler(debounce_seconds=60, clock=clock)
+    scheduler.touch("quiet", at(1000))
+    scheduler.touch("busy", at(1000))
+
+    # The busy chat keeps receiving messages; the quiet one is not held back
+    clock.now = 1050
+    scheduler.touch("busy", at(1050))
+    clock.now = 1060
+    assert scheduler.due() == ["quiet"]
+    assert scheduler.seconds_until_next() == 50
+
+    clock.now = 1110
+    assert scheduler.due() == ["busy"]
+    assert scheduler.seconds_until_next() is None
+    assert len(scheduler) == 0
+
+
+def test_older_activity_does_not_move_deadline_earlier():
+    clock = FakeClock(1000.0)
+    scheduler = DebounceScheduler(debounce_seconds=60, clock=clock)
+    scheduler.touch("chat", at(1000))
+    scheduler.touch("chat", at(900))
+
+    clock.now = 1059
+    assert scheduler.due() == []
+    clock.now = 1060
+    assert scheduler.due() == ["chat"]
+
+
+def test_is_quiet():
+    clock = FakeClock(1000.0)
+    scheduler = DebounceScheduler(debounce_seconds=60, clock=clock)
+    assert scheduler.is_quiet(at(940))
+    assert not scheduler.is_quiet(at(941))
+
+
+def test_quiet_since():
+    clock = FakeClock(1000.0)
+    scheduler = DebounceScheduler(debounce_seconds=60, clock=clock)
+    assert scheduler.quiet_since() == at(940)
+
+
+def test_defer_reschedules_one_window_from_now():
+    clock = FakeClock(1000.0)
+    scheduler = DebounceScheduler(debounce_seconds=60, clock=clock)
+    scheduler.touch("chat", at(900))
+    assert scheduler.due() == ["chat"]
+
+    scheduler.defer("chat")
+    assert scheduler.seconds_until_next() == 60
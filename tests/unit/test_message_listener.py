@@ -0,0 +1,11 @@
+from app.services.message_listener import MessageListener
+
+
+async def test_wait_consumes_pending_wakeups():
+    listener = MessageListener("postgresql://unused")
+    assert not await listener.wait(timeout=0.01)
+
+    listener._notified(None, 1, "new_messages", "")
+    listener._notified(None, 1, "new_messages", "")
+    assert await listener.wait(timeout=0.01)
+    assert not await listener.wait(timeout=0.01)
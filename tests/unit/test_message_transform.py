@@ -0,0 +1,50 @@
+import os
+
+from app.services.message_processor import MessageProcessor
+from app.services.message_transform import MessageFields, transform_chunk
+
+
+def fail_on_boom(fields):
+    if fields.text == "boom":
+        raise ValueError("bad text")
+    return os.getpid()
+
+
+def batch(*texts):
+    return [MessageFields(f"m{i}", text, "chat") for i, text in enumerate(texts)]
+
+
+def test_transform_chunk_isolates_failures():
+    errors = transform_chunk(fail_on_boom, batch("ok", "boom", "ok"))
+
+    assert errors == [None, "ValueError: bad text", None]
+
+
+async def test_pool_keeps_results_in_batch_order():
+    processor = MessageProcessor(
+        pool_workers=2, pool_chunksize=2, transform_fn=fail_on_boom
+    )
+    try:
+        errors = await processor.run_transforms(
+            batch("ok", "ok", "boom", "ok", "ok", "boom", "ok")
+        )
+    finally:
+        processor.shutdown()
+
+    assert errors == [
+        None,
+        None,
+        "ValueError: bad text",
+        None,
+        None,
+        "ValueError: bad text",
+        None,
+    ]
+
+
+async def test_test_mode_stays_on_event_loop():
+    processor = MessageProcessor(test_processing_time=0, pool_workers=2)
+
+    assert not processor.uses_pool
+    assert await processor.run_transforms(batch("ok")) == [None]
+    assert processor._pool is None
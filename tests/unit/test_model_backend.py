@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.fake_model_server import create_app
+from app.services.model_backend import (
+    HTTPModelBackend,
+    ModelBackend,
+    ModelError,
+    ModelUsage,
+)
+
+MESSAGES = [{"role": "user", "content": "buy milk"}]
+
+
+def reply(content="{}", status=200, **headers):
+    return httpx.Response(
+        status,
+        headers=headers,
+        json={
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1},
+        },
+    )
+
+
+def backend(transport, **kwargs):
+    kwargs.setdefault("retry_base_seconds", 0)
+    return HTTPModelBackend("http://model", transport=transport, **kwargs)
+
+
+async def test_complete_and_stream_against_fake_server():
+    app = create_app(latency_ms=0, completion_tokens=20)
+    model = backend(httpx.ASGITransport(app=app))
+
+    response = await model.complete("chat-1", MESSAGES)
+    streamed = [text async for text in model.stream("chat-1", MESSAGES)]
+    await model.aclose()
+
+    assert json.loads(response.text)["tasks"] == []
+    assert len(streamed) > 1
+    assert "".join(streamed) == response.text
+    assert model.usage == ModelUsage(
+        2 * response.usage.prompt_tokens, 2 * response.usage.completion_tokens
+    )
+
+
+async def test_retries_retryable_statuses_then_succeeds():
+    statuses = [503, 429, 200]
+
+    def handler(request):
+        return reply(status=statuses.pop(0))
+
+    model = backend(httpx.MockTransport(handler), max_retries=2)
+
+    assert (await model.complete("chat-1", MESSAGES)).text == "{}"
+    assert statuses == []
+
+
+async def test_gives_up_after_max_retries_and_on_client_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return reply(status=503 if len(calls) < 10 else 400)
+
+    model = backend(httpx.MockTransport(handler), max_retries=2)
+    with pytest.raises(ModelError) as error:
+        await model.complete("chat-1", MESSAGES)
+    assert error.value.status == 503
+    assert len(calls) == 3
+
+    calls.extend([None] * 10)
+    with pytest.raises(ModelError) as error:
+        await model.complete("chat-1", MESSAGES)
+    assert error.value.status == 400
+    assert len(calls) == 14
+
+
+async def test_malformed_success_body_raises_model_error():
+    bodies = [httpx.Response(200, text="<html>oops"), httpx.Response(200, json={})]
+
+    def handler(request):
+        return bodies.pop(0)
+
+    model = backend(httpx.MockTransport(handler), max_retries=2)
+    for _ in range(2):
+        with pytest.raises(ModelError) as error:
+            await model.complete("chat-1", MESSAGES)
+        assert error.value.status == 200
+    assert bodies == []
+
+
+def test_backend_base_is_abstract():
+    with pytest.raises(TypeError):
+        ModelBackend()
+
+
+async def test_global_and_per_chat_concurrency_limits():
+    in_flight = {}
+    peaks = {"total": 0}
+
+    async def handler(request):
+        chat_id = json.loads(request.content)["messages"][0]["content"]
+        in_flight[chat_id] = in_flight.get(chat_id, 0) + 1
+        peaks[chat_id] = max(peaks.get(chat_id, 0), in_flight[chat_id])
+        peaks["total"] = max(peaks["total"], sum(in_flight.values()))
+        await asyncio.sleep(0.01)
+        in_flight[chat_id] -= 1
+        return reply()
+
+    model = backend(
+        httpx.MockTransport(handler), max_concurrency=3, per_chat_concurrency=2
+    )
+    chats = ["a", "b", "c"]
+    await asyncio.gather(
+        *(
+            model.complete(chat_id, [{"role": "user", "content": chat_id}])
+            for chat_id in chats
+            for _ in range(4)
+        )
+    )
+
+    assert peaks["total"] == 3
+    assert all(peaks[chat_id] <= 2 for chat_id in chats)
+    assert model._chat_slots == {}
@@ -0,0 +1,13 @@
+from app.services.recent_message_ids import RecentIdFilter
+
+
+def test_oldest_ids_are_forgotten_first():
+    ids = RecentIdFilter(max_ids=2)
+    ids.add(["a", "b"])
+    ids.add(["a"])  # refreshes "a"
+    ids.add(["c"])
+
+    assert "a" in ids
+    assert "b" not in ids
+    assert "c" in ids
+    assert (ids.hits, ids.misses) == (2, 1)
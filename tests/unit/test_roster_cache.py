@@ -0,0 +1,111 @@
+from app.api_schemas.message import MessageCreate
+from app.models.chat import ChatType
+from app.services.roster_cache import RosterCache, roster_fingerprint, roster_hash
+from tests.unit.unit_utils import FakeClock
+
+
+def make_message(chat_id="chat", chat_name="Chat", members=None):
+    if members is None:
+        members = [("alice", "Alice"), ("bob", "Bob")]
+    return MessageCreate(
+        message_id=f"{chat_id}-msg",
+        text_content="hi",
+        chat_id=chat_id,
+        chat_display_name=chat_name,
+        chat_members_struct=[
+            {"user_id": user_id, "name": name, "is_sender": index == 0}
+            for index, (user_id, name) in enumerate(members)
+        ],
+    )
+
+
+def test_fingerprint_ignores_sender_and_order():
+    first = make_message(members=[("alice", "Alice"), ("bob", "Bob")])
+    second = make_message(members=[("bob", "Bob"), ("alice", "Alice")])
+    assert roster_fingerprint(first) == roster_fingerprint(second)
+
+
+def test_fingerprint_changes_with_roster():
+    base = roster_fingerprint(make_message())
+    assert roster_fingerprint(make_message(chat_name="Renamed")) != base
+    assert roster_fingerprint(make_message(members=[("alice", "Al")])) != base
+    assert (
+        roster_fingerprint(
+            make_message(members=[("alice", "Alice"), ("bob", "Bob"), ("cy", "Cy")])
+        )
+        != base
+    )
+
+
+def test_hit_after_store_and_miss_on_change():
+    cache = RosterCache(max_entries=10, ttl_seconds=60)
+    message = make_message()
+    assert not cache.is_current("chat", roster_fingerprint(message))
+
+    cache.store(message, ChatType.PRIVATE)
+    assert cache.is_current("chat", roster_fingerprint(message))
+    assert not cache.is_current("chat", roster_fingerprint(make_message(chat_name="x")))
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_entries_expire():
+    clock = FakeClock()
+    cache = RosterCache(max_entries=10, ttl_seconds=60, clock=clock)
+    message = make_message()
+    cache.store(message, ChatType.PRIVATE)
+
+    clock.now = 61
+    assert not cache.is_current("chat", roster_fingerprint(message))
+    assert len(cache) == 0
+
+
+def test_least_recently_used_chat_is_evicted():
+    cache = RosterCache(max_entries=2, ttl_seconds=60)
+    first, second, third = (make_message(chat_id=c) for c in ("a", "b", "c"))
+    cache.store(first, ChatType.PRIVATE)
+    cache.store(second, ChatType.PRIVATE)
+    assert cache.is_current("a", roster_fingerprint(first))
+
+    cache.store(third, ChatType.PRIVATE)
+    assert not cache.is_current("b", roster_fingerprint(second))
+    assert cache.is_current("a", roster_fingerprint(first))
+    assert cache.is_current("c", roster_fingerprint(third))
+
+
+def test_renamed_user_invalidates_every_chat_containing_them():
+    cache = RosterCache(max_entries=10, ttl_seconds=60)
+    shared = make_message(chat_id="shared")
+    other = make_message(chat_id="other", members=[("cy", "Cy")])
+    cache.store(shared, ChatType.PRIVATE)
+    cache.store(other, ChatType.PRIVATE)
+
+    cache.invalidate_users({"bob"})
+    assert not cache.is_current("shared", roster_fingerprint(shared))
+    assert cache.is_current("other", roster_fingerprint(other))
+
+
+def test_roster_hash_is_canonical_but_keeps_order_and_sender():
+    members = [
+        {"user_id": "alice", "name": "Alice", "is_sender": True},
+        {"user_id": "bob", "name": "Bob", "is_sender": False},
+    ]
+    reordered_keys = [{"is_sender": m["is_sender"], **m} for m in members]
+    assert roster_hash(reordered_keys) == roster_hash(members)
+    assert roster_hash(members[::-1]) != roster_hash(members)
+    assert roster_hash(
+        [{**m, "is_sender": not m["is_sender"]} for m in members]
+    ) != roster_hash(members)
+
+
+def test_known_rosters_are_dropped_with_the_chat():
+    cache = RosterCache(max_entries=10, ttl_seconds=60)
+    cache.add_roster("chat", "h1")
+    assert not cache.has_roster("chat", "h1")
+
+    cache.store(make_message(), ChatType.PRIVATE)
+    cache.add_roster("chat", "h1")
+    assert cache.has_roster("chat", "h1")
+    assert not cache.has_roster("chat", "h2")
+
+    cache.invalidate("chat")
+    assert not cache.has_roster("chat", "h1")
@@ -0,0 +1,11 @@
+"""Test utilities shared by the unit tests"""
+
+
+class FakeClock:
+    """Monotonic clock stand-in; tests advance it by assigning ``now``"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now